@@ -1,8 +1,9 @@
-from flask import Flask
+from flask import Flask, jsonify, request
 from config import Config
-import psycopg2
-from psycopg2 import pool
+from app.db import ConnectionPool, PoolExhausted
+from app import metrics, slow_query
 import atexit
+import time
 import redis
 
 # 创建数据库连接池
@@ -19,7 +20,10 @@ def create_app():
     
     # 初始化Redis连接
     try:
-        redis_client = redis.Redis(host='localhost', port=6379, decode_responses=True)
+        # 连接记录每个请求中Redis命令的耗时（Server-Timing 和 /metrics）
+        redis_client = redis.Redis(connection_pool=redis.ConnectionPool(
+            host='localhost', port=6379, decode_responses=True,
+            connection_class=metrics.TimedRedisConnection))
         # 测试Redis连接
         redis_client.ping()
         print("✅ Redis connection established successfully")
@@ -27,11 +31,17 @@ def create_app():
         print(f"❌ Error connecting to Redis: {e}")
         redis_client = None
     
-    # 初始化数据库连接池 - 减少最大连接数以避免达到服务器限制
+    # 初始化数据库连接池（线程安全，大小由Config配置）
     if db_pool is None:
         try:
-            db_pool = psycopg2.pool.SimpleConnectionPool(
-                1, 10,  # 最小1个连接，最大10个连接（降低以避免连接数限制）
+            db_pool = ConnectionPool(
+                app.config['DB_POOL_MINCONN'], app.config['DB_POOL_MAXCONN'],
+                max_age=app.config['DB_POOL_MAX_AGE'],
+                max_idle=app.config['DB_POOL_MAX_IDLE'],
+                health_check_idle=app.config['DB_POOL_HEALTH_CHECK_IDLE'],
+                # 连接耗尽时有界排队，超时或队列已满时抛出PoolExhausted（返回503）
+                wait_timeout=app.config['DB_POOL_WAIT_TIMEOUT'],
+                max_waiters=app.config['DB_POOL_MAX_WAITERS'],
                 host=app.config['DB_HOST'],
                 port=app.config['DB_PORT'],
                 dbname=app.config['DB_NAME'],
@@ -39,8 +49,11 @@ def create_app():
                 password=app.config['DB_PASSWORD'],
                 # 设置连接超时等参数
                 connect_timeout=10,
-                # 设置时区为UTC+8
-                options='-c timezone=Asia/Shanghai'
+                # 设置时区为UTC+8（每个物理连接建立时设置一次）
+                options='-c timezone=Asia/Shanghai',
+                # 记录每条SQL的耗时，用于 /metrics；启用慢查询日志时同时记录慢语句
+                cursor_factory=(slow_query.SlowQueryCursor if slow_query.init_app(app)
+                                else metrics.TimedCursor)
             )
             print("✅ Database connection pool created successfully")
         except Exception as e:
@@ -51,23 +64,18 @@ def create_app():
     def get_db_connection():
         global db_pool
         if db_pool:
+            started = time.perf_counter()
             try:
-                conn = db_pool.getconn()
-                # 测试连接是否有效
-                cursor = conn.cursor()
-                cursor.execute('SELECT 1')
-                # 设置会话时区为UTC+8
-                cursor.execute("SET timezone TO 'Asia/Shanghai'")
-                cursor.close()
-                return conn
+                # 连接池只在连接空闲较久或出错后才做健康检查，时区已在建立连接时设置
+                return db_pool.getconn()
+            except PoolExhausted:
+                # 交给错误处理函数返回503，而不是当作数据库故障
+                raise
             except Exception as e:
                 print(f"Error getting connection from pool: {e}")
-                # 如果连接无效，尝试重建连接池
-                try:
-                    db_pool.putconn(conn)
-                except:
-                    pass
                 return None
+            finally:
+                metrics.record_pool_wait(time.perf_counter() - started)
         return None
     
     # 归还数据库连接的函数
@@ -75,9 +83,8 @@ def create_app():
         global db_pool
         if db_pool and conn:
             try:
-                # 在归还连接前检查连接状态
-                if not conn.closed:
-                    db_pool.putconn(conn)
+                # 连接池会回滚未结束的事务，并丢弃已关闭的连接
+                db_pool.putconn(conn)
             except Exception as e:
                 print(f"Error putting connection back to pool: {e}")
                 try:
@@ -85,6 +92,11 @@ def create_app():
                 except:
                     pass
     
+    # 获取连接池统计信息的函数
+    def get_db_pool_stats():
+        global db_pool
+        return db_pool.stats() if db_pool else None
+    
     # 获取Redis客户端的函数
     def get_redis_client():
         global redis_client
@@ -93,19 +105,61 @@ def create_app():
     # 将函数添加到应用上下文中
     app.get_db_connection = get_db_connection
     app.put_db_connection = put_db_connection
+    app.get_db_pool_stats = get_db_pool_stats
     app.get_redis_client = get_redis_client
     
+    # 连接池耗尽时快速失败：返回503并告知客户端稍后重试
+    @app.errorhandler(PoolExhausted)
+    def handle_pool_exhausted(error):
+        retry_after = str(app.config['DB_POOL_RETRY_AFTER'])
+        if request.blueprint in ('api', 'admin') or not request.accept_mimetypes.accept_html:
+            response = jsonify({'success': False, 'error': '服务器繁忙，请稍后重试'})
+        else:
+            response = app.response_class('服务器繁忙，请稍后重试', mimetype='text/plain')
+        response.status_code = 503
+        response.headers['Retry-After'] = retry_after
+        return response
+    
+    # 请求指标：路由耗时、SQL条数和耗时、取连接等待、模板渲染，从 /metrics 导出
+    metrics.init_app(app)
+    
+    # 按请求开启的采样分析器（管理员请求头 X-Profile: 1，或每N个请求分析一个）
+    from app import profiler
+    profiler.init_app(app)
+    
+    # 内存分配快照（tracemalloc），默认不追踪，按配置或 /admin/memory/start 开启
+    from app import memory
+    memory.init_app(app)
+    
     # 应用关闭时关闭连接池
     @app.teardown_appcontext
     def close_db(error):
         pass  # 我们使用自定义函数管理连接
     
+    # 初始化两级缓存（进程内L1 + Redis），并订阅其他worker的失效广播
+    from app import cache
+    cache.init_app(app, redis_client)
+    
+    # 启动点赞和浏览数的后台批量写入线程
+    from app import write_behind
+    write_behind.init_app(app, redis_client)
+    
+    # 后台任务队列：请求只放入任务，由 worker.py 执行；Redis不可用时在进程内执行
+    from app import jobs
+    jobs.init_app(app, redis_client)
+    
     # 注册蓝图
     from app.views import main
     from app.controllers.api import api
+    from app.controllers.admin import admin
     app.register_blueprint(main)
     app.register_blueprint(api, url_prefix='/api')
-    
+    app.register_blueprint(admin, url_prefix='/admin')
+
+    # 注册维护命令
+    from app.commands import register_commands
+    register_commands(app)
+
     return app
 
 # 应用关闭时关闭连接池
@@ -0,0 +1,451 @@
+"""
+统一的读穿透缓存，分两级：
+
+- L1：进程内LRU缓存，按条目数和有效期淘汰，保存反序列化后的值，命中时不访问Redis也不解析JSON
+- L2：Redis，所有worker进程共享
+
+- key带命名空间和格式版本：cache:v{FORMAT_VERSION}:{name}:{parts...}，
+  修改缓存内容的结构时递增 FORMAT_VERSION，旧格式的key自然过期，不会被误读
+- 写入缓存时登记标签（如 "tips-list"、"user:42"、"tip:7"），
+  数据变化后按标签失效，相关key在一个pipeline中批量删除，
+  并通过Redis pub/sub通知其他worker进程清除各自L1中的相关条目
+- 同一个key同时未命中时只有一个请求（持有Redis锁）查询数据库，
+  其他请求等待结果写入缓存，避免热点key过期时大量相同的查询同时打到PostgreSQL
+- L2中的值用 app/codec.py 编码，Decimal、日期时间和元组原样还原，较大的值压缩保存
+- Redis不可用时只使用L1，缓存出错不影响页面
+- get_fragments 缓存渲染好的HTML片段，key包含数据的摘要（fragment_version），
+  数据变化后自然换用新key，不需要失效
+
+L1中的值会被多个请求共享，调用方不能修改 get_or_load 返回的对象。
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+from app import codec
+
+NAMESPACE = 'cache'
+# 缓存内容格式版本
+FORMAT_VERSION = 2
+
+# 未命中时加载锁的有效期（秒），loader异常退出时锁会自动过期
+LOCK_TTL = 10
+# 未抢到锁的请求最多等待多久（秒），超时后自行查询数据库
+LOCK_WAIT = 2
+LOCK_POLL_INTERVAL = 0.05
+
+# 标签集合在最后一次登记后保留的时间（秒），不短于其中任何key的有效期
+TAG_TTL = 3600
+
+# 广播失效标签的频道
+INVALIDATION_CHANNEL = f'{NAMESPACE}:invalidate'
+
+# 释放锁时确认锁仍属于自己，避免删除锁过期后被其他请求重新获得的锁
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LocalCache:
+    """
+    进程内LRU缓存（L1）
+
+    Args:
+        max_entries: 最多保存的条目数，超过后淘汰最久未使用的条目
+        max_ttl: 条目最长有效期（秒），限制错过失效广播时读到旧数据的时间
+    """
+
+    def __init__(self, max_entries=1000, max_ttl=10):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (过期时间, 值, 标签)
+        self._tags = {}                 # 标签 -> {key}
+
+    def get(self, key):
+        """
+        Returns:
+            (是否命中, 值)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[1]
+
+    def set(self, key, value, ttl, tags=()):
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + min(ttl, self.max_ttl)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (expires_at, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        """删除条目并从标签索引中移除（调用方必须持有锁）"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_local = LocalCache()
+# 本进程的标识，收到自己发出的失效广播时跳过（本地已经清除过）
+_origin = uuid.uuid4().hex
+_listener = None
+
+# 缓存名称 -> 各级命中次数
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def init_app(app, redis_client):
+    """按配置设置L1大小和压缩阈值，并启动接收失效广播的后台线程"""
+    global _listener
+    _local.max_entries = app.config['CACHE_L1_MAX_ENTRIES']
+    _local.max_ttl = app.config['CACHE_L1_TTL']
+    codec.COMPRESS_MIN_SIZE = app.config['CACHE_COMPRESS_MIN_SIZE']
+    if redis_client and _listener is None:
+        _listener = threading.Thread(target=_listen, args=(redis_client,),
+                                     name='cache-invalidation', daemon=True)
+        _listener.start()
+
+
+def _listen(redis_client):
+    while True:
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # （重新）订阅之前可能错过了失效广播，清空L1
+            _local.clear()
+            for message in pubsub.listen():
+                data = json.loads(message['data'])
+                if data.get('origin') != _origin:
+                    _local.invalidate_tags(data['tags'])
+        except Exception as e:
+            print(f"Error in cache invalidation listener: {e}")
+            time.sleep(1)
+
+
+def _count(name, field):
+    with _stats_lock:
+        counts = _stats.get(name)
+        if counts is None:
+            counts = _stats[name] = {'l1_hits': 0, 'l2_hits': 0, 'misses': 0, 'errors': 0}
+        counts[field] += 1
+
+
+def stats():
+    """
+    各缓存名称的命中统计
+
+    l1_hit_rate 为L1命中数/总请求数，l2_hit_rate 为L2命中数/L1未命中数，errors 为读写Redis出错的次数
+
+    Returns:
+        {name: {'l1_hits', 'l2_hits', 'misses', 'errors', 'l1_hit_rate', 'l2_hit_rate'}, ...}
+    """
+    with _stats_lock:
+        snapshot = {name: dict(counts) for name, counts in _stats.items()}
+    for counts in snapshot.values():
+        requests = counts['l1_hits'] + counts['l2_hits'] + counts['misses']
+        l1_misses = requests - counts['l1_hits']
+        counts['l1_hit_rate'] = counts['l1_hits'] / requests if requests else 0.0
+        counts['l2_hit_rate'] = counts['l2_hits'] / l1_misses if l1_misses else 0.0
+    return snapshot
+
+
+def local_size():
+    """L1当前条目数"""
+    return len(_local)
+
+
+def cache_key(name, *parts):
+    """带命名空间和格式版本的缓存key"""
+    return ':'.join([NAMESPACE, f'v{FORMAT_VERSION}', name] + [str(part) for part in parts])
+
+
+def _tag_key(tag):
+    return f'{NAMESPACE}:tag:{tag}'
+
+
+def _lock_key(key):
+    return f'{NAMESPACE}:lock:{key}'
+
+
+def get_or_load(redis_client, name, parts, loader, ttl, tags=(), dumps=codec.dumps, loads=codec.loads):
+    """
+    读穿透：依次查找L1、L2，都未命中时调用loader加载并写入两级缓存
+
+    Args:
+        redis_client: Redis客户端，可以为None
+        name: 缓存名称（如 'tips_page'）
+        parts: 组成key的其余部分（如排序方式、分页游标）
+        loader: 无参函数，返回要缓存的值；返回None表示不缓存（如记录不存在）
+        ttl: 有效期（秒），L1中的有效期不超过 CACHE_L1_TTL
+        tags: 失效标签
+        dumps/loads: L2的序列化和反序列化函数，默认使用 app.codec
+
+    Returns:
+        缓存的值或loader的返回值
+    """
+    key = cache_key(name, *parts)
+    hit, value = _local.get(key)
+    if hit:
+        _count(name, 'l1_hits')
+        return value
+
+    if not redis_client:
+        _count(name, 'misses')
+        return _load_local(key, loader, ttl, tags)
+
+    try:
+        cached = redis_client.get(key)
+    except Exception as e:
+        print(f"Error reading from Redis: {e}")
+        _count(name, 'errors')
+        _count(name, 'misses')
+        return _load_local(key, loader, ttl, tags)
+    if cached is not None:
+        hit, value = _decode(cached, loads)
+        if hit:
+            _count(name, 'l2_hits')
+            return _remember(key, value, ttl, tags)
+
+    # 未命中：抢加载锁，抢不到的请求等待持锁请求写入的结果
+    token = uuid.uuid4().hex
+    lock_key = _lock_key(key)
+    try:
+        locked = redis_client.set(lock_key, token, nx=True, ex=LOCK_TTL)
+    except Exception as e:
+        print(f"Error acquiring cache lock: {e}")
+        _count(name, 'errors')
+        _count(name, 'misses')
+        return _load_local(key, loader, ttl, tags)
+
+    if not locked:
+        cached = _wait_for_value(redis_client, key, lock_key)
+        if cached is not None:
+            hit, value = _decode(cached, loads)
+            if hit:
+                _count(name, 'l2_hits')
+                return _remember(key, value, ttl, tags)
+        # 等待超时或持锁请求没有写入缓存（例如loader返回None），自行查询
+        _count(name, 'misses')
+        return _load_local(key, loader, ttl, tags)
+
+    _count(name, 'misses')
+    try:
+        value = loader()
+        if value is not None:
+            _local.set(key, value, ttl, tags)
+            if not _store(redis_client, key, value, ttl, tags, dumps):
+                _count(name, 'errors')
+        return value
+    finally:
+        try:
+            redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            print(f"Error releasing cache lock: {e}")
+
+
+def _decode(cached, loads):
+    """
+    解码L2中的值，格式不符（如旧版本写入）或内容损坏时视为未命中，由loader重新加载并覆盖
+
+    Returns:
+        (是否成功, 值)
+    """
+    try:
+        return True, loads(cached)
+    except Exception as e:
+        print(f"Error decoding cached value: {e}")
+        return False, None
+
+
+def _load_local(key, loader, ttl, tags):
+    value = loader()
+    if value is not None:
+        _local.set(key, value, ttl, tags)
+    return value
+
+
+def _remember(key, value, ttl, tags):
+    _local.set(key, value, ttl, tags)
+    return value
+
+
+def _wait_for_value(redis_client, key, lock_key):
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.exists(lock_key)
+            cached, locked = pipe.execute()
+        except Exception as e:
+            print(f"Error reading from Redis: {e}")
+            return None
+        if cached is not None:
+            return cached
+        if not locked:
+            return None
+    return None
+
+
+def _store(redis_client, key, value, ttl, tags, dumps):
+    """
+    写入L2并把key登记到各标签下
+
+    Returns:
+        是否写入成功
+    """
+    try:
+        raw = dumps(value)
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.setex(key, ttl, raw)
+        for tag in tags:
+            tag_key = _tag_key(tag)
+            pipe.sadd(tag_key, key)
+            pipe.expire(tag_key, max(ttl, TAG_TTL))
+        pipe.execute()
+        return True
+    except Exception as e:
+        print(f"Error writing to Redis: {e}")
+        return False
+
+
+def fragment_version(*values):
+    """
+    片段所依赖数据的摘要，数据的任何变化都会得到不同的版本
+
+    Args:
+        values: 片段的数据，支持 app.codec 能编码的所有类型
+    """
+    raw = codec.dumps(values, compress_min_size=0).encode('utf-8')
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+def get_fragments(redis_client, name, items, render, ttl):
+    """
+    批量读取渲染好的HTML片段：依次查找L1、L2（一次MGET），都未命中的片段调用render渲染，
+    并在一个pipeline中写入L2
+
+    Args:
+        redis_client: Redis客户端，可以为None
+        name: 片段名称（如 'tip_card'）
+        items: [(version, context), ...]，version 标识片段内容（通常由 fragment_version 计算）
+        render: 接收context、返回HTML字符串的函数
+        ttl: 有效期（秒）
+
+    Returns:
+        与items顺序一致的HTML字符串列表
+    """
+    stats_name = f'fragment:{name}'
+    keys = [cache_key(stats_name, version) for version, _ in items]
+    fragments = [None] * len(items)
+    missing = []
+    for i, key in enumerate(keys):
+        hit, fragment = _local.get(key)
+        if hit:
+            _count(stats_name, 'l1_hits')
+            fragments[i] = fragment
+        else:
+            missing.append(i)
+    if not missing:
+        return fragments
+
+    cached = [None] * len(missing)
+    if redis_client:
+        try:
+            cached = redis_client.mget([keys[i] for i in missing])
+        except Exception as e:
+            print(f"Error reading from Redis: {e}")
+            _count(stats_name, 'errors')
+
+    rendered = []
+    for i, fragment in zip(missing, cached):
+        if fragment is not None:
+            _count(stats_name, 'l2_hits')
+        else:
+            _count(stats_name, 'misses')
+            fragment = render(items[i][1])
+            rendered.append((keys[i], fragment))
+        _local.set(keys[i], fragment, ttl)
+        fragments[i] = fragment
+
+    if redis_client and rendered:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for key, fragment in rendered:
+                pipe.setex(key, ttl, fragment)
+            pipe.execute()
+        except Exception as e:
+            print(f"Error writing to Redis: {e}")
+            _count(stats_name, 'errors')
+    return fragments
+
+
+def invalidate(redis_client, *tags):
+    """
+    按标签失效缓存：清除本进程L1中的相关条目，在一个pipeline中批量删除L2中登记的key，
+    并广播给其他worker进程清除各自的L1
+
+    Args:
+        redis_client: Redis客户端，可以为None
+        tags: 标签，如 'tips-list'、f'user:{user_id}'
+    """
+    if not tags:
+        return
+    _local.invalidate_tags(tags)
+    if not redis_client:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for tag in tags:
+            pipe.smembers(_tag_key(tag))
+        members = pipe.execute()
+
+        keys = {key for tag_members in members for key in tag_members}
+        keys.update(_tag_key(tag) for tag in tags)
+        pipe = redis_client.pipeline(transaction=False)
+        key_list = list(keys)
+        for i in range(0, len(key_list), 500):
+            pipe.delete(*key_list[i:i + 500])
+        pipe.publish(INVALIDATION_CHANNEL, json.dumps({'origin': _origin, 'tags': list(tags)}))
+        pipe.execute()
+    except Exception as e:
+        print(f"Error clearing Redis cache: {e}")
@@ -0,0 +1,127 @@
+"""
+缓存值的序列化格式
+
+数据库查询结果中的 Decimal、date、time、datetime 和元组在JSON中没有对应类型，
+这里把它们编码为带类型标记的单键对象（如 {"$n": "12.50"}），读取时还原为原来的类型，
+保证从缓存读出的值和直接查询数据库得到的值完全一致。
+
+编码结果是字符串（Redis客户端使用 decode_responses=True）：
+
+    c1:{json}          未压缩
+    c1z:{base64}       超过 COMPRESS_MIN_SIZE 字节的JSON先zlib压缩再base64编码
+
+前缀中的数字是格式版本，修改编码方式时递增 FORMAT_VERSION，
+无法识别的版本在读取时抛出 CodecError，缓存层将其视为未命中并重新写入。
+"""
+import base64
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+import json
+import zlib
+
+FORMAT_VERSION = 1
+
+# JSON超过该字节数时压缩，0表示不压缩
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 6
+
+_PREFIX = f'c{FORMAT_VERSION}:'
+_COMPRESSED_PREFIX = f'c{FORMAT_VERSION}z:'
+
+# 类型标记 -> 解码函数
+_DECODERS = {
+    '$n': Decimal,
+    '$dt': datetime.fromisoformat,
+    '$d': date.fromisoformat,
+    '$t': time.fromisoformat,
+    '$td': lambda seconds: timedelta(seconds=seconds),
+    '$tu': tuple,
+    # 键不是字符串的字典，或键恰好与类型标记冲突的字典
+    '$m': lambda items: {key: value for key, value in items},
+}
+
+
+class CodecError(ValueError):
+    """缓存值无法编码或解码"""
+
+
+def _encode(value):
+    """把值转换为只包含JSON原生类型的结构"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if isinstance(value, tuple):
+        return {'$tu': [_encode(item) for item in value]}
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value) and \
+                not (len(value) == 1 and next(iter(value)) in _DECODERS):
+            return {key: _encode(item) for key, item in value.items()}
+        return {'$m': [[_encode(key), _encode(item)] for key, item in value.items()]}
+    if isinstance(value, Decimal):
+        return {'$n': str(value)}
+    # datetime 是 date 的子类，必须先判断
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'$d': value.isoformat()}
+    if isinstance(value, time):
+        return {'$t': value.isoformat()}
+    if isinstance(value, timedelta):
+        return {'$td': value.total_seconds()}
+    raise CodecError(f'无法编码的类型: {type(value).__name__}')
+
+
+def _decode_object(obj):
+    if len(obj) == 1:
+        tag, payload = next(iter(obj.items()))
+        decoder = _DECODERS.get(tag)
+        if decoder is not None:
+            return decoder(payload)
+    return obj
+
+
+def dumps(value, compress_min_size=None):
+    """
+    编码缓存值
+
+    Args:
+        value: 要缓存的值
+        compress_min_size: 压缩阈值（字节），默认使用 COMPRESS_MIN_SIZE
+
+    Returns:
+        带格式版本前缀的字符串
+    """
+    if compress_min_size is None:
+        compress_min_size = COMPRESS_MIN_SIZE
+    text = json.dumps(_encode(value), ensure_ascii=False, separators=(',', ':'))
+    raw = text.encode('utf-8')
+    if compress_min_size and len(raw) >= compress_min_size:
+        compressed = base64.b64encode(zlib.compress(raw, COMPRESS_LEVEL)).decode('ascii')
+        # 压缩后反而更大时保存原文
+        if len(compressed) < len(raw):
+            return _COMPRESSED_PREFIX + compressed
+    return _PREFIX + text
+
+
+def loads(raw):
+    """
+    解码 dumps 的结果
+
+    Raises:
+        CodecError: 格式版本不符或内容损坏
+    """
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8')
+    try:
+        if raw.startswith(_PREFIX):
+            text = raw[len(_PREFIX):]
+        elif raw.startswith(_COMPRESSED_PREFIX):
+            text = zlib.decompress(base64.b64decode(raw[len(_COMPRESSED_PREFIX):])).decode('utf-8')
+        else:
+            raise CodecError(f'未知的缓存格式: {raw[:8]!r}')
+        return json.loads(text, object_hook=_decode_object)
+    except CodecError:
+        raise
+    except (ValueError, TypeError, zlib.error) as e:
+        raise CodecError(f'缓存内容损坏: {e}') from e
@@ -0,0 +1,147 @@
+"""
+维护命令，通过Flask CLI运行，例如：
+
+    flask --app run rebuild-leaderboard
+"""
+import click
+from flask import current_app
+
+from app import leaderboard, slow_query, suggest
+from app.counters import reconcile_tip_counters
+from app.search import rebuild_search_index
+from app.stats import rebuild_user_stats, rebuild_daily_stats
+
+
+def register_commands(app):
+    app.cli.add_command(rebuild_leaderboard_command)
+    app.cli.add_command(reconcile_tip_counters_command)
+    app.cli.add_command(rebuild_user_stats_command)
+    app.cli.add_command(rebuild_daily_stats_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(rebuild_suggest_index_command)
+    app.cli.add_command(slow_queries_command)
+
+
+@click.command('rebuild-leaderboard')
+def rebuild_leaderboard_command():
+    """从PostgreSQL重建红榜/黑榜（冷启动或修复漂移）"""
+    redis_client = current_app.get_redis_client()
+    if not redis_client:
+        raise click.ClickException('Redis连接不可用')
+
+    conn = current_app.get_db_connection()
+    if not conn:
+        raise click.ClickException('数据库连接失败')
+
+    try:
+        try:
+            result = leaderboard.rebuild_leaderboards(conn, redis_client)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"✅ 红榜已重建: {result[leaderboard.RED_BOARD]} 位用户")
+        click.echo(f"✅ 黑榜已重建: {result[leaderboard.BLACK_BOARD]} 位用户")
+    finally:
+        current_app.put_db_connection(conn)
+
+
+@click.command('reconcile-tip-counters')
+def reconcile_tip_counters_command():
+    """重新计算技巧的点赞数和评论数（修复计数漂移）"""
+    conn = current_app.get_db_connection()
+    if not conn:
+        raise click.ClickException('数据库连接失败')
+
+    try:
+        fixed = reconcile_tip_counters(conn)
+        click.echo(f"✅ 计数校正完成: 修正了 {fixed} 条技巧")
+    finally:
+        current_app.put_db_connection(conn)
+
+
+@click.command('rebuild-user-stats')
+def rebuild_user_stats_command():
+    """从摸鱼/加班记录和技巧重建用户聚合统计（首次部署或修复漂移）"""
+    conn = current_app.get_db_connection()
+    if not conn:
+        raise click.ClickException('数据库连接失败')
+
+    try:
+        rebuilt = rebuild_user_stats(conn)
+        click.echo(f"✅ 用户统计已重建: {rebuilt} 位用户")
+    finally:
+        current_app.put_db_connection(conn)
+
+
+@click.command('rebuild-daily-stats')
+def rebuild_daily_stats_command():
+    """从摸鱼/加班记录重建按天汇总的统计（首次部署或修复漂移）"""
+    conn = current_app.get_db_connection()
+    if not conn:
+        raise click.ClickException('数据库连接失败')
+
+    try:
+        rebuilt = rebuild_daily_stats(conn)
+        click.echo(f"✅ 每日统计已重建: {rebuilt} 条")
+    finally:
+        current_app.put_db_connection(conn)
+
+
+@click.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """重新计算所有技巧的全文搜索列（首次部署或修改切词规则后运行）"""
+    conn = current_app.get_db_connection()
+    if not conn:
+        raise click.ClickException('数据库连接失败')
+
+    try:
+        updated = rebuild_search_index(conn)
+        click.echo(f"✅ 搜索索引已重建: {updated} 条技巧")
+    finally:
+        current_app.put_db_connection(conn)
+
+
+@click.command('rebuild-suggest-index')
+def rebuild_suggest_index_command():
+    """从PostgreSQL重建Redis中的技巧标题自动补全索引（修复漂移）"""
+    redis_client = current_app.get_redis_client()
+    if not redis_client:
+        raise click.ClickException('Redis连接不可用')
+
+    conn = current_app.get_db_connection()
+    if not conn:
+        raise click.ClickException('数据库连接失败')
+
+    try:
+        count = suggest.rebuild_suggest_index(conn, redis_client)
+        click.echo(f"✅ 自动补全索引已重建: {count} 条技巧")
+    finally:
+        current_app.put_db_connection(conn)
+
+
+@click.command('slow-queries')
+@click.option('--log', 'log_path', default=None, help='慢查询日志路径，默认使用 SLOW_QUERY_LOG')
+@click.option('--top', default=20, show_default=True, help='显示的语句数')
+@click.option('--sort', 'sort_by', type=click.Choice(['total', 'max', 'avg', 'count']), default='total',
+              show_default=True, help='排序方式')
+@click.option('--explain/--no-explain', default=False, help='同时显示最近一次捕获的执行计划')
+def slow_queries_command(log_path, top, sort_by, explain):
+    """汇总慢查询日志中最慢的语句"""
+    log_path = log_path or current_app.config['SLOW_QUERY_LOG']
+    if not log_path:
+        raise click.ClickException('未设置 SLOW_QUERY_LOG，请用 --log 指定日志路径')
+
+    entries = slow_query.read_log(log_path)
+    if not entries:
+        click.echo('慢查询日志为空')
+        return
+
+    key = {'total': 'total_ms', 'max': 'max_ms', 'avg': 'avg_ms', 'count': 'count'}[sort_by]
+    groups = sorted(slow_query.summarize(entries), key=lambda group: group[key], reverse=True)
+    click.echo(f"📊 {len(entries)} 条慢查询记录，{len(groups)} 种语句")
+    for rank, group in enumerate(groups[:top], 1):
+        click.echo(f"\n#{rank} 次数 {group['count']}  总计 {group['total_ms']:.0f}ms  "
+                   f"平均 {group['avg_ms']:.1f}ms  最大 {group['max_ms']:.1f}ms  平均行数 {group['avg_rows']:.0f}")
+        click.echo(f"   路由: {', '.join(group['endpoints'])}")
+        click.echo(f"   {group['normalized']}")
+        if explain and group['explain']:
+            click.echo('   ' + group['explain'].replace('\n', '\n   '))
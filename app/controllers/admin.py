@@ -0,0 +1,127 @@
+from functools import wraps
+import hmac
+import os
+
+from flask import Blueprint, jsonify, request, current_app, send_from_directory
+
+from app import cache, jobs, memory, profiler
+
+admin = Blueprint('admin', __name__)
+
+def is_admin_request():
+    """请求头 X-Admin-Token 是否与配置的 ADMIN_TOKEN 一致；未配置时总是False"""
+    token = current_app.config.get('ADMIN_TOKEN')
+    provided = request.headers.get('X-Admin-Token', '')
+    return bool(token) and hmac.compare_digest(provided, token)
+
+def admin_required(f):
+    """管理接口需要请求头 X-Admin-Token 与配置的 ADMIN_TOKEN 一致；未配置时接口关闭"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not is_admin_request():
+            return jsonify({'success': False, 'error': '无权限'}), 403
+        return f(*args, **kwargs)
+    return decorated
+
+@admin.route('/pool-stats', methods=['GET'])
+@admin_required
+def pool_stats():
+    # 连接池排队深度与等待时间统计，用于根据连接池大小调整worker数量
+    stats = current_app.get_db_pool_stats()
+    if stats is None:
+        return jsonify({'success': False, 'error': '数据库连接池不可用'})
+    return jsonify({'success': True, 'stats': stats})
+
+@admin.route('/cache-stats', methods=['GET'])
+@admin_required
+def cache_stats():
+    # 按缓存名称分别统计L1（进程内）和L2（Redis）的命中率，只包含当前worker进程
+    return jsonify({'success': True, 'stats': cache.stats(), 'l1_size': cache.local_size()})
+
+@admin.route('/job-stats', methods=['GET'])
+@admin_required
+def job_stats():
+    # 后台任务的执行次数、失败/重试次数和耗时，以及队列长度
+    try:
+        return jsonify({'success': True, 'stats': jobs.stats(), 'queue': jobs.queue_sizes()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@admin.route('/profiles', methods=['GET'])
+@admin_required
+def profiles():
+    # 请求分析结果（折叠栈文件），最新的在前
+    return jsonify({'success': True, 'profiles': profiler.list_profiles(current_app.config['PROFILE_DIR'])})
+
+@admin.route('/profiles/<name>', methods=['GET'])
+@admin_required
+def download_profile(name):
+    # send_from_directory 会拒绝目录之外的路径
+    return send_from_directory(os.path.abspath(current_app.config['PROFILE_DIR']), name,
+                               mimetype='text/plain', as_attachment=True)
+
+@admin.route('/memory', methods=['GET'])
+@admin_required
+def memory_status():
+    # 追踪状态、已追踪内存和tracemalloc自身开销、进程RSS，以及已有快照，只包含当前worker进程
+    return jsonify({'success': True, 'status': memory.status(), 'pid': os.getpid()})
+
+@admin.route('/memory/start', methods=['POST'])
+@admin_required
+def memory_start():
+    frames = request.args.get('frames', current_app.config['MEMORY_TRACE_FRAMES'], type=int)
+    memory.start(frames)
+    return jsonify({'success': True, 'status': memory.status(), 'pid': os.getpid()})
+
+@admin.route('/memory/stop', methods=['POST'])
+@admin_required
+def memory_stop():
+    memory.stop()
+    return jsonify({'success': True, 'pid': os.getpid()})
+
+@admin.route('/memory/snapshots', methods=['POST'])
+@admin_required
+def memory_snapshot():
+    try:
+        snapshot = memory.take_snapshot(request.args.get('label'))
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    return jsonify({'success': True, 'snapshot': snapshot, 'pid': os.getpid()})
+
+@admin.route('/memory/snapshots', methods=['GET'])
+@admin_required
+def memory_snapshots():
+    return jsonify({'success': True, 'snapshots': memory.list_snapshots(), 'pid': os.getpid()})
+
+@admin.route('/memory/snapshots/<int:snapshot_id>', methods=['GET'])
+@admin_required
+def memory_top(snapshot_id):
+    # 快照中占用内存最多的位置
+    group_by = request.args.get('group_by', 'lineno')
+    if group_by not in memory.GROUP_BY:
+        return jsonify({'success': False, 'error': '无效的分组方式'}), 400
+    try:
+        stats = memory.top(snapshot_id, group_by, request.args.get('limit', 20, type=int))
+    except KeyError as e:
+        return jsonify({'success': False, 'error': e.args[0]}), 404
+    return jsonify({'success': True, 'stats': stats, 'pid': os.getpid()})
+
+@admin.route('/memory/diff', methods=['GET'])
+@admin_required
+def memory_diff():
+    # 两个快照之间增长最多的位置；省略参数时比较最近的两个快照
+    snapshots = memory.list_snapshots()
+    old_id = request.args.get('from', type=int)
+    new_id = request.args.get('to', type=int)
+    if old_id is None or new_id is None:
+        if len(snapshots) < 2:
+            return jsonify({'success': False, 'error': '至少需要两个快照'}), 400
+        old_id, new_id = snapshots[-2]['id'], snapshots[-1]['id']
+    group_by = request.args.get('group_by', 'lineno')
+    if group_by not in memory.GROUP_BY:
+        return jsonify({'success': False, 'error': '无效的分组方式'}), 400
+    try:
+        stats = memory.diff(old_id, new_id, group_by, request.args.get('limit', 20, type=int))
+    except KeyError as e:
+        return jsonify({'success': False, 'error': e.args[0]}), 404
+    return jsonify({'success': True, 'from': old_id, 'to': new_id, 'stats': stats, 'pid': os.getpid()})
@@ -1,11 +1,50 @@
 from flask import Blueprint, jsonify, request, session, current_app
 import psycopg2
+from psycopg2.extras import execute_values
 from datetime import datetime, time
 import math
-from app.utils import utc_to_utc8
+from app.utils import utc_to_utc8, encode_cursor, decode_cursor
+from app import leaderboard
+from app.schedule import get_work_schedule, invalidate_work_schedule
+from app.stats import apply_record_delta, apply_record_batch_delta
+from app import cache
+from app import suggest
+from app import jobs
 
 api = Blueprint('api', __name__)
 
+def _invalidate_profile_cache(user_id):
+    """记录或工作设置变化后清除个人中心页头缓存"""
+    cache.invalidate(current_app.get_redis_client(), f'user:{user_id}')
+
+def _work_info_json(info):
+    """工作设置的响应格式，info 为 (上班, 下班, 午休开始, 午休结束, 日薪)"""
+    return {
+        'work_start_time': info[0].strftime('%H:%M') if info[0] else None,
+        'work_end_time': info[1].strftime('%H:%M') if info[1] else None,
+        'break_start_time': info[2].strftime('%H:%M') if info[2] else None,
+        'break_end_time': info[3].strftime('%H:%M') if info[3] else None,
+        'daily_salary': float(info[4]) if info[4] else 0
+    }
+
+def _record_json(record):
+    """摸鱼/加班记录的响应格式，record 为 (项目, 时长, 收益, 创建时间)"""
+    # 处理日期格式化，转换为UTC+8时间
+    created_at_str = None
+    if record[3]:
+        try:
+            utc8_time = utc_to_utc8(record[3])
+            created_at_str = utc8_time.strftime('%Y-%m-%d %H:%M:%S')
+        except:
+            created_at_str = str(record[3])
+    
+    return {
+        'project': record[0],
+        'duration': record[1],
+        'earnings': float(record[2]),
+        'created_at': created_at_str
+    }
+
 @api.route('/user-work-info', methods=['GET'])
 def get_user_work_info():
     if 'user_id' not in session:
@@ -26,16 +65,7 @@ def get_user_work_info():
         info = cur.fetchone()
         
         if info:
-            return jsonify({
-                'success': True,
-                'info': {
-                    'work_start_time': info[0].strftime('%H:%M') if info[0] else None,
-                    'work_end_time': info[1].strftime('%H:%M') if info[1] else None,
-                    'break_start_time': info[2].strftime('%H:%M') if info[2] else None,
-                    'break_end_time': info[3].strftime('%H:%M') if info[3] else None,
-                    'daily_salary': float(info[4]) if info[4] else 0
-                }
-            })
+            return jsonify({'success': True, 'info': _work_info_json(info)})
         else:
             return jsonify({'success': False, 'error': '未找到用户信息'})
             
@@ -85,6 +115,10 @@ def save_user_work_info():
         
         conn.commit()
         
+        # 工作时间或日薪变化后，缓存的时间表和个人中心失效
+        invalidate_work_schedule(user_id, current_app.get_redis_client())
+        _invalidate_profile_cache(user_id)
+        
         return jsonify({'success': True})
         
     except Exception as e:
@@ -115,58 +149,30 @@ def save_slacking_record():
     cur = conn.cursor()
     
     try:
-        cur.execute('SELECT daily_salary, work_start_time, work_end_time, break_start_time, break_end_time FROM user_work_info WHERE user_id = %s', (user_id,))
-        salary_info = cur.fetchone()
+        # 用户的工作时间表已编译并缓存，只在缓存未命中时查询数据库
+        schedule = get_work_schedule(user_id, cur, current_app.get_redis_client())
         
-        if not salary_info or not salary_info[0] or not salary_info[1] or not salary_info[2]:
+        if not schedule:
             return jsonify({'success': False, 'error': '请先设置完整的工作时间和日薪'})
         
-        daily_salary = float(salary_info[0])
-        work_start_time = salary_info[1]
-        work_end_time = salary_info[2]
-        break_start_time = salary_info[3]
-        break_end_time = salary_info[4]
-        
-        # 计算工作时间(秒)
-        work_duration = (
-            datetime.combine(datetime.today(), work_end_time) - 
-            datetime.combine(datetime.today(), work_start_time)
-        ).total_seconds()
-        
-        # 如果工作时间跨过午夜
-        if work_end_time < work_start_time:
-            work_duration = (
-                datetime.combine(datetime.today() + datetime.timedelta(days=1), work_end_time) - 
-                datetime.combine(datetime.today(), work_start_time)
-            ).total_seconds()
-        
-        # 减去休息时间
-        if break_start_time and break_end_time:
-            # 如果休息时间也跨过午夜
-            if break_end_time < break_start_time:
-                break_duration = (
-                    datetime.combine(datetime.today() + datetime.timedelta(days=1), break_end_time) - 
-                    datetime.combine(datetime.today(), break_start_time)
-                ).total_seconds()
-            else:
-                break_duration = (
-                    datetime.combine(datetime.today(), break_end_time) - 
-                    datetime.combine(datetime.today(), break_start_time)
-                ).total_seconds()
-            work_duration -= break_duration
-        
-        # 计算每秒收益
-        earnings_per_second = daily_salary / work_duration if work_duration > 0 else 0
-        
         # 计算摸鱼收益 (摸鱼时间*秒级薪资)
-        earnings = earnings_per_second * int(duration) * 60
+        earnings = schedule.earnings(duration)
         
         # 保存记录
         cur.execute('''INSERT INTO slacking_records (user_id, duration, project, earnings) 
-                      VALUES (%s, %s, %s, %s)''',
+                      VALUES (%s, %s, %s, %s)
+                      RETURNING created_at::date''',
                    (user_id, duration, project, earnings))
+        day = cur.fetchone()[0]
+        # 在同一事务中更新用户聚合统计
+        apply_record_delta(cur, user_id, 'slacking', 1, int(duration), earnings)
         conn.commit()
         
+        # 更新排行榜和个人中心缓存
+        leaderboard.add_earnings(current_app.get_redis_client(), leaderboard.RED_BOARD,
+                                 user_id, earnings, session.get('username'), day=day)
+        _invalidate_profile_cache(user_id)
+        
         return jsonify({'success': True, 'earnings': f'{earnings:.2f}'})
         
     except Exception as e:
@@ -195,58 +201,30 @@ def save_overtime_record():
     cur = conn.cursor()
     
     try:
-        cur.execute('SELECT daily_salary, work_start_time, work_end_time, break_start_time, break_end_time FROM user_work_info WHERE user_id = %s', (user_id,))
-        salary_info = cur.fetchone()
+        # 用户的工作时间表已编译并缓存，只在缓存未命中时查询数据库
+        schedule = get_work_schedule(user_id, cur, current_app.get_redis_client())
         
-        if not salary_info or not salary_info[0] or not salary_info[1] or not salary_info[2]:
+        if not schedule:
             return jsonify({'success': False, 'error': '请先设置完整的工作时间和日薪'})
         
-        daily_salary = float(salary_info[0])
-        work_start_time = salary_info[1]
-        work_end_time = salary_info[2]
-        break_start_time = salary_info[3]
-        break_end_time = salary_info[4]
-        
-        # 计算工作时间(秒)
-        work_duration = (
-            datetime.combine(datetime.today(), work_end_time) - 
-            datetime.combine(datetime.today(), work_start_time)
-        ).total_seconds()
-        
-        # 如果工作时间跨过午夜
-        if work_end_time < work_start_time:
-            work_duration = (
-                datetime.combine(datetime.today() + datetime.timedelta(days=1), work_end_time) - 
-                datetime.combine(datetime.today(), work_start_time)
-            ).total_seconds()
-        
-        # 减去休息时间
-        if break_start_time and break_end_time:
-            # 如果休息时间也跨过午夜
-            if break_end_time < break_start_time:
-                break_duration = (
-                    datetime.combine(datetime.today() + datetime.timedelta(days=1), break_end_time) - 
-                    datetime.combine(datetime.today(), break_start_time)
-                ).total_seconds()
-            else:
-                break_duration = (
-                    datetime.combine(datetime.today(), break_end_time) - 
-                    datetime.combine(datetime.today(), break_start_time)
-                ).total_seconds()
-            work_duration -= break_duration
-        
-        # 计算每秒收益
-        earnings_per_second = daily_salary / work_duration if work_duration > 0 else 0
-        
         # 计算加班负收益 (加班时间*秒级薪资*3)
-        earnings = earnings_per_second * int(duration) * 60 * 3
+        earnings = schedule.earnings(duration, multiplier=3)
         
         # 保存记录
         cur.execute('''INSERT INTO overtime_records (user_id, duration, project, earnings) 
-                      VALUES (%s, %s, %s, %s)''',
+                      VALUES (%s, %s, %s, %s)
+                      RETURNING created_at::date''',
                    (user_id, duration, project, earnings))
+        day = cur.fetchone()[0]
+        # 在同一事务中更新用户聚合统计
+        apply_record_delta(cur, user_id, 'overtime', 1, int(duration), earnings)
         conn.commit()
         
+        # 更新排行榜和个人中心缓存
+        leaderboard.add_earnings(current_app.get_redis_client(), leaderboard.BLACK_BOARD,
+                                 user_id, earnings, session.get('username'), day=day)
+        _invalidate_profile_cache(user_id)
+        
         return jsonify({'success': True, 'earnings': f'{earnings:.2f}'})
         
     except Exception as e:
@@ -276,24 +254,7 @@ def get_slacking_record(record_id):
         record = cur.fetchone()
         
         if record:
-            # 处理日期格式化，转换为UTC+8时间
-            created_at_str = None
-            if record[3]:
-                try:
-                    utc8_time = utc_to_utc8(record[3])
-                    created_at_str = utc8_time.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    created_at_str = str(record[3])
-            
-            return jsonify({
-                'success': True,
-                'record': {
-                    'project': record[0],
-                    'duration': record[1],
-                    'earnings': float(record[2]),
-                    'created_at': created_at_str
-                }
-            })
+            return jsonify({'success': True, 'record': _record_json(record)})
         else:
             return jsonify({'success': False, 'error': '记录不存在'})
             
@@ -323,24 +284,7 @@ def get_overtime_record(record_id):
         record = cur.fetchone()
         
         if record:
-            # 处理日期格式化，转换为UTC+8时间
-            created_at_str = None
-            if record[3]:
-                try:
-                    utc8_time = utc_to_utc8(record[3])
-                    created_at_str = utc8_time.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    created_at_str = str(record[3])
-            
-            return jsonify({
-                'success': True,
-                'record': {
-                    'project': record[0],
-                    'duration': record[1],
-                    'earnings': float(record[2]),
-                    'created_at': created_at_str
-                }
-            })
+            return jsonify({'success': True, 'record': _record_json(record)})
         else:
             return jsonify({'success': False, 'error': '记录不存在'})
             
@@ -364,19 +308,24 @@ def delete_slacking_record(record_id):
     cur = conn.cursor()
     
     try:
-        # 检查记录是否存在且属于当前用户
-        cur.execute('''SELECT id FROM slacking_records 
-                      WHERE id = %s AND user_id = %s''', (record_id, user_id))
+        # 删除记录（只能删除属于当前用户的记录），同时取回收益和时长用于更新统计
+        cur.execute('''DELETE FROM slacking_records 
+                      WHERE id = %s AND user_id = %s
+                      RETURNING earnings, duration, created_at::date''', (record_id, user_id))
         record = cur.fetchone()
         
         if not record:
             return jsonify({'success': False, 'error': '记录不存在或无权限删除'})
         
-        # 删除记录
-        cur.execute('''DELETE FROM slacking_records 
-                      WHERE id = %s AND user_id = %s''', (record_id, user_id))
+        # 在同一事务中更新用户聚合统计
+        apply_record_delta(cur, user_id, 'slacking', -1, -(record[1] or 0), -record[0], day=record[2])
         conn.commit()
         
+        # 更新排行榜和个人中心缓存
+        leaderboard.add_earnings(current_app.get_redis_client(), leaderboard.RED_BOARD,
+                                 user_id, -record[0], day=record[2])
+        _invalidate_profile_cache(user_id)
+        
         return jsonify({'success': True})
         
     except Exception as e:
@@ -400,19 +349,24 @@ def delete_overtime_record(record_id):
     cur = conn.cursor()
     
     try:
-        # 检查记录是否存在且属于当前用户
-        cur.execute('''SELECT id FROM overtime_records 
-                      WHERE id = %s AND user_id = %s''', (record_id, user_id))
+        # 删除记录（只能删除属于当前用户的记录），同时取回收益和时长用于更新统计
+        cur.execute('''DELETE FROM overtime_records 
+                      WHERE id = %s AND user_id = %s
+                      RETURNING earnings, duration, created_at::date''', (record_id, user_id))
         record = cur.fetchone()
         
         if not record:
             return jsonify({'success': False, 'error': '记录不存在或无权限删除'})
         
-        # 删除记录
-        cur.execute('''DELETE FROM overtime_records 
-                      WHERE id = %s AND user_id = %s''', (record_id, user_id))
+        # 在同一事务中更新用户聚合统计
+        apply_record_delta(cur, user_id, 'overtime', -1, -(record[1] or 0), -record[0], day=record[2])
         conn.commit()
         
+        # 更新排行榜和个人中心缓存
+        leaderboard.add_earnings(current_app.get_redis_client(), leaderboard.BLACK_BOARD,
+                                 user_id, -record[0], day=record[2])
+        _invalidate_profile_cache(user_id)
+        
         return jsonify({'success': True})
         
     except Exception as e:
@@ -420,4 +374,309 @@ def delete_overtime_record(record_id):
         return jsonify({'success': False, 'error': str(e)})
     finally:
         cur.close()
-        current_app.put_db_connection(conn)
\ No newline at end of file
+        current_app.put_db_connection(conn)
+
+
+# 记录类型 -> (表名, 排行榜, 收益倍数)
+RECORD_KINDS = {
+    'slacking': ('slacking_records', leaderboard.RED_BOARD, 1),
+    'overtime': ('overtime_records', leaderboard.BLACK_BOARD, 3),
+}
+
+# 单次批量请求最多处理的记录数
+MAX_BATCH_SIZE = 500
+
+def _parse_batch_record(item):
+    """
+    校验批量请求中的一条记录
+
+    Returns:
+        (duration, project, created_at, error)
+    """
+    if not isinstance(item, dict):
+        return None, None, None, '记录格式错误'
+    
+    duration = item.get('duration')
+    project = item.get('project')
+    if duration in (None, '') or not project:
+        return None, None, None, '请填写完整信息'
+    
+    try:
+        duration = int(duration)
+    except (TypeError, ValueError):
+        return None, None, None, '时长必须是整数'
+    if duration <= 0:
+        return None, None, None, '时长必须大于0'
+    
+    project = str(project)
+    if len(project) > 255:
+        return None, None, None, '项目名称过长'
+    
+    # 补录历史记录时可以指定记录时间，未指定时使用当前时间
+    created_at = item.get('created_at')
+    if created_at:
+        try:
+            created_at = datetime.fromisoformat(str(created_at))
+        except ValueError:
+            return None, None, None, '记录时间格式错误'
+    else:
+        created_at = None
+    
+    return duration, project, created_at, None
+
+def _batch_save_records(kind):
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': '未登录'})
+    
+    user_id = session['user_id']
+    table, board, multiplier = RECORD_KINDS[kind]
+    
+    # 支持直接提交数组，或 {"records": [...]}
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('records')
+    if not isinstance(payload, list) or not payload:
+        return jsonify({'success': False, 'error': '请提交记录数组'})
+    if len(payload) > MAX_BATCH_SIZE:
+        return jsonify({'success': False, 'error': f'单次最多提交{MAX_BATCH_SIZE}条记录'})
+    
+    results = [None] * len(payload)
+    valid = []
+    for index, item in enumerate(payload):
+        duration, project, created_at, error = _parse_batch_record(item)
+        if error:
+            results[index] = {'index': index, 'success': False, 'error': error}
+        else:
+            valid.append((index, duration, project, created_at))
+    
+    if not valid:
+        return jsonify({'success': False, 'error': '没有有效的记录', 'results': results})
+    
+    conn = current_app.get_db_connection()
+    if not conn:
+        return jsonify({'success': False, 'error': '数据库连接失败'})
+    
+    cur = conn.cursor()
+    
+    try:
+        schedule = get_work_schedule(user_id, cur, current_app.get_redis_client())
+        
+        if not schedule:
+            return jsonify({'success': False, 'error': '请先设置完整的工作时间和日薪'})
+        
+        # 整批使用同一个每秒收益计算
+        earnings = [schedule.earnings(duration, multiplier) for _, duration, _, _ in valid]
+        
+        # 一条多行INSERT写入整批记录，整批在同一个事务中提交
+        rows = [(user_id, duration, project, amount, created_at)
+                for (_, duration, project, created_at), amount in zip(valid, earnings)]
+        inserted = execute_values(
+            cur,
+            f'''INSERT INTO {table} (user_id, duration, project, earnings, created_at) 
+               VALUES %s RETURNING id, created_at::date''',
+            rows,
+            template='(%s, %s, %s, %s, COALESCE(%s::timestamp, CURRENT_TIMESTAMP))',
+            page_size=len(rows),
+            fetch=True)
+        # 在同一事务中更新用户聚合统计（按记录日期汇总到每日统计）
+        apply_record_batch_delta(cur, user_id, kind,
+                                 [(row[1], duration, amount)
+                                  for row, (_, duration, _, _), amount in zip(inserted, valid, earnings)])
+        conn.commit()
+        
+        # 更新排行榜和个人中心缓存
+        leaderboard.add_earnings_by_day(current_app.get_redis_client(), board, user_id,
+                                        [(row[1], amount) for row, amount in zip(inserted, earnings)],
+                                        session.get('username'))
+        _invalidate_profile_cache(user_id)
+        
+        for (index, _, _, _), amount, row in zip(valid, earnings, inserted):
+            results[index] = {'index': index, 'success': True, 'id': row[0],
+                              'earnings': f'{amount:.2f}'}
+        
+        return jsonify({'success': True, 'saved': len(valid), 'results': results})
+        
+    except Exception as e:
+        conn.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+    finally:
+        cur.close()
+        current_app.put_db_connection(conn)
+
+def _batch_delete_records(kind):
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': '未登录'})
+    
+    user_id = session['user_id']
+    table, board, _ = RECORD_KINDS[kind]
+    
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('ids')
+    if not isinstance(payload, list) or not payload:
+        return jsonify({'success': False, 'error': '请提交要删除的记录ID'})
+    if len(payload) > MAX_BATCH_SIZE:
+        return jsonify({'success': False, 'error': f'单次最多删除{MAX_BATCH_SIZE}条记录'})
+    
+    try:
+        record_ids = [int(record_id) for record_id in payload]
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': '记录ID格式错误'})
+    
+    conn = current_app.get_db_connection()
+    if not conn:
+        return jsonify({'success': False, 'error': '数据库连接失败'})
+    
+    cur = conn.cursor()
+    
+    try:
+        # 一条语句删除整批记录（只能删除属于当前用户的记录）
+        cur.execute(f'''DELETE FROM {table} 
+                      WHERE user_id = %s AND id = ANY(%s)
+                      RETURNING id, earnings, duration, created_at::date''', (user_id, record_ids))
+        rows = cur.fetchall()
+        deleted = {row[0]: row[1] for row in rows}
+        if rows:
+            # 在同一事务中更新用户聚合统计
+            apply_record_batch_delta(cur, user_id, kind,
+                                     [(row[3], row[2], row[1]) for row in rows], sign=-1)
+        conn.commit()
+        
+        # 更新排行榜和个人中心缓存
+        leaderboard.add_earnings_by_day(current_app.get_redis_client(), board, user_id,
+                                        [(row[3], -row[1]) for row in rows])
+        _invalidate_profile_cache(user_id)
+        
+        results = []
+        for record_id in record_ids:
+            if record_id in deleted:
+                results.append({'id': record_id, 'success': True})
+            else:
+                results.append({'id': record_id, 'success': False, 'error': '记录不存在或无权限删除'})
+        
+        return jsonify({'success': True, 'deleted': len(deleted), 'results': results})
+        
+    except Exception as e:
+        conn.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+    finally:
+        cur.close()
+        current_app.put_db_connection(conn)
+
+@api.route('/slacking-records/batch', methods=['POST'])
+def batch_save_slacking_records():
+    return _batch_save_records('slacking')
+
+@api.route('/overtime-records/batch', methods=['POST'])
+def batch_save_overtime_records():
+    return _batch_save_records('overtime')
+
+@api.route('/slacking-records/batch-delete', methods=['POST'])
+def batch_delete_slacking_records():
+    return _batch_delete_records('slacking')
+
+@api.route('/overtime-records/batch-delete', methods=['POST'])
+def batch_delete_overtime_records():
+    return _batch_delete_records('overtime')
+
+# 自动补全最多返回的标题数
+SUGGEST_LIMIT = 8
+# 冷启动重建任务的去重时间（秒）
+SUGGEST_REBUILD_ENQUEUE_INTERVAL = 60
+
+@api.route('/tips/suggest', methods=['GET'])
+def suggest_tips():
+    """技巧标题自动补全，只查询Redis中的前缀索引"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': '未登录'})
+    
+    prefix = request.args.get('q', '')
+    redis_client = current_app.get_redis_client()
+    # 自动补全只是辅助功能，Redis不可用时返回空列表，不去查询数据库
+    if not redis_client:
+        return jsonify({'success': True, 'suggestions': []})
+    
+    try:
+        suggestions = suggest.suggest(redis_client, prefix, SUGGEST_LIMIT)
+        if suggestions is None:
+            # 冷启动：索引不存在时由后台任务从数据库重建，重建完成前返回空列表
+            jobs.enqueue('rebuild_suggest_index', unique_for=SUGGEST_REBUILD_ENQUEUE_INTERVAL)
+            suggestions = []
+        
+        return jsonify({'success': True, 'suggestions': suggestions})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+# 个人中心历史列表每页条数（默认值和上限）
+HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 100
+
+def _history_time(value):
+    """历史列表中的创建时间，与页面一样转换为UTC+8显示"""
+    return utc_to_utc8(value).strftime('%Y-%m-%d %H:%M') if value else None
+
+# 历史列表 -> (表名, 查询列, 序列化函数)
+HISTORY_LISTS = {
+    'slacking-records': ('slacking_records', 'id, project, duration, earnings, created_at',
+                         lambda row: {'id': row[0], 'project': row[1], 'duration': row[2],
+                                      'earnings': float(row[3]) if row[3] is not None else 0,
+                                      'created_at': _history_time(row[4])}),
+    'overtime-records': ('overtime_records', 'id, project, duration, earnings, created_at',
+                         lambda row: {'id': row[0], 'project': row[1], 'duration': row[2],
+                                      'earnings': float(row[3]) if row[3] is not None else 0,
+                                      'created_at': _history_time(row[4])}),
+    'tips': ('slacking_tips', 'id, title, created_at',
+             lambda row: {'id': row[0], 'title': row[1],
+                          'created_at': _history_time(row[2])}),
+}
+
+@api.route('/profile/<any("slacking-records", "overtime-records", "tips"):list_name>', methods=['GET'])
+def profile_history(list_name):
+    """个人中心的历史列表，按 (user_id, created_at DESC, id DESC) 键集分页"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': '未登录'})
+    
+    user_id = session['user_id']
+    table, columns, serialize = HISTORY_LISTS[list_name]
+    
+    try:
+        limit = min(max(int(request.args.get('limit', HISTORY_PAGE_SIZE)), 1), MAX_HISTORY_PAGE_SIZE)
+    except ValueError:
+        limit = HISTORY_PAGE_SIZE
+    
+    where_clause = 'WHERE user_id = %s'
+    params = [user_id]
+    position = decode_cursor(request.args.get('cursor'), 't')
+    if position:
+        where_clause += ' AND (created_at, id) < (%s, %s)'
+        params.extend(position)
+    params.append(limit + 1)
+    
+    conn = current_app.get_db_connection()
+    if not conn:
+        return jsonify({'success': False, 'error': '数据库连接失败'})
+    
+    cur = conn.cursor()
+    
+    try:
+        cur.execute(f'''SELECT {columns} FROM {table} 
+                      {where_clause}
+                      ORDER BY created_at DESC, id DESC
+                      LIMIT %s''', params)
+        rows = cur.fetchall()
+        
+        # 多取一条用于判断是否还有下一页
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][-1], rows[-1][0])
+        
+        return jsonify({'success': True, 'items': [serialize(row) for row in rows],
+                        'next_cursor': next_cursor})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+    finally:
+        cur.close()
+        current_app.put_db_connection(conn)
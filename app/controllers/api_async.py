@@ -0,0 +1,315 @@
+"""
+/api 的异步服务模式（ASGI）
+
+同步模式下每个进行中的请求都占用一个线程，等待远程PostgreSQL的网络往返时线程什么也做不了。
+异步模式在事件循环中用 asyncpg 和 redis.asyncio 处理 /api 的只读接口，等待数据库时不占用线程，
+同样的worker数量可以同时处理更多请求。路由、登录检查和响应格式与 api.py 相同。
+
+其余请求（页面、管理接口以及 /api 的写入接口）转交给同步的Flask应用，在线程池中执行：
+写入接口依赖与页面共用的事务辅助函数（用户统计增量、排行榜、缓存失效），保持一份同步实现。
+
+启动（依赖见 requirements-async.txt）：
+
+    uvicorn asgi:app --workers 4
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qsl
+
+import asyncpg
+from asgiref.wsgi import WsgiToAsgi
+from itsdangerous import BadSignature
+from redis import asyncio as aioredis
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_cookie
+from werkzeug.routing import Map, Rule
+
+from app import jobs, suggest
+from app.controllers.api import (HISTORY_LISTS, HISTORY_PAGE_SIZE, MAX_HISTORY_PAGE_SIZE,
+                                 SUGGEST_LIMIT, SUGGEST_REBUILD_ENQUEUE_INTERVAL,
+                                 _record_json, _work_info_json)
+from app.utils import encode_cursor, decode_cursor
+
+# 异步处理的路由，规则与 api 蓝图相同（带 /api 前缀）
+_rules = []
+
+
+def route(rule, methods, defaults=None):
+    def decorator(f):
+        _rules.append(Rule(f'/api{rule}', endpoint=f, methods=methods, defaults=defaults))
+        return f
+    return decorator
+
+
+class PoolExhausted(Exception):
+    """连接池耗尽且等待超时（或等待队列已满），返回503"""
+
+
+class _Request:
+    __slots__ = ('args', 'session')
+
+    def __init__(self, args, session):
+        self.args = args
+        self.session = session
+
+
+class AsyncAPI:
+    """
+    ASGI应用：匹配到异步路由的请求在事件循环中处理，其余转交给Flask应用
+
+    Args:
+        flask_app: create_app() 创建的应用，提供配置、session签名和同步路由
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.pool = None
+        self.redis = None
+        self._waiters = 0
+        self._urls = Map(_rules).bind('localhost')
+        self._wsgi = WsgiToAsgi(flask_app)
+        self._session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['path'].startswith('/api/'):
+            try:
+                endpoint, values = self._urls.match(scope['path'], method=scope['method'])
+            except HTTPException:
+                # 未匹配（或只有同步实现的方法）时交给Flask处理
+                endpoint = None
+            if endpoint:
+                await self._handle(endpoint, values, scope, send)
+                return
+        await self._wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self._startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self._shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _startup(self):
+        config = self.flask_app.config
+        try:
+            self.pool = await asyncpg.create_pool(
+                min_size=config['DB_POOL_MINCONN'], max_size=config['DB_POOL_MAXCONN'],
+                max_inactive_connection_lifetime=config['DB_POOL_MAX_IDLE'],
+                host=config['DB_HOST'],
+                port=int(config['DB_PORT']) if config['DB_PORT'] else None,
+                database=config['DB_NAME'],
+                user=config['DB_USER'],
+                password=config['DB_PASSWORD'],
+                timeout=10,
+                # 与同步连接池一致，会话时区为UTC+8
+                server_settings={'timezone': 'Asia/Shanghai'}
+            )
+            print("✅ Async database connection pool created successfully")
+        except Exception as e:
+            print(f"❌ Error creating async database connection pool: {e}")
+            self.pool = None
+
+        try:
+            self.redis = aioredis.Redis(host='localhost', port=6379, decode_responses=True)
+            await self.redis.ping()
+            print("✅ Async Redis connection established successfully")
+        except Exception as e:
+            print(f"❌ Error connecting to Redis: {e}")
+            self.redis = None
+
+    async def _shutdown(self):
+        if self.pool:
+            await self.pool.close()
+        if self.redis:
+            await self.redis.close()
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        从连接池取连接，连接池不可用时得到None
+
+        与同步连接池一样有界排队：等待超过 DB_POOL_WAIT_TIMEOUT 秒，
+        或已有 DB_POOL_MAX_WAITERS 个请求在等待时抛出 PoolExhausted
+        """
+        if not self.pool:
+            yield None
+            return
+        config = self.flask_app.config
+        saturated = self.pool.get_idle_size() == 0 and self.pool.get_size() >= self.pool.get_max_size()
+        if saturated and self._waiters >= config['DB_POOL_MAX_WAITERS']:
+            raise PoolExhausted()
+        self._waiters += 1
+        try:
+            conn = await self.pool.acquire(timeout=config['DB_POOL_WAIT_TIMEOUT'])
+        except asyncio.TimeoutError:
+            raise PoolExhausted()
+        finally:
+            self._waiters -= 1
+        try:
+            yield conn
+        finally:
+            await self.pool.release(conn)
+
+    def _session(self, scope):
+        """解析Flask的session cookie，签名无效或已过期时为空"""
+        header = b'; '.join(value for name, value in scope['headers'] if name == b'cookie')
+        value = parse_cookie(header.decode('latin-1')).get(self.flask_app.config['SESSION_COOKIE_NAME'])
+        if not value:
+            return {}
+        max_age = int(self.flask_app.permanent_session_lifetime.total_seconds())
+        try:
+            return self._session_serializer.loads(value, max_age=max_age)
+        except BadSignature:
+            return {}
+
+    async def _handle(self, endpoint, values, scope, send):
+        args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        request = _Request(args, self._session(scope))
+        headers = [(b'content-type', b'application/json')]
+        try:
+            payload = await endpoint(self, request, **values)
+            status = 200
+        except PoolExhausted:
+            payload = {'success': False, 'error': '服务器繁忙，请稍后重试'}
+            status = 503
+            headers.append((b'retry-after', str(self.flask_app.config['DB_POOL_RETRY_AFTER']).encode()))
+        # 与 jsonify 的输出相同
+        body = (self.flask_app.json.dumps(payload, separators=(',', ':')) + '\n').encode('utf-8')
+        headers.append((b'content-length', str(len(body)).encode()))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+@route('/user-work-info', methods=['GET'])
+async def get_user_work_info(api, request):
+    if 'user_id' not in request.session:
+        return {'success': False, 'error': '未登录'}
+
+    user_id = request.session['user_id']
+
+    async with api.connection() as conn:
+        if not conn:
+            return {'success': False, 'error': '数据库连接失败'}
+
+        try:
+            info = await conn.fetchrow('''SELECT work_start_time, work_end_time, break_start_time,
+                                         break_end_time, daily_salary FROM user_work_info WHERE user_id = $1''',
+                                       user_id)
+
+            if info:
+                return {'success': True, 'info': _work_info_json(info)}
+            else:
+                return {'success': False, 'error': '未找到用户信息'}
+
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+
+@route('/slacking-record/<int:record_id>', methods=['GET'], defaults={'table': 'slacking_records'})
+@route('/overtime-record/<int:record_id>', methods=['GET'], defaults={'table': 'overtime_records'})
+async def get_record(api, request, record_id, table):
+    if 'user_id' not in request.session:
+        return {'success': False, 'error': '未登录'}
+
+    user_id = request.session['user_id']
+
+    async with api.connection() as conn:
+        if not conn:
+            return {'success': False, 'error': '数据库连接失败'}
+
+        try:
+            record = await conn.fetchrow(f'''SELECT project, duration, earnings, created_at
+                                            FROM {table}
+                                            WHERE id = $1 AND user_id = $2''', record_id, user_id)
+
+            if record:
+                return {'success': True, 'record': _record_json(record)}
+            else:
+                return {'success': False, 'error': '记录不存在'}
+
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+
+@route('/tips/suggest', methods=['GET'])
+async def suggest_tips(api, request):
+    """技巧标题自动补全，只查询Redis中的前缀索引"""
+    if 'user_id' not in request.session:
+        return {'success': False, 'error': '未登录'}
+
+    # 自动补全只是辅助功能，Redis不可用时返回空列表，不去查询数据库
+    if not api.redis:
+        return {'success': True, 'suggestions': []}
+
+    try:
+        bounds = suggest.prefix_range(request.args.get('q', ''))
+        if bounds is None:
+            return {'success': True, 'suggestions': []}
+
+        pipe = api.redis.pipeline(transaction=False)
+        pipe.exists(suggest.SUGGEST_KEY)
+        pipe.zrangebylex(suggest.SUGGEST_KEY, *bounds, start=0, num=SUGGEST_LIMIT)
+        exists, members = await pipe.execute()
+        if not exists:
+            # 冷启动：索引不存在时由后台任务从数据库重建，重建完成前返回空列表
+            await asyncio.to_thread(jobs.enqueue, 'rebuild_suggest_index',
+                                    unique_for=SUGGEST_REBUILD_ENQUEUE_INTERVAL)
+            return {'success': True, 'suggestions': []}
+
+        return {'success': True, 'suggestions': suggest.parse_suggestions(members)}
+
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
+
+@route('/profile/<any("slacking-records", "overtime-records", "tips"):list_name>', methods=['GET'])
+async def profile_history(api, request, list_name):
+    """个人中心的历史列表，按 (user_id, created_at DESC, id DESC) 键集分页"""
+    if 'user_id' not in request.session:
+        return {'success': False, 'error': '未登录'}
+
+    user_id = request.session['user_id']
+    table, columns, serialize = HISTORY_LISTS[list_name]
+
+    try:
+        limit = min(max(int(request.args.get('limit', HISTORY_PAGE_SIZE)), 1), MAX_HISTORY_PAGE_SIZE)
+    except ValueError:
+        limit = HISTORY_PAGE_SIZE
+
+    where_clause = 'WHERE user_id = $1'
+    params = [user_id]
+    position = decode_cursor(request.args.get('cursor'), 't')
+    if position:
+        where_clause += ' AND (created_at, id) < ($2, $3)'
+        params.extend(position)
+    params.append(limit + 1)
+
+    async with api.connection() as conn:
+        if not conn:
+            return {'success': False, 'error': '数据库连接失败'}
+
+        try:
+            rows = await conn.fetch(f'''SELECT {columns} FROM {table}
+                                       {where_clause}
+                                       ORDER BY created_at DESC, id DESC
+                                       LIMIT ${len(params)}''', *params)
+
+            # 多取一条用于判断是否还有下一页
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1][-1], rows[-1][0])
+
+            return {'success': True, 'items': [serialize(row) for row in rows],
+                    'next_cursor': next_cursor}
+
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
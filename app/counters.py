@@ -0,0 +1,38 @@
+"""
+slacking_tips 上的点赞数/评论数计数列
+
+计数列由点赞、评论、删除路径在同一事务中维护，
+reconcile_tip_counters 用于批量重新计算，修复历史数据或计数漂移。
+"""
+
+
+def reconcile_tip_counters(conn):
+    """
+    按 tip_likes / tip_comments 重新计算所有技巧的计数，只更新不一致的行
+
+    Returns:
+        被修正的技巧数量
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute('''UPDATE slacking_tips st
+                      SET like_count = c.like_count, comment_count = c.comment_count
+                      FROM (SELECT t.id,
+                                   COALESCE(l.cnt, 0) AS like_count,
+                                   COALESCE(cm.cnt, 0) AS comment_count
+                            FROM slacking_tips t
+                            LEFT JOIN (SELECT tip_id, COUNT(*) AS cnt FROM tip_likes
+                                       GROUP BY tip_id) l ON l.tip_id = t.id
+                            LEFT JOIN (SELECT tip_id, COUNT(*) AS cnt FROM tip_comments
+                                       GROUP BY tip_id) cm ON cm.tip_id = t.id) c
+                      WHERE st.id = c.id
+                        AND (st.like_count, st.comment_count)
+                            IS DISTINCT FROM (c.like_count, c.comment_count)''')
+        fixed = cur.rowcount
+        conn.commit()
+        return fixed
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
@@ -0,0 +1,260 @@
+"""
+线程安全的PostgreSQL连接池
+
+与 psycopg2.pool.SimpleConnectionPool 相比：
+- 所有内部状态都在锁内修改，可以在多线程服务器中共享
+- 会话时区在建立物理连接时通过连接参数设置一次，取连接时不再执行 SET
+- 只在连接空闲较久或上次使用出错后才执行 SELECT 1 健康检查
+- 按最大存活时间和最大空闲时间回收连接
+- 连接耗尽时请求在有界队列中等待，超过截止时间或队列已满时抛出 PoolExhausted
+"""
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+
+class PoolExhausted(PoolError):
+    """连接池耗尽且等待超时（或等待队列已满），调用方应返回503"""
+
+    def __init__(self, message, queue_full=False):
+        super().__init__(message)
+        self.queue_full = queue_full
+
+
+class _ConnectionInfo:
+    __slots__ = ('created_at', 'last_used', 'suspect')
+
+    def __init__(self, now):
+        self.created_at = now
+        self.last_used = now
+        self.suspect = False
+
+
+class ConnectionPool:
+    """
+    线程安全的连接池
+
+    Args:
+        minconn: 初始化时预先建立的连接数
+        maxconn: 最大连接数
+        max_age: 连接最大存活时间（秒），超过后在下次取用时关闭重建
+        max_idle: 连接最大空闲时间（秒），超过后在下次取用时关闭重建
+        health_check_idle: 空闲超过该时间（秒）的连接在取用前执行一次 SELECT 1
+        wait_timeout: 连接耗尽时最多等待的时间（秒），为0时立即失败
+        max_waiters: 最多允许多少个请求同时排队等待连接
+        **connect_kwargs: 传给 psycopg2.connect 的参数
+    """
+
+    def __init__(self, minconn, maxconn, max_age=1800, max_idle=300,
+                 health_check_idle=30, wait_timeout=0, max_waiters=0, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self.health_check_idle = health_check_idle
+        self.wait_timeout = wait_timeout
+        self.max_waiters = max_waiters
+        self._connect_kwargs = connect_kwargs
+
+        self._lock = threading.Lock()
+        # 连接归还或名额释放时唤醒排队的请求
+        self._cond = threading.Condition(self._lock)
+        self._idle = []     # 空闲连接栈，后进先出以优先复用热连接
+        self._info = {}     # id(conn) -> _ConnectionInfo
+        self._size = 0      # 已建立（或正在建立）的物理连接数
+        self.closed = False
+
+        # 排队统计
+        self._waiting = 0
+        self._wait_stats = {
+            'checkouts': 0,         # 取连接总次数
+            'waited': 0,            # 需要排队的次数
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'timeouts': 0,          # 排队超时次数
+            'rejected': 0,          # 队列已满被直接拒绝的次数
+            'peak_waiting': 0,
+        }
+
+        for _ in range(minconn):
+            with self._lock:
+                self._size += 1
+            conn = self._connect()
+            with self._lock:
+                self._idle.append(conn)
+
+    def _connect(self):
+        try:
+            conn = psycopg2.connect(**self._connect_kwargs)
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._lock:
+            self._info[id(conn)] = _ConnectionInfo(time.monotonic())
+        return conn
+
+    def _discard(self, conn):
+        """关闭物理连接并释放名额（调用方不能持有锁）"""
+        with self._lock:
+            if self._info.pop(id(conn), None) is not None:
+                self._size -= 1
+                self._cond.notify()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_expired(self, info, now):
+        return (now - info.created_at > self.max_age or
+                now - info.last_used > self.max_idle)
+
+    def getconn(self):
+        """
+        取出一个可用连接，连接耗尽时最多排队等待 wait_timeout 秒
+
+        Raises:
+            PoolError: 连接池已关闭
+            PoolExhausted: 排队超时或等待队列已满
+        """
+        wait_started = None
+        while True:
+            stale = None
+            conn = None
+            with self._cond:
+                if self.closed:
+                    raise PoolError('connection pool is closed')
+                if self._idle:
+                    conn = self._idle.pop()
+                    info = self._info[id(conn)]
+                    now = time.monotonic()
+                    if conn.closed or self._is_expired(info, now):
+                        stale, conn = conn, None
+                elif self._size < self.maxconn:
+                    self._size += 1
+                else:
+                    if wait_started is None:
+                        if self.wait_timeout <= 0 or self._waiting >= self.max_waiters:
+                            self._wait_stats['rejected'] += 1
+                            raise PoolExhausted('connection pool exhausted and wait queue is full',
+                                                queue_full=True)
+                        wait_started = time.monotonic()
+                    self._wait_for_slot(wait_started)
+                    continue
+
+            if stale is not None:
+                self._discard(stale)
+                continue
+
+            if conn is None:
+                conn = self._connect()
+                self._record_checkout(wait_started)
+                return conn
+
+            if info.suspect or now - info.last_used > self.health_check_idle:
+                if not self._check(conn):
+                    self._discard(conn)
+                    continue
+                info.suspect = False
+            self._record_checkout(wait_started)
+            return conn
+
+    def _wait_for_slot(self, wait_started):
+        """在锁内排队等待连接归还或名额释放（调用方必须持有锁）"""
+        remaining = wait_started + self.wait_timeout - time.monotonic()
+        if remaining <= 0:
+            self._wait_stats['timeouts'] += 1
+            raise PoolExhausted('timed out waiting for a database connection')
+
+        self._waiting += 1
+        self._wait_stats['peak_waiting'] = max(self._wait_stats['peak_waiting'], self._waiting)
+        try:
+            self._cond.wait(remaining)
+        finally:
+            self._waiting -= 1
+
+    def _record_checkout(self, wait_started):
+        """记录一次取连接及其排队时间"""
+        waited = time.monotonic() - wait_started if wait_started is not None else None
+        with self._lock:
+            stats = self._wait_stats
+            stats['checkouts'] += 1
+            if waited is not None:
+                stats['waited'] += 1
+                stats['wait_seconds_total'] += waited
+                stats['wait_seconds_max'] = max(stats['wait_seconds_max'], waited)
+
+    def _check(self, conn):
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def putconn(self, conn, close=False):
+        """
+        归还连接，未结束的事务会被回滚；出错的连接在下次取用前做健康检查
+        """
+        info = self._info.get(id(conn))
+        if info is None:
+            # 不属于本连接池的连接
+            try:
+                conn.close()
+            except Exception:
+                pass
+            return
+
+        if close or self.closed or conn.closed:
+            self._discard(conn)
+            return
+
+        status = conn.info.transaction_status
+        if status != extensions.TRANSACTION_STATUS_IDLE:
+            if status == extensions.TRANSACTION_STATUS_INERROR:
+                info.suspect = True
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._discard(conn)
+                return
+            try:
+                conn.rollback()
+            except Exception:
+                self._discard(conn)
+                return
+
+        info.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        """关闭所有空闲连接，正在使用的连接在归还时关闭"""
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """连接池与排队统计，用于根据连接池大小调整worker数量"""
+        with self._lock:
+            stats = dict(self._wait_stats)
+            stats.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'maxconn': self.maxconn,
+                'waiting': self._waiting,
+                'max_waiters': self.max_waiters,
+                'wait_timeout': self.wait_timeout,
+            })
+        stats['wait_seconds_avg'] = (stats['wait_seconds_total'] / stats['waited']
+                                     if stats['waited'] else 0.0)
+        return stats
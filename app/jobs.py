@@ -0,0 +1,426 @@
+"""
+后台任务
+
+请求中只把后续工作（冷启动重建、维护任务等）放入队列，由独立的worker进程执行，
+这些工作的耗时不再计入请求延迟。启动worker：
+
+    python worker.py
+
+- 任务用 @job('名称') 注册（见 app/tasks.py），请求中用 enqueue('名称', 参数...) 放入队列，
+  参数用 app.codec 编码，支持日期、Decimal等类型
+- 队列保存在Redis中：worker用 BRPOPLPUSH 把任务移到自己的处理中列表，执行完成后删除；
+  worker异常退出时，其他worker发现其心跳过期后把处理中的任务放回队列，因此任务可能被执行不止一次，必须幂等
+- 失败的任务按 JOBS_RETRY_BACKOFF * 2^重试次数 秒后重试，超过 max_retries 后放入失败列表
+- @job(..., every=秒数) 注册的任务定期执行，多个worker之间只有一个会放入队列
+- Redis不可用时使用进程内队列，由web进程中的后台线程执行
+- 每个任务的执行次数、失败次数和耗时记录在 stats() 中，可通过 /admin/job-stats 查看
+"""
+from collections import deque
+import heapq
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+
+from app import codec
+
+QUEUE_KEY = 'jobs:queue'
+# 等待重试的任务，分数为可以执行的时间
+DELAYED_KEY = 'jobs:delayed'
+FAILED_KEY = 'jobs:failed'
+STATS_KEY = 'jobs:stats'
+# 活跃worker的集合，以及每个worker的心跳和处理中列表
+WORKERS_KEY = 'jobs:workers'
+WORKER_HEARTBEAT_TTL = 30
+# 心跳由单独的线程刷新，执行时间超过心跳有效期的任务不会让worker被当作已退出
+WORKER_HEARTBEAT_INTERVAL = WORKER_HEARTBEAT_TTL / 3
+# 失败列表保留的条数
+FAILED_LIMIT = 100
+
+# 任务名称 -> _Job
+_registry = {}
+_backend = None
+
+
+class _Job:
+    def __init__(self, name, func, max_retries, every):
+        self.name = name
+        self.func = func
+        self.max_retries = max_retries
+        self.every = every
+
+
+def job(name, max_retries=3, every=None):
+    """
+    注册任务，被装饰的函数第一个参数为Flask应用，其余为 enqueue 时传入的关键字参数
+
+    Args:
+        name: 任务名称
+        max_retries: 失败后最多重试的次数
+        every: 定期执行的间隔（秒），为None时只在 enqueue 时执行
+    """
+    def decorator(func):
+        _registry[name] = _Job(name, func, max_retries, every)
+        return func
+    return decorator
+
+
+def init_app(app, redis_client):
+    """选择队列后端；Redis不可用时启动进程内的worker线程"""
+    global _backend
+    from app import tasks  # noqa: F401  注册任务
+    backoff = app.config['JOBS_RETRY_BACKOFF']
+    if redis_client:
+        _backend = RedisBackend(redis_client, backoff)
+    else:
+        _backend = MemoryBackend(backoff)
+        threading.Thread(target=run_worker, args=(app,), kwargs={'install_signals': False},
+                         name='jobs-worker', daemon=True).start()
+
+
+def enqueue(name, unique_for=None, **kwargs):
+    """
+    放入队列，不等待执行
+
+    Args:
+        name: 任务名称
+        unique_for: 秒数；设置后同一任务（名称和参数都相同）在这段时间内只放入一次，
+                    用于冷启动重建等可能被大量请求同时触发的任务
+        kwargs: 任务参数
+
+    Returns:
+        是否放入了队列
+    """
+    if name not in _registry:
+        raise ValueError(f'未注册的任务: {name}')
+    if _backend is None:
+        raise RuntimeError('任务队列尚未初始化')
+    payload = {'id': uuid.uuid4().hex, 'name': name, 'kwargs': kwargs, 'attempt': 0}
+    try:
+        if unique_for and not _backend.claim_unique(f'{name}:{codec.dumps(kwargs, 0)}', unique_for):
+            return False
+        _backend.push(codec.dumps(payload, 0))
+        return True
+    except Exception as e:
+        print(f"Error enqueueing job {name}: {e}")
+        return False
+
+
+def stats():
+    """
+    Returns:
+        {任务名称: {'succeeded', 'failed', 'retried', 'avg_duration', 'max_duration'}, ...}
+    """
+    return _backend.stats() if _backend else {}
+
+
+def queue_sizes():
+    """
+    Returns:
+        {'queued', 'delayed', 'failed'}
+    """
+    return _backend.sizes() if _backend else {}
+
+
+def run_worker(app, install_signals=True):
+    """
+    执行任务直到收到 SIGTERM/SIGINT（当前任务执行完后退出）
+
+    Args:
+        install_signals: 是否安装信号处理（只能在主线程中安装）
+    """
+    stopping = threading.Event()
+    if install_signals:
+        def stop(signum, frame):
+            print("🛑 Worker stopping after current job...")
+            stopping.set()
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+    worker = _backend.register_worker()
+    print(f"👷 Job worker {worker} started ({len(_registry)} jobs registered)")
+    stopped = threading.Event()
+
+    def beat():
+        while not stopped.wait(WORKER_HEARTBEAT_INTERVAL):
+            try:
+                _backend.heartbeat(worker)
+            except Exception as e:
+                print(f"Error refreshing worker heartbeat: {e}")
+
+    threading.Thread(target=beat, name='job-heartbeat', daemon=True).start()
+    try:
+        while not stopping.is_set():
+            try:
+                _backend.recover_dead(worker)
+                _schedule_periodic()
+                _backend.promote_due()
+                raw = _backend.pop(worker, timeout=1)
+            except Exception as e:
+                print(f"Error polling job queue: {e}")
+                time.sleep(1)
+                continue
+            if raw is not None:
+                _execute(app, worker, raw)
+    finally:
+        stopped.set()
+        _backend.unregister_worker(worker)
+
+
+def _schedule_periodic():
+    for registered in _registry.values():
+        if registered.every and _backend.claim_unique(f'periodic:{registered.name}', registered.every):
+            _backend.push(codec.dumps({'id': uuid.uuid4().hex, 'name': registered.name,
+                                       'kwargs': {}, 'attempt': 0}, 0))
+
+
+def _execute(app, worker, raw):
+    try:
+        payload = codec.loads(raw)
+        registered = _registry[payload['name']]
+    except Exception as e:
+        print(f"Dropping invalid job {raw[:100]!r}: {e}")
+        _backend.ack(worker, raw)
+        return
+
+    started = time.monotonic()
+    try:
+        registered.func(app, **payload['kwargs'])
+    except Exception as e:
+        duration = time.monotonic() - started
+        attempt = payload['attempt'] + 1
+        if attempt <= registered.max_retries:
+            delay = _backend.backoff * 2 ** (attempt - 1)
+            print(f"Job {registered.name} failed ({e}), retry {attempt}/{registered.max_retries} in {delay}s")
+            _backend.retry(worker, raw, codec.dumps(dict(payload, attempt=attempt), 0), delay)
+            _backend.record(registered.name, 'retried', duration)
+        else:
+            print(f"Job {registered.name} failed permanently: {e}")
+            _backend.fail(worker, raw, codec.dumps(dict(payload, error=str(e)), 0))
+            _backend.record(registered.name, 'failed', duration)
+        return
+
+    _backend.ack(worker, raw)
+    _backend.record(registered.name, 'succeeded', time.monotonic() - started)
+
+
+def _summarize(counts):
+    """把原始计数整理为 stats() 的格式"""
+    result = {}
+    for name, c in counts.items():
+        runs = c.get('succeeded', 0) + c.get('failed', 0) + c.get('retried', 0)
+        result[name] = {
+            'succeeded': int(c.get('succeeded', 0)),
+            'failed': int(c.get('failed', 0)),
+            'retried': int(c.get('retried', 0)),
+            'avg_duration': c.get('duration', 0) / runs if runs else 0.0,
+            'max_duration': c.get('max_duration', 0.0),
+        }
+    return result
+
+
+# 更新耗时统计：累计次数和总耗时，并保留最大值
+_RECORD_SCRIPT = """
+redis.call('hincrby', KEYS[1], ARGV[1] .. ':' .. ARGV[2], 1)
+redis.call('hincrbyfloat', KEYS[1], ARGV[1] .. ':duration', ARGV[3])
+local max = tonumber(redis.call('hget', KEYS[1], ARGV[1] .. ':max_duration') or '0')
+if tonumber(ARGV[3]) > max then
+    redis.call('hset', KEYS[1], ARGV[1] .. ':max_duration', ARGV[3])
+end
+return 1
+"""
+
+# 把到期的延迟任务移回队列
+_PROMOTE_SCRIPT = """
+local due = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 100)
+for _, raw in ipairs(due) do
+    redis.call('zrem', KEYS[1], raw)
+    redis.call('lpush', KEYS[2], raw)
+end
+return #due
+"""
+
+
+class RedisBackend:
+    """任务队列保存在Redis中，可以有多个worker进程"""
+
+    def __init__(self, redis_client, backoff):
+        self.redis = redis_client
+        self.backoff = backoff
+        self._last_recovery = 0
+
+    @staticmethod
+    def _processing_key(worker):
+        return f'jobs:processing:{worker}'
+
+    @staticmethod
+    def _heartbeat_key(worker):
+        return f'jobs:worker:{worker}'
+
+    def push(self, raw):
+        self.redis.lpush(QUEUE_KEY, raw)
+
+    def claim_unique(self, key, ttl):
+        return bool(self.redis.set(f'jobs:unique:{key}', 1, nx=True, ex=max(int(ttl), 1)))
+
+    def register_worker(self):
+        worker = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.heartbeat(worker)
+        return worker
+
+    def unregister_worker(self, worker):
+        try:
+            self._requeue(worker)
+            self.redis.delete(self._heartbeat_key(worker))
+            self.redis.srem(WORKERS_KEY, worker)
+        except Exception as e:
+            print(f"Error unregistering worker: {e}")
+
+    def heartbeat(self, worker):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.set(self._heartbeat_key(worker), 1, ex=WORKER_HEARTBEAT_TTL)
+        # 被其他worker误判为已退出（例如Redis短暂不可用）时重新加入集合，以便真正退出后能被回收
+        pipe.sadd(WORKERS_KEY, worker)
+        pipe.execute()
+
+    def recover_dead(self, worker):
+        """定期检查其他worker的心跳，把已退出的worker处理中的任务放回队列"""
+        now = time.monotonic()
+        if now - self._last_recovery >= WORKER_HEARTBEAT_TTL:
+            self._last_recovery = now
+            for other in self.redis.smembers(WORKERS_KEY):
+                if other != worker and not self.redis.exists(self._heartbeat_key(other)):
+                    print(f"Recovering jobs from dead worker {other}")
+                    self._requeue(other)
+                    self.redis.srem(WORKERS_KEY, other)
+
+    def _requeue(self, worker):
+        while self.redis.rpoplpush(self._processing_key(worker), QUEUE_KEY) is not None:
+            pass
+
+    def promote_due(self):
+        self.redis.eval(_PROMOTE_SCRIPT, 2, DELAYED_KEY, QUEUE_KEY, time.time())
+
+    def pop(self, worker, timeout):
+        return self.redis.brpoplpush(QUEUE_KEY, self._processing_key(worker), timeout)
+
+    def ack(self, worker, raw):
+        self.redis.lrem(self._processing_key(worker), 1, raw)
+
+    def retry(self, worker, raw, retry_raw, delay):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zadd(DELAYED_KEY, {retry_raw: time.time() + delay})
+        pipe.lrem(self._processing_key(worker), 1, raw)
+        pipe.execute()
+
+    def fail(self, worker, raw, failed_raw):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.lpush(FAILED_KEY, failed_raw)
+        pipe.ltrim(FAILED_KEY, 0, FAILED_LIMIT - 1)
+        pipe.lrem(self._processing_key(worker), 1, raw)
+        pipe.execute()
+
+    def record(self, name, status, duration):
+        try:
+            self.redis.eval(_RECORD_SCRIPT, 1, STATS_KEY, name, status, f'{duration:.6f}')
+        except Exception as e:
+            print(f"Error recording job stats: {e}")
+
+    def stats(self):
+        counts = {}
+        for field, value in self.redis.hgetall(STATS_KEY).items():
+            name, metric = field.rsplit(':', 1)
+            counts.setdefault(name, {})[metric] = float(value)
+        return _summarize(counts)
+
+    def sizes(self):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.llen(QUEUE_KEY)
+        pipe.zcard(DELAYED_KEY)
+        pipe.llen(FAILED_KEY)
+        queued, delayed, failed = pipe.execute()
+        return {'queued': queued, 'delayed': delayed, 'failed': failed}
+
+
+class MemoryBackend:
+    """进程内队列，Redis不可用时使用（任务只在当前进程中执行，进程退出后丢失）"""
+
+    def __init__(self, backoff):
+        self.backoff = backoff
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._delayed = []      # (可执行时间, 序号, raw)
+        self._seq = 0
+        self._failed = deque(maxlen=FAILED_LIMIT)
+        self._unique = {}       # key -> 过期时间
+        self._counts = {}
+
+    def push(self, raw):
+        with self._cond:
+            self._queue.appendleft(raw)
+            self._cond.notify()
+
+    def claim_unique(self, key, ttl):
+        now = time.monotonic()
+        with self._cond:
+            if self._unique.get(key, 0) > now:
+                return False
+            self._unique[key] = now + ttl
+            return True
+
+    def register_worker(self):
+        return f'local:{os.getpid()}'
+
+    def unregister_worker(self, worker):
+        pass
+
+    def heartbeat(self, worker):
+        pass
+
+    def recover_dead(self, worker):
+        pass
+
+    def promote_due(self):
+        now = time.time()
+        with self._cond:
+            while self._delayed and self._delayed[0][0] <= now:
+                self._queue.appendleft(heapq.heappop(self._delayed)[2])
+
+    def pop(self, worker, timeout):
+        with self._cond:
+            if not self._queue:
+                # 有延迟任务时最多等到它可以执行
+                if self._delayed:
+                    timeout = max(0, min(timeout, self._delayed[0][0] - time.time()))
+                self._cond.wait(timeout)
+            return self._queue.pop() if self._queue else None
+
+    def ack(self, worker, raw):
+        pass
+
+    def retry(self, worker, raw, retry_raw, delay):
+        with self._cond:
+            self._seq += 1
+            heapq.heappush(self._delayed, (time.time() + delay, self._seq, retry_raw))
+
+    def fail(self, worker, raw, failed_raw):
+        with self._cond:
+            self._failed.appendleft(failed_raw)
+
+    def record(self, name, status, duration):
+        with self._cond:
+            c = self._counts.setdefault(name, {})
+            c[status] = c.get(status, 0) + 1
+            c['duration'] = c.get('duration', 0) + duration
+            c['max_duration'] = max(c.get('max_duration', 0), duration)
+
+    def stats(self):
+        with self._cond:
+            return _summarize({name: dict(c) for name, c in self._counts.items()})
+
+    def sizes(self):
+        with self._cond:
+            return {'queued': len(self._queue), 'delayed': len(self._delayed),
+                    'failed': len(self._failed)}
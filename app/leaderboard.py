@@ -0,0 +1,467 @@
+"""
+排行榜维护：红榜（摸鱼收益）和黑榜（加班负收益）保存在Redis有序集合中
+
+每次写入/删除记录时在提交数据库事务后原子地调整用户分数，
+读取排行榜只需要一次 ZREVRANGE，查询个人排名只需要一次 ZREVRANK。
+Redis数据丢失或出现漂移时，可以通过 rebuild_leaderboards 从PostgreSQL重建。
+总榜不存在时写入不会创建榜单（否则只包含一个用户的榜单会被当作已经建好），由读取方放入重建任务；
+重建期间的写入另外记录在增量哈希中，替换榜单时补上，不会因为替换而丢失。
+
+除总榜外，每条记录还按所属日期计入日、周、月三个时间桶，桶在周期结束后自动过期，
+因此读取今日/本周/本月榜单的开销只和该周期内的活跃用户数有关，与历史记录总量无关。
+近7天榜单由最近7个日桶在Redis中 ZUNIONSTORE 合并得到。
+"""
+from datetime import datetime, time, timedelta, timezone
+
+RED_BOARD = 'red'      # 摸鱼红榜
+BLACK_BOARD = 'black'  # 加班黑榜
+
+# 榜单对应的记录表
+BOARD_TABLES = {
+    RED_BOARD: 'slacking_records',
+    BLACK_BOARD: 'overtime_records',
+}
+# 榜单在 user_daily_stats 中对应的收益列，用于重建时间桶
+BOARD_DAILY_COLUMNS = {
+    RED_BOARD: 'slacking_earnings',
+    BLACK_BOARD: 'overtime_earnings',
+}
+
+# 用户ID -> 用户名，避免读取榜单时再查数据库
+USERNAMES_KEY = 'leaderboard:usernames'
+
+# 榜单时间窗口 -> 显示名称
+WINDOW_ALL = 'all'
+WINDOWS = {
+    WINDOW_ALL: '总榜',
+    'today': '今日',
+    'week': '本周',
+    'month': '本月',
+    '7d': '近7天',
+}
+# 近7天榜单合并的日桶数量，日桶在当天结束后保留的天数需覆盖这个窗口
+ROLLING_DAYS = 7
+# 合并结果的缓存时间（秒），同一时间段内的读取共享一次 ZUNIONSTORE
+ROLLING_CACHE_TTL = 30
+
+# 与数据库会话时区（Asia/Shanghai）一致，记录的日期按该时区划分
+LOCAL_TZ = timezone(timedelta(hours=8))
+
+# 重建进行中的标记（同时作为重建锁），重建进程崩溃时按有效期（秒）自动释放
+REBUILD_MARKER_KEY = 'leaderboard:rebuilding'
+REBUILD_MARKER_TTL = 600
+# 重建期间的写入："榜单key|用户ID" -> 变化量
+REBUILD_DELTAS_KEY = 'leaderboard:rebuild:deltas'
+
+# KEYS[1] 总榜，KEYS[2] 重建标记，KEYS[3] 增量哈希，其余为要调整的榜单（总榜和时间桶）
+# ARGV[1] 用户ID，之后每个榜单对应 (变化量, 过期时间戳，0表示不过期)
+# 总榜不存在时不写入，返回0；重建进行中时同时记录增量
+_INCREMENT_SCRIPT = """
+local logging = redis.call('exists', KEYS[2]) == 1
+local built = redis.call('exists', KEYS[1]) == 1
+for i = 4, #KEYS do
+    local amount = ARGV[2 * (i - 3)]
+    local expire_at = tonumber(ARGV[2 * (i - 3) + 1])
+    if logging then
+        redis.call('hincrbyfloat', KEYS[3], KEYS[i] .. '|' .. ARGV[1], amount)
+    end
+    if built then
+        redis.call('zincrby', KEYS[i], amount, ARGV[1])
+        if expire_at > 0 then
+            redis.call('expireat', KEYS[i], expire_at)
+        end
+    end
+end
+if built then
+    return 1
+end
+return 0
+"""
+
+# KEYS[1] 增量哈希，KEYS[2] 重建标记，之后成对的 (临时key, 榜单key)
+# ARGV 为每个榜单的过期时间戳（0表示不过期）
+# 把重建期间的增量补到临时key上，再原子地替换所有榜单
+_SWAP_SCRIPT = """
+local tmp_keys = {}
+for i = 3, #KEYS, 2 do
+    tmp_keys[KEYS[i + 1]] = KEYS[i]
+end
+local deltas = redis.call('hgetall', KEYS[1])
+for i = 1, #deltas, 2 do
+    local sep = string.find(deltas[i], '|', 1, true)
+    local tmp_key = tmp_keys[string.sub(deltas[i], 1, sep - 1)]
+    if tmp_key then
+        redis.call('zincrby', tmp_key, deltas[i + 1], string.sub(deltas[i], sep + 1))
+    end
+end
+for i = 3, #KEYS, 2 do
+    if redis.call('exists', KEYS[i]) == 1 then
+        redis.call('rename', KEYS[i], KEYS[i + 1])
+        local expire_at = tonumber(ARGV[(i - 1) / 2])
+        if expire_at > 0 then
+            redis.call('expireat', KEYS[i + 1], expire_at)
+        end
+    else
+        redis.call('del', KEYS[i + 1])
+    end
+end
+redis.call('del', KEYS[1], KEYS[2])
+return 1
+"""
+
+
+def board_key(board):
+    return f'leaderboard:{board}'
+
+
+def today():
+    """当前日期（UTC+8）"""
+    return datetime.now(LOCAL_TZ).date()
+
+
+def _expire_at(day):
+    """某天零点（UTC+8）对应的Unix时间戳，用作时间桶的过期时间"""
+    return int(datetime.combine(day, time.min, tzinfo=LOCAL_TZ).timestamp())
+
+
+def _next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _buckets(board, day):
+    """
+    一条记录所属的时间桶
+
+    Returns:
+        [(key, 过期时间戳), ...]
+    """
+    week_start = day - timedelta(days=day.weekday())
+    month_start = day.replace(day=1)
+    return [
+        (f'{board_key(board)}:day:{day:%Y%m%d}', _expire_at(day + timedelta(days=ROLLING_DAYS + 1))),
+        (f'{board_key(board)}:week:{week_start:%Y%m%d}', _expire_at(week_start + timedelta(days=8))),
+        (f'{board_key(board)}:month:{month_start:%Y%m}', _expire_at(_next_month(month_start) + timedelta(days=1))),
+    ]
+
+
+def window_range(window, day=None):
+    """
+    时间窗口覆盖的日期范围
+
+    Returns:
+        (起始日期, 结束日期)，两端都包含
+    """
+    day = day or today()
+    if window == 'today':
+        return day, day
+    if window == 'week':
+        return day - timedelta(days=day.weekday()), day
+    if window == 'month':
+        return day.replace(day=1), day
+    if window == '7d':
+        return day - timedelta(days=ROLLING_DAYS - 1), day
+    raise ValueError(f'unknown leaderboard window: {window}')
+
+
+def window_key(board, window, day=None):
+    """日/周/月窗口直接对应一个时间桶，近7天窗口对应合并结果的key"""
+    day = day or today()
+    if window == WINDOW_ALL:
+        return board_key(board)
+    if window == '7d':
+        return f'{board_key(board)}:7d:{day:%Y%m%d}'
+    bucket = {'today': 0, 'week': 1, 'month': 2}[window]
+    return _buckets(board, day)[bucket][0]
+
+
+def register_user(redis_client, user_id, username):
+    """
+    新用户注册后以0分加入两个榜单（与原先 LEFT JOIN 的结果保持一致）
+
+    榜单不存在时不加入，重建时会从数据库读到该用户
+
+    Args:
+        redis_client: Redis客户端，可以为None
+        user_id: 用户ID
+        username: 用户名
+    """
+    if not redis_client:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        for board in BOARD_TABLES:
+            # 增加0分：用户不在榜单中时以0分加入，已在榜单中时不变
+            _increment(pipe, board, user_id, [(board_key(board), 0, 0)])
+        pipe.hset(USERNAMES_KEY, user_id, username)
+        pipe.execute()
+    except Exception as e:
+        print(f"Error updating leaderboard: {e}")
+
+
+def add_earnings(redis_client, board, user_id, amount, username=None, day=None):
+    """
+    原子地调整用户在榜单中的分数，写入记录时amount为正，删除记录时为负
+
+    Args:
+        redis_client: Redis客户端，可以为None
+        board: RED_BOARD 或 BLACK_BOARD
+        user_id: 用户ID
+        amount: 收益变化量
+        username: 用户名（可选，用于刷新用户名映射）
+        day: 记录所属日期，决定计入哪些时间桶，为None时表示今天
+    """
+    add_earnings_by_day(redis_client, board, user_id, [(day or today(), amount)], username)
+
+
+def add_earnings_by_day(redis_client, board, user_id, amounts, username=None):
+    """
+    按记录日期批量调整用户分数，总榜和各时间桶在一个事务中更新
+
+    Args:
+        amounts: [(记录日期, 收益变化量), ...]
+    """
+    if not redis_client:
+        return
+
+    by_day = {}
+    for day, amount in amounts:
+        by_day[day] = by_day.get(day, 0) + float(amount or 0)
+    total = sum(by_day.values())
+    if not any(by_day.values()):
+        return
+
+    try:
+        now = datetime.now(LOCAL_TZ).timestamp()
+        changes = [(board_key(board), total, 0)] if total else []
+        for day, amount in by_day.items():
+            if not amount:
+                continue
+            for key, expire_at in _buckets(board, day):
+                # 已过期的时间桶不再写入（例如删除很久以前的记录）
+                if expire_at <= now:
+                    continue
+                changes.append((key, amount, expire_at))
+        pipe = redis_client.pipeline(transaction=True)
+        _increment(pipe, board, user_id, changes)
+        if username:
+            pipe.hset(USERNAMES_KEY, user_id, username)
+        pipe.execute()
+    except Exception as e:
+        print(f"Error updating leaderboard: {e}")
+
+
+def _increment(pipe, board, user_id, changes):
+    """
+    在总榜存在时调整分数，重建进行中时同时记录增量
+
+    Args:
+        changes: [(榜单key, 变化量, 过期时间戳), ...]
+    """
+    keys = [board_key(board), REBUILD_MARKER_KEY, REBUILD_DELTAS_KEY]
+    args = [user_id]
+    for key, amount, expire_at in changes:
+        keys.append(key)
+        args.extend([amount, expire_at])
+    pipe.eval(_INCREMENT_SCRIPT, len(keys), *keys, *args)
+
+
+def top_n(redis_client, board, n=10):
+    """
+    读取榜单前n名
+
+    Returns:
+        [(username, total_earnings, user_id), ...]；榜单不存在（需要重建）时返回None
+    """
+    entries = redis_client.zrevrange(board_key(board), 0, n - 1, withscores=True)
+    if not entries:
+        if not redis_client.exists(board_key(board)):
+            return None
+        return []
+    return _with_usernames(redis_client, entries)
+
+
+def window_top_n(redis_client, board, window, n=10):
+    """
+    读取时间窗口榜单前n名，近7天榜单先在Redis中合并最近7个日桶
+
+    时间桶不存在只说明该周期内没有记录，是否需要冷启动重建以总榜是否存在为准。
+
+    Returns:
+        [(username, total_earnings, user_id), ...]；总榜不存在（需要重建）时返回None
+    """
+    if window == WINDOW_ALL:
+        return top_n(redis_client, board, n)
+
+    day = today()
+    key = window_key(board, window, day)
+    pipe = redis_client.pipeline(transaction=False)
+    if window == '7d':
+        start, _ = window_range(window, day)
+        day_keys = [_buckets(board, start + timedelta(days=i))[0][0] for i in range(ROLLING_DAYS)]
+        # 合并结果短暂缓存，过期后由下一次读取重新合并
+        if not redis_client.exists(key):
+            pipe.zunionstore(key, day_keys)
+            pipe.expire(key, ROLLING_CACHE_TTL)
+    pipe.zrevrange(key, 0, n - 1, withscores=True)
+    pipe.exists(board_key(board))
+    results = pipe.execute()
+    entries, built = results[-2], results[-1]
+
+    if not built:
+        return None
+    if not entries:
+        return []
+    return _with_usernames(redis_client, entries)
+
+
+def _with_usernames(redis_client, entries):
+    user_ids = [user_id for user_id, _ in entries]
+    usernames = redis_client.hmget(USERNAMES_KEY, user_ids)
+    return [(username or user_id, score, int(user_id))
+            for (user_id, score), username in zip(entries, usernames)]
+
+
+def query_window_top_n(cur, board, window, n=10):
+    """
+    Redis不可用时从按天汇总的 user_daily_stats 计算时间窗口榜单，只扫描窗口内的日期
+
+    Returns:
+        [(username, total_earnings, user_id), ...]
+    """
+    start, end = window_range(window)
+    column = BOARD_DAILY_COLUMNS[board]
+    cur.execute(f'''SELECT u.username, SUM(d.{column}) AS total_earnings, u.id
+                   FROM user_daily_stats d
+                   JOIN users u ON u.id = d.user_id
+                   WHERE d.day BETWEEN %s AND %s
+                   GROUP BY u.id, u.username
+                   HAVING SUM(d.{column}) <> 0
+                   ORDER BY total_earnings DESC
+                   LIMIT %s''', (start, end, n))
+    return cur.fetchall()
+
+
+def user_rank(redis_client, board, user_id):
+    """
+    查询用户在榜单中的名次（从1开始）
+
+    Returns:
+        名次；用户不在榜单中或Redis不可用时返回None
+    """
+    if not redis_client:
+        return None
+    try:
+        rank = redis_client.zrevrank(board_key(board), user_id)
+        return rank + 1 if rank is not None else None
+    except Exception as e:
+        print(f"Error reading leaderboard: {e}")
+        return None
+
+
+def rebuild_leaderboards(conn, redis_client):
+    """
+    从PostgreSQL全量重建两个榜单
+
+    先写入临时key，最后补上重建期间的增量并原子地替换所有榜单，
+    读者不会看到只重建了一半的榜单，重建期间的写入也不会丢失。
+
+    Returns:
+        {board: 用户数}
+
+    Raises:
+        RuntimeError: 另一个重建正在进行
+    """
+    if not redis_client.set(REBUILD_MARKER_KEY, 1, nx=True, ex=REBUILD_MARKER_TTL):
+        raise RuntimeError('排行榜正在重建')
+    # 标记设置之后才开始读取数据库：读取期间及之后的写入都会记录在增量哈希中。
+    # 在标记设置前已提交、标记设置后才更新Redis的写入会被重复计入，窗口只有提交到更新Redis之间的几毫秒
+    redis_client.delete(REBUILD_DELTAS_KEY)
+    cur = conn.cursor()
+    result = {}
+    try:
+        # [(临时key, 榜单key, 过期时间戳), ...]
+        targets = []
+        usernames = {}
+        for board, table in BOARD_TABLES.items():
+            cur.execute(f'''SELECT u.id, u.username, COALESCE(SUM(r.earnings), 0)
+                           FROM users u
+                           LEFT JOIN {table} r ON u.id = r.user_id
+                           GROUP BY u.id, u.username''')
+            rows = cur.fetchall()
+
+            tmp_key = f'{board_key(board)}:rebuild'
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.delete(tmp_key)
+            for i in range(0, len(rows), 1000):
+                pipe.zadd(tmp_key, {row[0]: float(row[2]) for row in rows[i:i + 1000]})
+            pipe.execute()
+            targets.append((tmp_key, board_key(board), 0))
+
+            usernames.update({row[0]: row[1] for row in rows})
+            result[board] = len(rows)
+
+        if usernames:
+            redis_client.hset(USERNAMES_KEY, mapping=usernames)
+
+        targets.extend(_rebuild_buckets(cur, redis_client))
+
+        keys = [REBUILD_DELTAS_KEY, REBUILD_MARKER_KEY]
+        for tmp_key, key, _ in targets:
+            keys.extend([tmp_key, key])
+        redis_client.eval(_SWAP_SCRIPT, len(keys), *keys, *[expire_at for _, _, expire_at in targets])
+        redis_client.delete(*[window_key(board, '7d') for board in BOARD_TABLES])
+    finally:
+        cur.close()
+        # 出错时释放重建标记；替换成功时标记已经删除
+        redis_client.delete(REBUILD_MARKER_KEY)
+    return result
+
+
+def _rebuild_buckets(cur, redis_client):
+    """
+    从 user_daily_stats 把仍在有效期内的日/周/月时间桶写入临时key
+
+    只重建起始日期不早于读取范围的桶，保证每个重建的桶都是完整的。
+
+    Returns:
+        [(临时key, 桶key, 过期时间戳), ...]，没有数据的桶没有临时key，替换时删除
+    """
+    day = today()
+    since = min(day.replace(day=1), day - timedelta(days=day.weekday()),
+                day - timedelta(days=ROLLING_DAYS))
+    now = datetime.now(LOCAL_TZ).timestamp()
+
+    boards = list(BOARD_DAILY_COLUMNS)
+    cur.execute(f'''SELECT user_id, day, {', '.join(BOARD_DAILY_COLUMNS[board] for board in boards)}
+                   FROM user_daily_stats WHERE day >= %s''', (since,))
+    rows = cur.fetchall()
+
+    targets = []
+    for index, board in enumerate(boards):
+        # 范围内所有可能存在的桶，重建后没有数据的桶需要删除
+        buckets = {}
+        for offset in range((day - since).days + 1):
+            current = since + timedelta(days=offset)
+            starts = (current, current - timedelta(days=current.weekday()), current.replace(day=1))
+            for start, (key, expire_at) in zip(starts, _buckets(board, current)):
+                if start >= since and expire_at > now:
+                    buckets.setdefault(key, (expire_at, {}))
+
+        for user_id, row_day, *earnings in rows:
+            amount = float(earnings[index] or 0)
+            if not amount:
+                continue
+            for key, _ in _buckets(board, row_day):
+                if key in buckets:
+                    scores = buckets[key][1]
+                    scores[user_id] = scores.get(user_id, 0) + amount
+
+        pipe = redis_client.pipeline(transaction=False)
+        for key, (expire_at, scores) in buckets.items():
+            tmp_key = f'{key}:rebuild'
+            pipe.delete(tmp_key)
+            if scores:
+                pipe.zadd(tmp_key, scores)
+            targets.append((tmp_key, key, expire_at))
+        pipe.execute()
+    return targets
@@ -0,0 +1,194 @@
+"""
+内存分配快照（基于 tracemalloc）
+
+用于排查worker内存持续增长：开启追踪后按需或定期拍摄快照，比较两个快照之间按文件和行号
+（或完整调用栈）分组的分配变化，找出增长最多的位置。
+
+- 追踪默认关闭，设置 MEMORY_TRACING=true 在启动时开启，或通过 /admin/memory/start 在运行中开启
+- 开销由 MEMORY_TRACE_FRAMES 控制：每次分配记录的调用栈层数，1层开销最小（只能按行分组），
+  层数越多越能看出是谁调用的，但内存和CPU开销也越大；建议只在一个canary worker上长期开启
+- MEMORY_SNAPSHOT_INTERVAL 大于0时每隔这么多秒自动拍摄一次快照
+- 只保留最近 MEMORY_SNAPSHOT_KEEP 个快照；快照和统计都只针对当前worker进程
+"""
+import itertools
+import linecache
+import os
+import threading
+import time
+import tracemalloc
+
+# 分组方式，与 tracemalloc.Snapshot.statistics 的 key_type 对应
+GROUP_BY = ('lineno', 'filename', 'traceback')
+
+# 快照中排除的分配：tracemalloc自身和导入机制
+_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+_lock = threading.Lock()
+_snapshots = []     # [(id, 信息, Snapshot), ...]，最旧的在前
+_ids = itertools.count(1)
+_keep = 4
+_periodic = None
+
+
+def init_app(app):
+    """按配置开启追踪和定期快照"""
+    global _keep, _periodic
+    _keep = app.config['MEMORY_SNAPSHOT_KEEP']
+    if app.config['MEMORY_TRACING']:
+        start(app.config['MEMORY_TRACE_FRAMES'])
+    interval = app.config['MEMORY_SNAPSHOT_INTERVAL']
+    if interval > 0 and _periodic is None:
+        def run():
+            while True:
+                time.sleep(interval)
+                if tracemalloc.is_tracing():
+                    try:
+                        take_snapshot('periodic')
+                    except Exception as e:
+                        print(f"Error taking memory snapshot: {e}")
+
+        _periodic = threading.Thread(target=run, name='memory-snapshots', daemon=True)
+        _periodic.start()
+
+
+def start(frames=1):
+    """开始追踪；已在追踪时不改变调用栈层数"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(int(frames), 1))
+
+
+def stop():
+    """停止追踪并丢弃所有快照"""
+    tracemalloc.stop()
+    with _lock:
+        _snapshots.clear()
+
+
+def _rss_bytes():
+    """当前进程的常驻内存，无法读取 /proc 时返回None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def status():
+    """
+    Returns:
+        {'tracing', 'frames', 'traced_current', 'traced_peak', 'tracemalloc_overhead', 'rss', 'snapshots'}
+    """
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+    return {
+        'tracing': tracing,
+        'frames': tracemalloc.get_traceback_limit() if tracing else 0,
+        'traced_current': current,
+        'traced_peak': peak,
+        # tracemalloc 自身占用的内存，用于评估开销
+        'tracemalloc_overhead': tracemalloc.get_tracemalloc_memory() if tracing else 0,
+        'rss': _rss_bytes(),
+        'snapshots': list_snapshots(),
+    }
+
+
+def take_snapshot(label=None):
+    """
+    拍摄快照，超过保留数量时丢弃最旧的
+
+    Returns:
+        快照信息 {'id', 'label', 'taken_at', 'traced_current', 'rss'}
+
+    Raises:
+        RuntimeError: 没有开启追踪
+    """
+    if not tracemalloc.is_tracing():
+        raise RuntimeError('内存追踪未开启')
+    snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+    info = {
+        'id': next(_ids),
+        'label': label,
+        'taken_at': time.time(),
+        'traced_current': tracemalloc.get_traced_memory()[0],
+        'rss': _rss_bytes(),
+    }
+    with _lock:
+        _snapshots.append((info['id'], info, snapshot))
+        del _snapshots[:-_keep]
+    return info
+
+
+def list_snapshots():
+    with _lock:
+        return [info for _, info, _ in _snapshots]
+
+
+def _get(snapshot_id):
+    with _lock:
+        for current_id, _, snapshot in _snapshots:
+            if current_id == snapshot_id:
+                return snapshot
+    raise KeyError(f'快照不存在: {snapshot_id}')
+
+
+def _location(traceback):
+    """分配发生的位置（调用栈最内层）"""
+    frame = traceback[-1]
+    return {'file': _short_path(frame.filename), 'line': frame.lineno,
+            'code': linecache.getline(frame.filename, frame.lineno).strip()}
+
+
+def _short_path(path):
+    """项目内的文件显示相对路径"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.relpath(path, root) if path.startswith(root + os.sep) else path
+
+
+def _traceback(traceback):
+    """调用栈，最外层在前"""
+    return [f'{_short_path(frame.filename)}:{frame.lineno}' for frame in traceback]
+
+
+def top(snapshot_id, group_by='lineno', limit=20):
+    """
+    快照中占用内存最多的分配位置
+
+    Returns:
+        [{'file', 'line', 'code', 'size', 'count'[, 'traceback']}, ...]
+    """
+    stats = _get(snapshot_id).statistics(group_by)
+    result = []
+    for stat in stats[:limit]:
+        item = _location(stat.traceback)
+        item.update({'size': stat.size, 'count': stat.count})
+        if group_by == 'traceback':
+            item['traceback'] = _traceback(stat.traceback)
+        result.append(item)
+    return result
+
+
+def diff(old_id, new_id, group_by='lineno', limit=20):
+    """
+    两个快照之间增长最多的分配位置（按增长量从大到小）
+
+    Returns:
+        [{'file', 'line', 'code', 'size_diff', 'count_diff', 'size', 'count'[, 'traceback']}, ...]
+    """
+    stats = _get(new_id).compare_to(_get(old_id), group_by)
+    result = []
+    for stat in stats[:limit]:
+        item = _location(stat.traceback)
+        item.update({'size_diff': stat.size_diff, 'count_diff': stat.count_diff,
+                     'size': stat.size, 'count': stat.count})
+        if group_by == 'traceback':
+            item['traceback'] = _traceback(stat.traceback)
+        result.append(item)
+    return result
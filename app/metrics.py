@@ -0,0 +1,389 @@
+"""
+请求指标，以Prometheus文本格式从 /metrics 导出
+
+- 每个路由的处理时间直方图和按状态码计数
+- 每个请求的SQL条数和数据库耗时（连接池创建的连接使用 TimedCursor，所有 execute 都会被计时）
+- 从连接池取连接的等待时间
+- 每个请求的Redis耗时（Redis客户端使用 TimedRedisConnection，记录发送命令和读取响应的时间）
+- 模板渲染时间（Flask的 before_render_template / template_rendered 信号）
+- 各缓存名称的L1/L2命中、未命中和Redis错误次数（读取 app.cache 的统计）
+- 连接池大小、排队和拒绝次数（读取连接池统计）
+
+记录指标时不加锁：每个线程只写自己的计数表，导出时再合并所有线程的数据；
+线程结束后其数据在新线程开始记录或下次导出时并入汇总表，按请求创建线程时计数表的数量也不会无限增长。
+指标只统计当前worker进程。
+
+main 和 api 蓝图的响应带有 Server-Timing 头（db、redis、pool-wait、render、total），
+浏览器开发者工具中可以直接看到耗时分布；设置 REQUEST_LOG 后同样的数据以JSON行写入本地日志。
+"""
+from bisect import bisect_left
+import hmac
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+import threading
+import time
+
+from flask import request, signals
+from psycopg2 import extensions
+from redis.connection import Connection
+
+# 直方图的桶（上界，秒或次数）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# 不在请求中执行的SQL（后台线程、命令）使用的 endpoint 标签
+BACKGROUND = 'background'
+
+# 带有 Server-Timing 头的蓝图
+SERVER_TIMING_BLUEPRINTS = ('main', 'api')
+
+request_logger = logging.getLogger('request_timing')
+
+# 指标名称 -> (类型, 说明, 标签名, 直方图的桶)
+METRICS = {
+    'http_requests_total': ('counter', 'HTTP requests by endpoint and status',
+                            ('endpoint', 'method', 'status'), None),
+    'http_request_duration_seconds': ('histogram', 'Request handling time',
+                                      ('endpoint', 'method'), LATENCY_BUCKETS),
+    'db_queries_per_request': ('histogram', 'SQL statements executed per request',
+                               ('endpoint',), COUNT_BUCKETS),
+    'db_time_per_request_seconds': ('histogram', 'Time spent in SQL statements per request',
+                                    ('endpoint',), LATENCY_BUCKETS),
+    'redis_time_per_request_seconds': ('histogram', 'Time spent in Redis commands per request',
+                                       ('endpoint',), LATENCY_BUCKETS),
+    'db_queries_total': ('counter', 'SQL statements executed', ('endpoint',), None),
+    'db_query_seconds_total': ('counter', 'Time spent in SQL statements', ('endpoint',), None),
+    'db_pool_wait_seconds': ('histogram', 'Time to check out a connection from the pool',
+                             ('endpoint',), WAIT_BUCKETS),
+    'template_render_seconds': ('histogram', 'Template rendering time', ('template',), LATENCY_BUCKETS),
+}
+
+
+class _Store:
+    """一个线程的计数表，只由该线程写入"""
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.counters = {}      # (名称, 标签值) -> 值
+        self.histograms = {}    # (名称, 标签值) -> [各桶计数..., +Inf计数, 总和]
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        buckets = METRICS[name][3]
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        histogram[bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+    def merge_into(self, counters, histograms):
+        # dict() 复制在持有GIL时一次完成，所有者线程同时写入不会导致迭代出错
+        for key, value in dict(self.counters).items():
+            counters[key] = counters.get(key, 0) + value
+        for key, histogram in dict(self.histograms).items():
+            histogram = list(histogram)
+            total = histograms.get(key)
+            if total is None:
+                histograms[key] = histogram
+            else:
+                for i, value in enumerate(histogram):
+                    total[i] += value
+
+
+class RequestTimers:
+    """当前请求的耗时累计"""
+    __slots__ = ('endpoint', 'started', 'db_count', 'db_time', 'redis_time', 'pool_wait', 'render_time',
+                 '_render_started')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.redis_time = 0.0
+        self.pool_wait = 0.0
+        self.render_time = 0.0
+        self._render_started = []
+
+    def server_timing(self, total):
+        """Server-Timing 头的值，耗时单位为毫秒"""
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_count} queries"',
+            f'redis;dur={self.redis_time * 1000:.1f}',
+            f'pool-wait;dur={self.pool_wait * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+_local = threading.local()
+_stores_lock = threading.Lock()
+_stores = []
+# 已结束线程的数据
+_retired = _Store(None)
+
+
+def _store():
+    store = getattr(_local, 'store', None)
+    if store is None:
+        store = _local.store = _Store(threading.current_thread())
+        with _stores_lock:
+            _retire_dead()
+            _stores.append(store)
+    return store
+
+
+def _retire_dead():
+    """把已结束线程的数据并入汇总表，调用方需持有 _stores_lock"""
+    dead = [store for store in _stores if not store.thread.is_alive()]
+    for store in dead:
+        _stores.remove(store)
+        store.merge_into(_retired.counters, _retired.histograms)
+
+
+def current_timers():
+    """当前线程正在处理的请求的耗时累计，不在请求中时返回None"""
+    return getattr(_local, 'timers', None)
+
+
+def _endpoint():
+    timers = current_timers()
+    return timers.endpoint if timers else BACKGROUND
+
+
+class TimedCursor(extensions.cursor):
+    """记录每条SQL耗时的游标，通过连接参数 cursor_factory 启用"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(time.perf_counter() - started)
+
+
+def record_query(duration):
+    timers = current_timers()
+    endpoint = BACKGROUND
+    if timers:
+        timers.db_count += 1
+        timers.db_time += duration
+        endpoint = timers.endpoint
+    store = _store()
+    store.inc('db_queries_total', (endpoint,))
+    store.inc('db_query_seconds_total', (endpoint,), duration)
+
+
+class TimedRedisConnection(Connection):
+    """
+    记录发送命令和读取响应耗时的Redis连接，通过连接池参数 connection_class 启用
+
+    只累计到当前请求：后台线程（如失效广播的订阅）会长时间阻塞在读取响应上，不计入指标
+    """
+
+    def send_packed_command(self, *args, **kwargs):
+        timers = current_timers()
+        if timers is None:
+            return super().send_packed_command(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().send_packed_command(*args, **kwargs)
+        finally:
+            timers.redis_time += time.perf_counter() - started
+
+    def read_response(self, *args, **kwargs):
+        timers = current_timers()
+        if timers is None:
+            return super().read_response(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().read_response(*args, **kwargs)
+        finally:
+            timers.redis_time += time.perf_counter() - started
+
+
+def record_pool_wait(duration):
+    """记录一次取连接的耗时（含排队和健康检查）"""
+    timers = current_timers()
+    if timers:
+        timers.pool_wait += duration
+    _store().observe('db_pool_wait_seconds', (_endpoint(),), duration)
+
+
+def init_app(app):
+    """注册请求钩子、模板渲染信号和 /metrics 路由，按配置打开请求耗时日志"""
+    server_timing = app.config['SERVER_TIMING']
+    log_path = app.config['REQUEST_LOG']
+    if log_path and not request_logger.handlers:
+        handler = RotatingFileHandler(log_path, maxBytes=app.config['REQUEST_LOG_MAX_BYTES'],
+                                      backupCount=app.config['REQUEST_LOG_BACKUPS'], encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        request_logger.addHandler(handler)
+        request_logger.setLevel(logging.INFO)
+        request_logger.propagate = False
+
+    @app.before_request
+    def start_request_timers():
+        _local.timers = RequestTimers(request.endpoint or 'unmatched')
+
+    @app.after_request
+    def record_request_metrics(response):
+        timers = current_timers()
+        if timers:
+            duration = time.perf_counter() - timers.started
+            store = _store()
+            store.inc('http_requests_total', (timers.endpoint, request.method, str(response.status_code)))
+            store.observe('http_request_duration_seconds', (timers.endpoint, request.method), duration)
+            store.observe('db_queries_per_request', (timers.endpoint,), timers.db_count)
+            store.observe('db_time_per_request_seconds', (timers.endpoint,), timers.db_time)
+            store.observe('redis_time_per_request_seconds', (timers.endpoint,), timers.redis_time)
+            if server_timing and request.blueprint in SERVER_TIMING_BLUEPRINTS:
+                response.headers['Server-Timing'] = timers.server_timing(duration)
+            if log_path:
+                _log_request(timers, response, duration)
+        return response
+
+    @app.teardown_request
+    def clear_request_timers(error):
+        _local.timers = None
+
+    def render_started(sender, template, context, **extra):
+        timers = current_timers()
+        if timers:
+            timers._render_started.append(time.perf_counter())
+
+    def render_finished(sender, template, context, **extra):
+        timers = current_timers()
+        if timers and timers._render_started:
+            duration = time.perf_counter() - timers._render_started.pop()
+            # 嵌套渲染只计入最外层，避免重复累计
+            if not timers._render_started:
+                timers.render_time += duration
+            _store().observe('template_render_seconds', (template.name or 'string',), duration)
+
+    signals.before_render_template.connect(render_started, app, weak=False)
+    signals.template_rendered.connect(render_finished, app, weak=False)
+
+    @app.route('/metrics')
+    def metrics():
+        # 需要请求头 Authorization: Bearer <METRICS_TOKEN>；未设置 METRICS_TOKEN 时接口关闭
+        token = app.config.get('METRICS_TOKEN')
+        provided = request.headers.get('Authorization', '')
+        if not token or not hmac.compare_digest(provided, f'Bearer {token}'):
+            return app.response_class('Forbidden\n', status=403, mimetype='text/plain')
+        return app.response_class(render(app), mimetype='text/plain; version=0.0.4')
+
+
+def _log_request(timers, response, duration):
+    try:
+        request_logger.info(json.dumps({
+            'ts': time.time(),
+            'endpoint': timers.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(duration * 1000, 3),
+            'db_ms': round(timers.db_time * 1000, 3),
+            'db_queries': timers.db_count,
+            'redis_ms': round(timers.redis_time * 1000, 3),
+            'pool_wait_ms': round(timers.pool_wait * 1000, 3),
+            'render_ms': round(timers.render_time * 1000, 3),
+        }, ensure_ascii=False))
+    except Exception as e:
+        print(f"Error writing request log: {e}")
+
+
+def _collect():
+    """合并所有线程的数据"""
+    counters, histograms = {}, {}
+    with _stores_lock:
+        _retire_dead()
+        stores = list(_stores)
+    for store in stores + [_retired]:
+        store.merge_into(counters, histograms)
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_bound(bound):
+    return f'{bound:g}'
+
+
+def render(app):
+    """Prometheus文本格式的所有指标"""
+    counters, histograms = _collect()
+    lines = []
+    for name, (kind, description, label_names, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(label_names, labels)} {value}')
+            continue
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + (float('inf'),), histogram):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_bound(bound)
+                le_label = f'le="{le}"'
+                lines.append(f'{name}_bucket{_labels(label_names, labels, le_label)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(label_names, labels)} {histogram[-1]}')
+            lines.append(f'{name}_count{_labels(label_names, labels)} {cumulative}')
+
+    lines.extend(_cache_lines())
+    lines.extend(_pool_lines(app.get_db_pool_stats()))
+    return '\n'.join(lines) + '\n'
+
+
+def _cache_lines():
+    from app import cache
+    lines = ['# HELP cache_requests_total Cache lookups by namespace and result',
+             '# TYPE cache_requests_total counter']
+    for namespace, counts in sorted(cache.stats().items()):
+        for result, field in (('l1_hit', 'l1_hits'), ('l2_hit', 'l2_hits'),
+                              ('miss', 'misses'), ('error', 'errors')):
+            lines.append(f'cache_requests_total{_labels(("namespace", "result"), (namespace, result))} '
+                         f'{counts[field]}')
+    return lines
+
+
+def _pool_lines(stats):
+    if stats is None:
+        return []
+    lines = []
+    for name, key, kind, description in (
+        ('db_pool_connections', 'size', 'gauge', 'Open connections in the pool'),
+        ('db_pool_connections_in_use', 'in_use', 'gauge', 'Connections checked out'),
+        ('db_pool_waiting', 'waiting', 'gauge', 'Requests waiting for a connection'),
+        ('db_pool_checkouts_total', 'checkouts', 'counter', 'Connection checkouts'),
+        ('db_pool_timeouts_total', 'timeouts', 'counter', 'Checkouts that timed out waiting'),
+        ('db_pool_rejected_total', 'rejected', 'counter', 'Checkouts rejected because the wait queue was full'),
+    ):
+        lines.extend([f'# HELP {name} {description}', f'# TYPE {name} {kind}', f'{name} {stats[key]}'])
+    return lines
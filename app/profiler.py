@@ -0,0 +1,157 @@
+"""
+按请求开启的采样分析器
+
+被分析的请求执行期间，后台线程每隔 PROFILE_INTERVAL_MS 毫秒读取一次该请求线程的调用栈，
+请求结束后把采样结果以折叠栈格式（每行 "外层;...;内层 次数"）写入 PROFILE_DIR，
+可以直接交给 flamegraph.pl 或 speedscope 生成火焰图。
+
+开启方式：
+- 请求头 X-Profile: 1，同时带上有效的 X-Admin-Token（只有管理员可以开启），
+  响应头 X-Profile-File 返回结果文件名
+- PROFILE_SAMPLE_EVERY 设为N时，每N个请求自动分析一个
+
+未开启时每个请求只多一次请求头检查和一次计数，没有采样线程在运行。
+结果文件可以通过 /admin/profiles 列出和下载。
+"""
+import itertools
+import os
+import sys
+import threading
+import time
+import uuid
+
+from flask import request
+
+_local = threading.local()
+_requests = itertools.count(1)
+
+# 线程ID -> 正在分析的请求，只在持有 _lock 时修改
+_active = {}
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_sampler = None
+# 采样间隔（秒）
+_interval = 0.005
+
+
+class _Profile:
+    __slots__ = ('thread_id', 'started', 'stacks')
+
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.started = time.perf_counter()
+        self.stacks = {}
+
+
+def _collapse(frame):
+    """调用栈转换为折叠栈的一行（最外层在前）"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _run_sampler(interval):
+    while True:
+        _wakeup.wait()
+        with _lock:
+            if not _active:
+                _wakeup.clear()
+                continue
+            profiles = list(_active.values())
+        frames = sys._current_frames()
+        for profile in profiles:
+            frame = frames.get(profile.thread_id)
+            if frame is not None:
+                stack = _collapse(frame)
+                profile.stacks[stack] = profile.stacks.get(stack, 0) + 1
+        del frames
+        time.sleep(interval)
+
+
+def _start():
+    global _sampler
+    profile = _Profile(threading.get_ident())
+    with _lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_run_sampler, args=(_interval,),
+                                        name='request-profiler', daemon=True)
+            _sampler.start()
+        _active[profile.thread_id] = profile
+        _wakeup.set()
+    _local.profile = profile
+
+
+def _stop():
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        return None
+    _local.profile = None
+    with _lock:
+        _active.pop(profile.thread_id, None)
+    return profile
+
+
+def _write(profile, directory, endpoint):
+    """
+    Returns:
+        结果文件名
+    """
+    duration_ms = (time.perf_counter() - profile.started) * 1000
+    name = (f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint.replace('.', '_')}-"
+            f"{duration_ms:.0f}ms-{uuid.uuid4().hex[:6]}.collapsed")
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+        # 采样线程可能仍在写入最后一次采样，先复制
+        for stack, count in sorted(dict(profile.stacks).items(), key=lambda item: -item[1]):
+            f.write(f'{stack} {count}\n')
+    return name
+
+
+def init_app(app):
+    """注册开始/结束分析的请求钩子"""
+    global _interval
+    from app.controllers.admin import is_admin_request
+    _interval = app.config['PROFILE_INTERVAL_MS'] / 1000
+    sample_every = app.config['PROFILE_SAMPLE_EVERY']
+    directory = app.config['PROFILE_DIR']
+
+    @app.before_request
+    def start_profile():
+        requested = request.headers.get('X-Profile') == '1' and is_admin_request()
+        if requested or (sample_every and next(_requests) % sample_every == 0):
+            _start()
+
+    @app.after_request
+    def finish_profile(response):
+        profile = _stop()
+        if profile is not None:
+            try:
+                name = _write(profile, directory, request.endpoint or 'unmatched')
+                if request.headers.get('X-Profile') == '1':
+                    response.headers['X-Profile-File'] = name
+            except Exception as e:
+                print(f"Error writing profile: {e}")
+        return response
+
+    @app.teardown_request
+    def discard_profile(error):
+        # after_request 没有执行时（例如请求中途出错）停止采样
+        _stop()
+
+
+def list_profiles(directory):
+    """
+    Returns:
+        [{'name', 'size', 'modified'}, ...]，最新的在前
+    """
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if name.endswith('.collapsed'):
+            stat = os.stat(os.path.join(directory, name))
+            profiles.append({'name': name, 'size': stat.st_size, 'modified': stat.st_mtime})
+    return sorted(profiles, key=lambda profile: -profile['modified'])
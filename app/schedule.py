@@ -0,0 +1,171 @@
+"""
+用户工作时间表：把 user_work_info 编译成每秒收益，供摸鱼/加班记录计算收益
+
+编译结果缓存在Redis（跨进程共享）和进程内（避免重复解析），
+save_user_work_info 保存设置后调用 invalidate_work_schedule 使缓存失效。
+"""
+import json
+import threading
+import time
+from datetime import time as clock_time
+from decimal import Decimal
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# Redis中缓存编译结果的key及有效期（秒）
+CACHE_KEY = 'work_schedule:{user_id}'
+CACHE_TTL = 24 * 60 * 60
+# Redis不可用时进程内缓存的有效期（秒）
+LOCAL_TTL = 60
+
+# user_id -> (Redis中的原始值, WorkSchedule, 进程内过期时间)
+_local_cache = {}
+_local_lock = threading.Lock()
+
+
+def _seconds_of_day(t):
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+def _parse_time(value):
+    if value is None or isinstance(value, clock_time):
+        return value
+    return clock_time.fromisoformat(value)
+
+
+class WorkSchedule:
+    """
+    编译后的工作时间表
+
+    工作结束时间早于开始时间表示跨午夜的夜班；休息时间同样可以跨午夜，
+    只有与工作时段重叠的部分才从工作时长中扣除。
+    """
+
+    __slots__ = ('daily_salary', 'work_start', 'work_end', 'break_start', 'break_end',
+                 'work_seconds', 'rate_per_second')
+
+    def __init__(self, daily_salary, work_start, work_end, break_start=None, break_end=None):
+        self.daily_salary = Decimal(daily_salary)
+        self.work_start = work_start
+        self.work_end = work_end
+        self.break_start = break_start
+        self.break_end = break_end
+
+        start = _seconds_of_day(work_start)
+        work_length = (_seconds_of_day(work_end) - start) % SECONDS_PER_DAY
+
+        break_length = 0
+        if break_start and break_end:
+            break_begin = _seconds_of_day(break_start)
+            break_span = (_seconds_of_day(break_end) - break_begin) % SECONDS_PER_DAY
+            # 工作时段为 [start, start + work_length)，休息时段可能落在前一天或后一天
+            for offset in (-SECONDS_PER_DAY, 0, SECONDS_PER_DAY):
+                lo = max(start, break_begin + offset)
+                hi = min(start + work_length, break_begin + offset + break_span)
+                if hi > lo:
+                    break_length += hi - lo
+
+        self.work_seconds = work_length - break_length
+        self.rate_per_second = (float(self.daily_salary) / self.work_seconds
+                                if self.work_seconds > 0 else 0)
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        从 (daily_salary, work_start_time, work_end_time, break_start_time, break_end_time) 编译
+
+        Returns:
+            WorkSchedule；日薪或工作时间未设置时返回None
+        """
+        if not row or not row[0] or not row[1] or not row[2]:
+            return None
+        return cls(row[0], row[1], row[2], row[3], row[4])
+
+    def earnings(self, minutes, multiplier=1):
+        """
+        计算一段时长（分钟）对应的收益，保留两位小数（与 earnings 列的 DECIMAL(10,2) 一致）
+
+        Args:
+            minutes: 时长（分钟）
+            multiplier: 倍数（加班按3倍计算）
+        """
+        return round(self.rate_per_second * int(minutes) * 60 * multiplier, 2)
+
+    def to_json(self):
+        return json.dumps({
+            'daily_salary': str(self.daily_salary),
+            'work_start': self.work_start.isoformat(),
+            'work_end': self.work_end.isoformat(),
+            'break_start': self.break_start.isoformat() if self.break_start else None,
+            'break_end': self.break_end.isoformat() if self.break_end else None,
+        })
+
+    @classmethod
+    def from_json(cls, raw):
+        data = json.loads(raw)
+        return cls(data['daily_salary'], _parse_time(data['work_start']),
+                   _parse_time(data['work_end']), _parse_time(data['break_start']),
+                   _parse_time(data['break_end']))
+
+
+def get_work_schedule(user_id, cur, redis_client):
+    """
+    获取用户的工作时间表，依次查找进程内缓存、Redis、数据库
+
+    Args:
+        user_id: 用户ID
+        cur: 数据库游标，仅在缓存未命中时使用
+        redis_client: Redis客户端，可以为None
+
+    Returns:
+        WorkSchedule；用户尚未设置完整的工作时间和日薪时返回None
+    """
+    key = CACHE_KEY.format(user_id=user_id)
+
+    if redis_client:
+        try:
+            raw = redis_client.get(key)
+            if raw:
+                # Redis是权威缓存，进程内只缓存解析结果，避免其他进程失效后读到旧数据
+                with _local_lock:
+                    cached = _local_cache.get(user_id)
+                if cached and cached[0] == raw:
+                    return cached[1]
+                schedule = WorkSchedule.from_json(raw)
+                with _local_lock:
+                    _local_cache[user_id] = (raw, schedule, time.monotonic() + LOCAL_TTL)
+                return schedule
+        except Exception as e:
+            print(f"Error reading from Redis: {e}")
+    else:
+        with _local_lock:
+            cached = _local_cache.get(user_id)
+        if cached and cached[2] > time.monotonic():
+            return cached[1]
+
+    cur.execute('''SELECT daily_salary, work_start_time, work_end_time, break_start_time, break_end_time
+                  FROM user_work_info WHERE user_id = %s''', (user_id,))
+    schedule = WorkSchedule.from_row(cur.fetchone())
+    if not schedule:
+        return None
+
+    raw = schedule.to_json()
+    with _local_lock:
+        _local_cache[user_id] = (raw, schedule, time.monotonic() + LOCAL_TTL)
+    if redis_client:
+        try:
+            redis_client.setex(key, CACHE_TTL, raw)
+        except Exception as e:
+            print(f"Error writing to Redis: {e}")
+    return schedule
+
+
+def invalidate_work_schedule(user_id, redis_client):
+    """用户修改工作时间或日薪后清除缓存的时间表"""
+    with _local_lock:
+        _local_cache.pop(user_id, None)
+    if redis_client:
+        try:
+            redis_client.delete(CACHE_KEY.format(user_id=user_id))
+        except Exception as e:
+            print(f"Error clearing Redis cache: {e}")
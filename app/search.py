@@ -0,0 +1,133 @@
+"""
+技巧全文搜索
+
+slacking_tips.search_vector 由发布、编辑路径在同一条语句中写入，GIN索引支持按词查找。
+PostgreSQL内置的分词不会切分中文，这里由应用先切词再交给 to_tsvector('simple', ...)：
+
+- 中文连续片段切成单字和相邻两字（"摸鱼技巧" -> 摸 鱼 技 巧 摸鱼 鱼技 技巧），
+  查询时用相邻两字匹配，单字查询匹配单字，任意位置的子串都能命中索引
+- 字母数字按词切分并转为小写，查询时按前缀匹配（"pyth" 可以匹配 "python"）
+
+标题权重高于正文，结果按 ts_rank_cd 排序。历史数据运行 flask --app run rebuild-search-index 回填。
+"""
+import re
+
+from psycopg2.extras import execute_values
+
+# 搜索词最大长度，超出部分忽略
+MAX_QUERY_LENGTH = 100
+
+# 中日韩统一表意文字（含扩展A区和兼容区）
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_TOKEN_RE = re.compile(rf'[{_CJK}]+|[^\W_{_CJK}]+')
+
+# 写入 search_vector 的SQL表达式，参数为 make_search_tokens 生成的标题和正文词串
+SEARCH_VECTOR_SQL = ("setweight(to_tsvector('simple', %s), 'A') || "
+                     "setweight(to_tsvector('simple', %s), 'B')")
+
+
+def _is_cjk(run):
+    return bool(re.match(rf'[{_CJK}]', run))
+
+
+def make_search_tokens(*texts):
+    """
+    把文本切成写入 search_vector 的词串（空格分隔）
+
+    Args:
+        texts: 一段或多段文本，None会被忽略
+    """
+    tokens = []
+    for text in texts:
+        if not text:
+            continue
+        for run in _TOKEN_RE.findall(text.lower()):
+            if _is_cjk(run):
+                tokens.extend(run)
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            else:
+                tokens.append(run)
+    return ' '.join(tokens)
+
+
+def make_search_query(text):
+    """
+    把用户输入转换为 to_tsquery('simple', ...) 的查询串，所有词都必须出现
+
+    Returns:
+        查询串；输入中没有可搜索的字符时返回None
+    """
+    terms = []
+    for run in _TOKEN_RE.findall((text or '')[:MAX_QUERY_LENGTH].lower()):
+        if not _is_cjk(run):
+            terms.append(f'{run}:*')
+        elif len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    if not terms:
+        return None
+    # 去重并保持顺序
+    return ' & '.join(dict.fromkeys(terms))
+
+
+def search_tips(cur, query, page, page_size):
+    """
+    按相关度搜索技巧
+
+    Args:
+        query: make_search_query 的结果
+        page: 页码，从1开始
+        page_size: 每页条数
+
+    Returns:
+        (tips, has_next)，tips 的列与技巧列表页相同：
+        [(id, title, excerpt, created_at, username, like_count, comment_count), ...]
+    """
+    cur.execute('''SELECT st.id, st.title, st.excerpt, st.created_at, u.username,
+                  st.like_count, st.comment_count
+                  FROM slacking_tips st
+                  JOIN users u ON st.user_id = u.id,
+                       to_tsquery('simple', %s) q
+                  WHERE st.search_vector @@ q
+                  ORDER BY ts_rank_cd(st.search_vector, q) DESC, st.id DESC
+                  LIMIT %s OFFSET %s''',
+                (query, page_size + 1, (page - 1) * page_size))
+    tips = cur.fetchall()
+    return tips[:page_size], len(tips) > page_size
+
+
+def rebuild_search_index(conn, batch_size=500):
+    """
+    重新计算所有技巧的 search_vector（首次部署或修改切词规则后运行）
+
+    Returns:
+        更新的技巧数量
+    """
+    cur = conn.cursor()
+    updated = 0
+    last_id = 0
+    try:
+        while True:
+            cur.execute('''SELECT id, title, steps, notice, experience FROM slacking_tips
+                          WHERE id > %s ORDER BY id LIMIT %s''', (last_id, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            execute_values(cur, '''UPDATE slacking_tips st
+                                  SET search_vector = setweight(to_tsvector('simple', v.title_tokens), 'A') ||
+                                                      setweight(to_tsvector('simple', v.body_tokens), 'B')
+                                  FROM (VALUES %s) AS v (id, title_tokens, body_tokens)
+                                  WHERE st.id = v.id''',
+                           [(tip_id, make_search_tokens(title), make_search_tokens(steps, notice, experience))
+                            for tip_id, title, steps, notice, experience in rows])
+            # 每批提交一次，避免长事务
+            conn.commit()
+            updated += len(rows)
+            last_id = rows[-1][0]
+        return updated
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
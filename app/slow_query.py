@@ -0,0 +1,212 @@
+"""
+慢查询日志（可选，设置 SLOW_QUERY_LOG 后启用）
+
+启用后连接池创建的连接使用 SlowQueryCursor：耗时超过 SLOW_QUERY_THRESHOLD_MS 的语句
+以JSON行写入本地日志（按大小轮转），记录规范化的SQL（字面量和参数替换为 ?）、耗时、行数和所属路由。
+阈值设为0时记录所有语句。
+
+慢的SELECT按 SLOW_QUERY_EXPLAIN_SAMPLE 的比例在同一连接上再执行一次 EXPLAIN (ANALYZE, BUFFERS)，
+执行计划一起写入日志；EXPLAIN在保存点中执行，出错不会影响调用方的事务。
+同一条规范化SQL每 EXPLAIN_MIN_INTERVAL 秒最多EXPLAIN一次。
+
+汇总最慢的语句：
+
+    flask --app run slow-queries
+"""
+import glob
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+import random
+import re
+import threading
+import time
+
+from psycopg2 import extensions
+
+from app import metrics
+
+# 同一条规范化SQL两次EXPLAIN之间的最小间隔（秒）
+EXPLAIN_MIN_INTERVAL = 60
+# 日志中保存的原始SQL最大长度
+MAX_LOGGED_SQL = 2000
+
+logger = logging.getLogger('slow_query')
+
+_threshold = None
+_explain_sample = 0.0
+_last_explained = {}
+_explain_lock = threading.Lock()
+
+_COMMENT_RE = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PARAM_RE = re.compile(r'%\([^)]*\)s|%s|\$\d+|\b\d+(?:\.\d+)?\b')
+_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_LISTS_RE = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(query):
+    """
+    把SQL规范化为统计用的形式：去掉注释、字面量和参数替换为 ?，
+    参数列表和 VALUES 行合并为 (...)，合并空白
+
+        "SELECT * FROM t WHERE id IN (%s, %s) AND name = 'x'" -> "SELECT * FROM t WHERE id IN (...) AND name = ?"
+    """
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    query = _COMMENT_RE.sub(' ', query)
+    query = _STRING_RE.sub('?', query)
+    query = _PARAM_RE.sub('?', query)
+    query = _LIST_RE.sub('(...)', query)
+    query = _LISTS_RE.sub('(...)', query)
+    return _SPACE_RE.sub(' ', query).strip()
+
+
+def init_app(app):
+    """
+    配置日志文件和阈值
+
+    Returns:
+        是否启用了慢查询日志
+    """
+    global _threshold, _explain_sample
+    path = app.config['SLOW_QUERY_LOG']
+    if not path:
+        return False
+    if not logger.handlers:
+        handler = RotatingFileHandler(path, maxBytes=app.config['SLOW_QUERY_LOG_MAX_BYTES'],
+                                      backupCount=app.config['SLOW_QUERY_LOG_BACKUPS'], encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    _threshold = app.config['SLOW_QUERY_THRESHOLD_MS'] / 1000
+    _explain_sample = app.config['SLOW_QUERY_EXPLAIN_SAMPLE']
+    return True
+
+
+class SlowQueryCursor(metrics.TimedCursor):
+    """在 TimedCursor 的基础上把慢语句写入日志"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        result = super().execute(query, vars)
+        duration = time.perf_counter() - started
+        if duration >= _threshold:
+            _record(self, query, vars, duration, explain=True)
+        return result
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        result = super().executemany(query, vars_list)
+        duration = time.perf_counter() - started
+        if duration >= _threshold:
+            _record(self, query, None, duration, explain=False)
+        return result
+
+
+def _should_explain(normalized):
+    if normalized[:6].upper() != 'SELECT' or random.random() >= _explain_sample:
+        return False
+    now = time.monotonic()
+    with _explain_lock:
+        if now - _last_explained.get(normalized, -EXPLAIN_MIN_INTERVAL) < EXPLAIN_MIN_INTERVAL:
+            return False
+        _last_explained[normalized] = now
+        return True
+
+
+def _explain(conn, query, vars):
+    """在保存点中执行 EXPLAIN (ANALYZE, BUFFERS)，返回执行计划文本"""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8')
+    # 使用普通游标，EXPLAIN本身不再被记录
+    cur = extensions.cursor(conn)
+    in_transaction = conn.status != extensions.STATUS_READY
+    try:
+        if in_transaction:
+            cur.execute('SAVEPOINT slow_query_explain')
+        try:
+            cur.execute('EXPLAIN (ANALYZE, BUFFERS) ' + query, vars)
+            plan = '\n'.join(row[0] for row in cur.fetchall())
+        except Exception as e:
+            if in_transaction:
+                cur.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            return f'EXPLAIN failed: {e}'
+        if in_transaction:
+            cur.execute('RELEASE SAVEPOINT slow_query_explain')
+        return plan
+    finally:
+        cur.close()
+
+
+def _record(cur, query, vars, duration, explain):
+    try:
+        normalized = normalize_sql(query)
+        timers = metrics.current_timers()
+        entry = {
+            'ts': time.time(),
+            'endpoint': timers.endpoint if timers else metrics.BACKGROUND,
+            'normalized': normalized,
+            'duration_ms': round(duration * 1000, 3),
+            'rows': cur.rowcount,
+            'sql': (query.decode('utf-8', 'replace') if isinstance(query, bytes) else query)[:MAX_LOGGED_SQL],
+        }
+        if explain and _should_explain(normalized):
+            entry['explain'] = _explain(cur.connection, query, vars)
+        logger.info(json.dumps(entry, ensure_ascii=False))
+    except Exception as e:
+        print(f"Error writing slow query log: {e}")
+
+
+def read_log(path):
+    """按时间顺序读取日志及其轮转文件中的所有记录"""
+    # 轮转文件 path.1 比 path.2 新，path 最新
+    backups = []
+    for backup in glob.glob(glob.escape(path) + '.*'):
+        suffix = backup[len(path) + 1:]
+        if suffix.isdigit():
+            backups.append((int(suffix), backup))
+    entries = []
+    for current in [backup for _, backup in sorted(backups, reverse=True)] + [path]:
+        try:
+            with open(current, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            continue
+    return entries
+
+
+def summarize(entries):
+    """
+    按规范化SQL汇总
+
+    Returns:
+        [{'normalized', 'count', 'total_ms', 'avg_ms', 'max_ms', 'avg_rows', 'endpoints', 'explain'}, ...]，
+        explain 为最近一次捕获的执行计划
+    """
+    groups = {}
+    for entry in entries:
+        group = groups.get(entry['normalized'])
+        if group is None:
+            group = groups[entry['normalized']] = {
+                'normalized': entry['normalized'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'rows': 0, 'endpoints': set(), 'explain': None,
+            }
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        group['rows'] += max(entry.get('rows') or 0, 0)
+        group['endpoints'].add(entry.get('endpoint'))
+        if entry.get('explain'):
+            group['explain'] = entry['explain']
+    for group in groups.values():
+        group['avg_ms'] = group['total_ms'] / group['count']
+        group['avg_rows'] = group.pop('rows') / group['count']
+        group['endpoints'] = sorted(endpoint for endpoint in group['endpoints'] if endpoint)
+    return list(groups.values())
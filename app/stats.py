@@ -0,0 +1,229 @@
+"""
+用户聚合统计
+
+- user_stats：每个用户摸鱼/加班记录的次数、总时长、总收益以及分享的技巧数
+- user_daily_stats：按 (用户, 日期) 汇总的摸鱼/加班次数、时长和收益，
+  今日收益、本周收益等按天的统计只读这张小表，不再扫描原始记录
+
+两张表都由记录和技巧的写入/删除路径在同一事务中增量维护，
+rebuild_user_stats / rebuild_daily_stats 用于从原始记录全量重建。
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from psycopg2.extras import execute_values
+
+# 记录类型 -> 统计列前缀
+RECORD_COLUMNS = {
+    'slacking': 'slacking',
+    'overtime': 'overtime',
+}
+
+
+def apply_record_delta(cur, user_id, kind, count, minutes, earnings, day=None):
+    """
+    在调用方的事务中调整用户的记录统计，新增记录时各值为正，删除记录时为负
+
+    Args:
+        cur: 数据库游标
+        user_id: 用户ID
+        kind: 'slacking' 或 'overtime'
+        count: 记录数变化量
+        minutes: 时长（分钟）变化量
+        earnings: 收益变化量
+        day: 记录所属日期，为None时表示今天（CURRENT_DATE）
+    """
+    _apply_total_delta(cur, user_id, kind, count, minutes, earnings)
+    _apply_daily_deltas(cur, user_id, kind, [(day, count, minutes, earnings)])
+
+
+def apply_record_batch_delta(cur, user_id, kind, records, sign=1):
+    """
+    在调用方的事务中按一批记录调整统计，先按日期汇总，每张表只执行一条语句
+
+    Args:
+        records: [(记录日期, 时长, 收益), ...]
+        sign: 新增记录为1，删除记录为-1
+    """
+    by_day = defaultdict(lambda: [0, 0, Decimal(0)])
+    for day, minutes, earnings in records:
+        totals = by_day[day]
+        totals[0] += sign
+        totals[1] += sign * (minutes or 0)
+        totals[2] += sign * Decimal(str(earnings or 0))
+
+    _apply_total_delta(cur, user_id, kind,
+                       sum(t[0] for t in by_day.values()),
+                       sum(t[1] for t in by_day.values()),
+                       sum(t[2] for t in by_day.values()))
+    _apply_daily_deltas(cur, user_id, kind,
+                        [(day, t[0], t[1], t[2]) for day, t in by_day.items()])
+
+
+def _apply_total_delta(cur, user_id, kind, count, minutes, earnings):
+    prefix = RECORD_COLUMNS[kind]
+    cur.execute(f'''INSERT INTO user_stats (user_id, {prefix}_count, {prefix}_minutes, {prefix}_earnings)
+                   VALUES (%s, %s, %s, %s)
+                   ON CONFLICT (user_id) DO UPDATE SET
+                       {prefix}_count = user_stats.{prefix}_count + EXCLUDED.{prefix}_count,
+                       {prefix}_minutes = user_stats.{prefix}_minutes + EXCLUDED.{prefix}_minutes,
+                       {prefix}_earnings = user_stats.{prefix}_earnings + EXCLUDED.{prefix}_earnings,
+                       updated_at = CURRENT_TIMESTAMP''',
+                (user_id, count, minutes, earnings))
+
+
+def _apply_daily_deltas(cur, user_id, kind, rows):
+    """rows: [(日期或None, 次数变化量, 时长变化量, 收益变化量)]，同一日期只能出现一次"""
+    prefix = RECORD_COLUMNS[kind]
+    execute_values(
+        cur,
+        f'''INSERT INTO user_daily_stats (user_id, day, {prefix}_count, {prefix}_minutes, {prefix}_earnings)
+           VALUES %s
+           ON CONFLICT (user_id, day) DO UPDATE SET
+               {prefix}_count = user_daily_stats.{prefix}_count + EXCLUDED.{prefix}_count,
+               {prefix}_minutes = user_daily_stats.{prefix}_minutes + EXCLUDED.{prefix}_minutes,
+               {prefix}_earnings = user_daily_stats.{prefix}_earnings + EXCLUDED.{prefix}_earnings''',
+        [(user_id, day, count, minutes, earnings) for day, count, minutes, earnings in rows],
+        template='(%s, COALESCE(%s::date, CURRENT_DATE), %s, %s, %s)')
+
+
+def apply_tip_delta(cur, user_id, count):
+    """在调用方的事务中调整用户分享的技巧数"""
+    cur.execute('''INSERT INTO user_stats (user_id, tip_count) VALUES (%s, %s)
+                  ON CONFLICT (user_id) DO UPDATE SET
+                      tip_count = user_stats.tip_count + EXCLUDED.tip_count,
+                      updated_at = CURRENT_TIMESTAMP''',
+                (user_id, count))
+
+
+def get_user_stats(cur, user_id):
+    """
+    读取用户的聚合统计
+
+    Returns:
+        {'slacking_count', 'slacking_minutes', 'slacking_earnings',
+         'overtime_count', 'overtime_minutes', 'overtime_earnings', 'tip_count'}
+    """
+    cur.execute('''SELECT slacking_count, slacking_minutes, slacking_earnings,
+                         overtime_count, overtime_minutes, overtime_earnings, tip_count
+                  FROM user_stats WHERE user_id = %s''', (user_id,))
+    row = cur.fetchone() or (0, 0, 0, 0, 0, 0, 0)
+    return {
+        'slacking_count': row[0],
+        'slacking_minutes': row[1],
+        'slacking_earnings': row[2],
+        'overtime_count': row[3],
+        'overtime_minutes': row[4],
+        'overtime_earnings': row[5],
+        'tip_count': row[6],
+    }
+
+
+def get_period_earnings(cur, user_id):
+    """
+    从 user_daily_stats 读取用户今日和本周（从周一算起）的收益
+
+    Returns:
+        (今日收益 {'slacking', 'overtime'}, 本周收益 {'slacking', 'overtime'})
+    """
+    cur.execute('''SELECT COALESCE(SUM(slacking_earnings) FILTER (WHERE day = CURRENT_DATE), 0),
+                         COALESCE(SUM(overtime_earnings) FILTER (WHERE day = CURRENT_DATE), 0),
+                         COALESCE(SUM(slacking_earnings), 0),
+                         COALESCE(SUM(overtime_earnings), 0)
+                  FROM user_daily_stats
+                  WHERE user_id = %s AND day >= date_trunc('week', CURRENT_DATE)::date''',
+                (user_id,))
+    row = cur.fetchone()
+    return ({'slacking': row[0], 'overtime': row[1]},
+            {'slacking': row[2], 'overtime': row[3]})
+
+
+def rebuild_user_stats(conn):
+    """
+    从原始记录全量重建 user_stats
+
+    Returns:
+        重建的用户数
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute('''INSERT INTO user_stats (user_id, slacking_count, slacking_minutes, slacking_earnings,
+                                              overtime_count, overtime_minutes, overtime_earnings, tip_count)
+                      SELECT u.id,
+                             COALESCE(s.cnt, 0), COALESCE(s.minutes, 0), COALESCE(s.earnings, 0),
+                             COALESCE(o.cnt, 0), COALESCE(o.minutes, 0), COALESCE(o.earnings, 0),
+                             COALESCE(t.cnt, 0)
+                      FROM users u
+                      LEFT JOIN (SELECT user_id, COUNT(*) AS cnt, SUM(duration) AS minutes,
+                                        SUM(earnings) AS earnings
+                                 FROM slacking_records GROUP BY user_id) s ON s.user_id = u.id
+                      LEFT JOIN (SELECT user_id, COUNT(*) AS cnt, SUM(duration) AS minutes,
+                                        SUM(earnings) AS earnings
+                                 FROM overtime_records GROUP BY user_id) o ON o.user_id = u.id
+                      LEFT JOIN (SELECT user_id, COUNT(*) AS cnt
+                                 FROM slacking_tips GROUP BY user_id) t ON t.user_id = u.id
+                      ON CONFLICT (user_id) DO UPDATE SET
+                          slacking_count = EXCLUDED.slacking_count,
+                          slacking_minutes = EXCLUDED.slacking_minutes,
+                          slacking_earnings = EXCLUDED.slacking_earnings,
+                          overtime_count = EXCLUDED.overtime_count,
+                          overtime_minutes = EXCLUDED.overtime_minutes,
+                          overtime_earnings = EXCLUDED.overtime_earnings,
+                          tip_count = EXCLUDED.tip_count,
+                          updated_at = CURRENT_TIMESTAMP''')
+        rebuilt = cur.rowcount
+        conn.commit()
+        return rebuilt
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def rebuild_daily_stats(conn):
+    """
+    从原始记录全量重建 user_daily_stats
+
+    重建在一个事务中完成，期间以 SHARE 模式锁住记录表，新的记录写入会等待重建结束，
+    因此重建结果和之后的增量更新可以无缝衔接
+
+    Returns:
+        重建的 (用户, 日期) 行数
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute('LOCK TABLE slacking_records, overtime_records IN SHARE MODE')
+        cur.execute('DELETE FROM user_daily_stats')
+        cur.execute('''INSERT INTO user_daily_stats (user_id, day,
+                                                    slacking_count, slacking_minutes, slacking_earnings,
+                                                    overtime_count, overtime_minutes, overtime_earnings)
+                      SELECT user_id, day,
+                             SUM(slacking_count), SUM(slacking_minutes), SUM(slacking_earnings),
+                             SUM(overtime_count), SUM(overtime_minutes), SUM(overtime_earnings)
+                      FROM (
+                          SELECT user_id, created_at::date AS day,
+                                 COUNT(*) AS slacking_count,
+                                 COALESCE(SUM(duration), 0) AS slacking_minutes,
+                                 COALESCE(SUM(earnings), 0) AS slacking_earnings,
+                                 0 AS overtime_count, 0 AS overtime_minutes, 0 AS overtime_earnings
+                          FROM slacking_records
+                          WHERE user_id IS NOT NULL AND created_at IS NOT NULL
+                          GROUP BY user_id, created_at::date
+                          UNION ALL
+                          SELECT user_id, created_at::date,
+                                 0, 0, 0,
+                                 COUNT(*), COALESCE(SUM(duration), 0), COALESCE(SUM(earnings), 0)
+                          FROM overtime_records
+                          WHERE user_id IS NOT NULL AND created_at IS NOT NULL
+                          GROUP BY user_id, created_at::date
+                      ) daily
+                      GROUP BY user_id, day''')
+        rebuilt = cur.rowcount
+        conn.commit()
+        return rebuilt
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
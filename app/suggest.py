@@ -0,0 +1,163 @@
+"""
+技巧标题自动补全
+
+所有标题保存在一个Redis有序集合中，分数都为0，成员按字节序排列，
+前缀查询只需要一次 ZRANGEBYLEX，不访问PostgreSQL。
+成员格式为 "{规范化标题}\\0{原标题}\\0{技巧ID}"，规范化标题（小写、合并空白）用于前缀匹配。
+
+发布、编辑、删除技巧时在提交数据库事务后同步更新；
+Redis数据丢失时由自动补全接口把 rebuild_suggest_index 任务放入后台队列，从PostgreSQL重建。
+索引不存在时更新不会创建索引（否则只包含几个标题的索引会被当作已经建好），
+重建进行中时更新同时写入临时索引，重建期间发布的技巧不会丢失。
+"""
+
+SUGGEST_KEY = 'tips:suggest'
+REBUILD_KEY = f'{SUGGEST_KEY}:rebuild'
+# 临时索引的有效期（秒），重建中途失败时自动清除
+REBUILD_TTL = 600
+
+# 占位成员：没有任何技巧时也保留key，区分"索引为空"和"索引不存在"
+_PLACEHOLDER = ''
+
+# 前缀最大长度，超出部分忽略
+MAX_PREFIX_LENGTH = 50
+
+# KEYS[1] 索引，KEYS[2] 重建中的临时索引；ARGV 为成对的 (操作 add/rem, 成员)
+# 只写入已存在的key，返回写入的key数量
+_UPDATE_SCRIPT = """
+local written = 0
+for k = 1, 2 do
+    if redis.call('exists', KEYS[k]) == 1 then
+        for i = 1, #ARGV, 2 do
+            if ARGV[i] == 'add' then
+                redis.call('zadd', KEYS[k], 0, ARGV[i + 1])
+            else
+                redis.call('zrem', KEYS[k], ARGV[i + 1])
+            end
+        end
+        written = written + 1
+    end
+end
+return written
+"""
+
+
+def normalize_title(title):
+    """前缀匹配使用的规范化标题：小写并合并空白"""
+    return ' '.join((title or '').lower().split())
+
+
+def _member(tip_id, title):
+    title = title or ''
+    return f'{normalize_title(title)}\0{title}\0{tip_id}'
+
+
+def _update(redis_client, *ops):
+    redis_client.eval(_UPDATE_SCRIPT, 2, SUGGEST_KEY, REBUILD_KEY, *ops)
+
+
+def add_tip(redis_client, tip_id, title):
+    """发布技巧后加入索引"""
+    if not redis_client:
+        return
+    try:
+        _update(redis_client, 'add', _member(tip_id, title))
+    except Exception as e:
+        print(f"Error updating tip suggestions: {e}")
+
+
+def update_tip(redis_client, tip_id, old_title, new_title):
+    """编辑技巧后替换索引中的标题"""
+    if not redis_client or old_title == new_title:
+        return
+    try:
+        _update(redis_client, 'rem', _member(tip_id, old_title), 'add', _member(tip_id, new_title))
+    except Exception as e:
+        print(f"Error updating tip suggestions: {e}")
+
+
+def remove_tip(redis_client, tip_id, title):
+    """删除技巧后移出索引"""
+    if not redis_client:
+        return
+    try:
+        _update(redis_client, 'rem', _member(tip_id, title))
+    except Exception as e:
+        print(f"Error updating tip suggestions: {e}")
+
+
+def prefix_range(prefix):
+    """
+    Returns:
+        以prefix开头的成员对应的 ZRANGEBYLEX 范围 (min, max)；前缀为空时返回None
+    """
+    prefix = normalize_title(prefix[:MAX_PREFIX_LENGTH])
+    if not prefix:
+        return None
+    encoded = prefix.encode('utf-8')
+    # 字节 0xff 不会出现在UTF-8编码中，"[prefix" 到 "[prefix\xff" 恰好覆盖所有以prefix开头的成员
+    return b'[' + encoded, b'[' + encoded + b'\xff'
+
+
+def parse_suggestions(members):
+    """
+    Returns:
+        [{'id', 'title'}, ...]
+    """
+    suggestions = []
+    for member in members:
+        _, title, tip_id = member.split('\0')
+        suggestions.append({'id': int(tip_id), 'title': title})
+    return suggestions
+
+
+def suggest(redis_client, prefix, n=8):
+    """
+    查询以prefix开头的标题
+
+    Returns:
+        [{'id', 'title'}, ...]；索引不存在时返回None
+    """
+    bounds = prefix_range(prefix)
+    if bounds is None:
+        return []
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.exists(SUGGEST_KEY)
+    pipe.zrangebylex(SUGGEST_KEY, *bounds, start=0, num=n)
+    exists, members = pipe.execute()
+    if not exists:
+        return None
+    return parse_suggestions(members)
+
+
+def rebuild_suggest_index(conn, redis_client):
+    """
+    从PostgreSQL全量重建索引，先写入临时key再 RENAME，读者不会看到只重建了一半的索引
+
+    临时key在读取数据库之前创建，读取期间及之后的更新同时写入临时key，替换时不会丢失。
+    读取之后、写入临时key之前删除的技巧会留在索引中，直到下一次重建。
+
+    Returns:
+        技巧数量
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.delete(REBUILD_KEY)
+    pipe.zadd(REBUILD_KEY, {_PLACEHOLDER: 0})
+    pipe.expire(REBUILD_KEY, REBUILD_TTL)
+    pipe.execute()
+
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT id, title FROM slacking_tips')
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+
+    pipe = redis_client.pipeline(transaction=False)
+    for i in range(0, len(rows), 1000):
+        pipe.zadd(REBUILD_KEY, {_member(tip_id, title): 0 for tip_id, title in rows[i:i + 1000]})
+    pipe.rename(REBUILD_KEY, SUGGEST_KEY)
+    # RENAME 会带上临时key的有效期
+    pipe.persist(SUGGEST_KEY)
+    pipe.execute()
+    return len(rows)
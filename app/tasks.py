@@ -0,0 +1,93 @@
+"""
+后台任务定义，由 app.jobs 的worker执行
+
+任务可能因重试或worker异常退出而执行不止一次，每个任务都必须幂等。
+"""
+from contextlib import contextmanager
+
+from app import leaderboard, suggest
+from app.counters import reconcile_tip_counters
+from app.jobs import job
+
+# 定期执行 ANALYZE 的表，与 optimize_db.py 一致
+ANALYZE_TABLES = (
+    'users', 'user_work_info', 'slacking_records', 'overtime_records', 'slacking_tips',
+    'tip_likes', 'tip_comments', 'feedback', 'user_stats', 'user_daily_stats',
+)
+
+HOUR = 3600
+DAY = 86400
+
+
+@contextmanager
+def _connection(app):
+    conn = app.get_db_connection()
+    if not conn:
+        raise RuntimeError('数据库连接失败')
+    try:
+        yield conn
+    finally:
+        app.put_db_connection(conn)
+
+
+def _redis(app):
+    redis_client = app.get_redis_client()
+    if not redis_client:
+        raise RuntimeError('Redis连接不可用')
+    return redis_client
+
+
+@job('rebuild_leaderboard')
+def rebuild_leaderboard(app):
+    """从PostgreSQL重建红榜/黑榜（冷启动时由排行榜页面放入队列）"""
+    redis_client = _redis(app)
+    with _connection(app) as conn:
+        leaderboard.rebuild_leaderboards(conn, redis_client)
+
+
+@job('rebuild_suggest_index')
+def rebuild_suggest_index(app):
+    """重建技巧标题自动补全索引（冷启动时由自动补全接口放入队列）"""
+    redis_client = _redis(app)
+    with _connection(app) as conn:
+        suggest.rebuild_suggest_index(conn, redis_client)
+
+
+@job('reconcile_tip_counters', every=DAY)
+def reconcile_tip_counters_job(app):
+    """每天校正一次技巧的点赞数和评论数"""
+    with _connection(app) as conn:
+        fixed = reconcile_tip_counters(conn)
+    if fixed:
+        print(f"Reconciled counters of {fixed} tips")
+
+
+@job('cleanup_counter_flushes', every=HOUR)
+def cleanup_counter_flushes(app):
+    """清理已写入的浏览数批次记录，只需保留到重放不再可能发生"""
+    with _connection(app) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM counter_flushes WHERE flushed_at < NOW() - INTERVAL '1 day'")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
+@job('analyze_tables', every=DAY)
+def analyze_tables(app):
+    """每天更新一次表的统计信息，计数列和汇总表持续更新后查询计划仍然准确"""
+    with _connection(app) as conn:
+        cur = conn.cursor()
+        try:
+            for table in ANALYZE_TABLES:
+                cur.execute(f'ANALYZE {table}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
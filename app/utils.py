@@ -1,3 +1,5 @@
+import base64
+import json
 from datetime import datetime, timezone, timedelta
 
 def utc_to_utc8(utc_time):
@@ -40,4 +42,69 @@ def format_utc8_time(utc_time, format_str='%Y-%m-%d %H:%M:%S'):
         return ''
     
     utc8_time = utc_to_utc8(utc_time)
-    return utc8_time.strftime(format_str) if utc8_time else ''
\ No newline at end of file
+    return utc8_time.strftime(format_str) if utc8_time else ''
+
+def make_excerpt(text, length=100):
+    """
+    生成列表页使用的摘要：合并空白字符并截断
+
+    Args:
+        text: 原始文本
+        length: 摘要最大长度
+
+    Returns:
+        摘要字符串
+    """
+    if not text:
+        return ''
+
+    excerpt = ' '.join(text.split())
+    if len(excerpt) > length:
+        excerpt = excerpt[:length] + '…'
+    return excerpt
+
+def encode_cursor(sort_value, row_id):
+    """
+    将键集分页的位置（排序列的值, id）编码为URL安全的游标字符串
+
+    Args:
+        sort_value: 排序列的值（datetime或整数）
+        row_id: 行ID，用于排序值相同时保证顺序稳定
+
+    Returns:
+        游标字符串
+    """
+    if isinstance(sort_value, datetime):
+        payload = ['t', sort_value.isoformat(), row_id]
+    else:
+        payload = ['n', sort_value, row_id]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, kind=None):
+    """
+    解析 encode_cursor 生成的游标
+
+    Args:
+        cursor: 游标字符串
+        kind: 排序值应有的类型，'t' 为时间，'n' 为数值；为None时不检查。
+            用于拒绝其他排序方式的游标，避免把类型不符的值绑定到键集比较中
+
+    Returns:
+        (sort_value, row_id)；游标为空、无效或类型不符时返回None
+    """
+    if not cursor:
+        return None
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value_kind, sort_value, row_id = json.loads(raw)
+        if kind is not None and value_kind != kind:
+            return None
+        if value_kind == 't':
+            sort_value = datetime.fromisoformat(sort_value)
+        elif value_kind != 'n' or isinstance(sort_value, bool) or not isinstance(sort_value, (int, float)):
+            return None
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        return None
@@ -1,8 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify, current_app
+from markupsafe import Markup
 
 import psycopg2
 
-from app.utils import utc_to_utc8
+from app.utils import utc_to_utc8, make_excerpt, encode_cursor, decode_cursor
+from app import leaderboard, cache, jobs, search, suggest, write_behind
+from app.db import PoolExhausted
+from app.stats import apply_tip_delta, get_user_stats, get_period_earnings
 
 
 
@@ -100,10 +104,13 @@ def register():
             cur.execute('''INSERT INTO user_work_info (user_id, daily_salary) 
                           VALUES (%s, %s)''', (user_id, 0.00))
             conn.commit()
-            
+
             cur.close()
             current_app.put_db_connection(conn)
-            
+
+            # 新用户以0分加入排行榜
+            leaderboard.register_user(current_app.get_redis_client(), user_id, username)
+
             session['user_id'] = user_id
             session['username'] = username
             return redirect(url_for('main.index'))
@@ -119,6 +126,88 @@ def logout():
     session.clear()
     return redirect(url_for('main.index'))
 
+# 技巧列表每页条数
+TIPS_PAGE_SIZE = 20
+# 排序方式 -> 排序列
+TIPS_SORT_COLUMNS = {
+    'time': 'created_at',
+    'likes': 'like_count',
+    'comments': 'comment_count'
+}
+# 排序方式 -> 游标中排序值的类型（见 decode_cursor）
+TIPS_SORT_CURSOR_KINDS = {
+    'time': 't',
+    'likes': 'n',
+    'comments': 'n'
+}
+
+# 渲染好的HTML片段缓存时间（秒），key包含数据摘要，数据变化后自动换用新片段
+FRAGMENT_CACHE_TTL = 600
+
+# 片段模板 -> 模板源码摘要
+_template_digests = {}
+
+def _template_digest(template):
+    """片段模板源码的摘要，模板修改后（如部署新版本）不再使用旧模板渲染的片段"""
+    digest = _template_digests.get(template)
+    if digest is None or current_app.debug:
+        env = current_app.jinja_env
+        source = env.loader.get_source(env, template)[0]
+        digest = _template_digests[template] = cache.fragment_version(source)
+    return digest
+
+def _render_fragments(name, template, items):
+    """
+    批量取得渲染好的HTML片段，只有数据变化过的片段才重新渲染
+
+    Args:
+        name: 片段名称
+        template: 片段模板
+        items: [(片段依赖的数据, 模板变量), ...]
+
+    Returns:
+        与items顺序一致的片段列表
+    """
+    template_digest = _template_digest(template)
+    fragments = cache.get_fragments(
+        current_app.get_redis_client(), name,
+        [(cache.fragment_version(template_digest, data), context) for data, context in items],
+        lambda context: render_template(template, **context), FRAGMENT_CACHE_TTL)
+    return [Markup(fragment) for fragment in fragments]
+
+def _liked_tip_ids(user_id, tip_ids):
+    """当前用户在这些技巧中点过赞的id，用于在共用的卡片片段上标记点赞状态"""
+    if not tip_ids:
+        return []
+    try:
+        conn = current_app.get_db_connection()
+    except PoolExhausted:
+        # 点赞状态只是页面上的标记，连接池耗尽时不显示，列表照常返回
+        return []
+    if not conn:
+        return []
+    
+    cur = conn.cursor()
+    
+    try:
+        cur.execute('SELECT tip_id FROM tip_likes WHERE user_id = %s AND tip_id = ANY(%s)',
+                   (user_id, tip_ids))
+        liked = {row[0] for row in cur.fetchall()}
+        # 叠加Redis中尚未写入数据库的点赞变化
+        for tip_id, is_liked in write_behind.pending_likes(current_app.get_redis_client(),
+                                                           user_id, tip_ids).items():
+            if is_liked:
+                liked.add(tip_id)
+            else:
+                liked.discard(tip_id)
+        return sorted(liked)
+    except Exception as e:
+        print(f"查询点赞状态失败: {e}")
+        return []
+    finally:
+        cur.close()
+        current_app.put_db_connection(conn)
+
 @main.route('/tips')
 def tips():
     if 'user_id' not in session:
@@ -126,70 +215,124 @@ def tips():
     
     # 获取排序参数
     sort_by = request.args.get('sort', 'time')  # 默认按时间排序
+    if sort_by not in TIPS_SORT_COLUMNS:
+        sort_by = 'time'
+    sort_column = TIPS_SORT_COLUMNS[sort_by]
+    
+    # 键集分页游标：上一页最后一条的（排序值, id）
+    cursor = request.args.get('cursor')
+    # 其他排序方式的游标（例如从按点赞排序的页面复制来的）视为无效，从第一页开始
+    position = decode_cursor(cursor, TIPS_SORT_CURSOR_KINDS[sort_by])
+    if not position:
+        cursor = None
+    
+    def load_page():
+        conn = current_app.get_db_connection()
+        if not conn:
+            raise RuntimeError('数据库连接失败')
+        
+        cur = conn.cursor()
+        
+        try:
+            # 只查询列表需要的标题和摘要，按（排序列, id）键集分页，每页代价与页码无关
+            where_clause = ''
+            params = []
+            if position:
+                where_clause = f'WHERE (st.{sort_column}, st.id) < (%s, %s)'
+                params.extend(position)
+            params.append(TIPS_PAGE_SIZE + 1)
+            
+            cur.execute(f'''SELECT st.id, st.title, st.excerpt, st.created_at, u.username,
+                          st.like_count, st.comment_count
+                          FROM slacking_tips st 
+                          JOIN users u ON st.user_id = u.id 
+                          {where_clause}
+                          ORDER BY st.{sort_column} DESC, st.id DESC
+                          LIMIT %s''', params)
+            tips = cur.fetchall()
+            
+            # 多取一条用于判断是否还有下一页
+            next_cursor = None
+            if len(tips) > TIPS_PAGE_SIZE:
+                tips = tips[:TIPS_PAGE_SIZE]
+                last_tip = tips[-1]
+                sort_value = {'time': last_tip[3], 'likes': last_tip[5], 'comments': last_tip[6]}[sort_by]
+                next_cursor = encode_cursor(sort_value, last_tip[0])
+            
+            return {'tips': tips, 'next_cursor': next_cursor}
+        finally:
+            cur.close()
+            current_app.put_db_connection(conn)
     
-    # 构建排序SQL
-    if sort_by == 'likes':
-        order_clause = 'like_count DESC'
-    elif sort_by == 'comments':
-        order_clause = 'comment_count DESC'
-    else:  # time
-        order_clause = 'st.created_at DESC'
+    try:
+        # 每页缓存1分钟，技巧有变动时按 tips-list 标签失效
+        page = cache.get_or_load(current_app.get_redis_client(), 'tips_page',
+                                 (sort_by, cursor or 'first'), load_page, 60,
+                                 tags=('tips-list',))
+    except PoolExhausted:
+        raise
+    except Exception as e:
+        print(f"查询技巧列表失败: {e}")
+        return "数据查询失败", 500
     
-    # 尝试从Redis缓存获取数据
-    redis_client = current_app.get_redis_client()
-    cache_key = f"all_tips_{sort_by}"
+    # 卡片按内容缓存，点赞状态和本人标记在页面上单独补充
+    tip_cards = Markup(''.join(_render_fragments('tip_card', '_tip_card.html',
+                                                 [(tip, {'tip': tip}) for tip in page['tips']])))
+    liked_tip_ids = _liked_tip_ids(session['user_id'], [tip[0] for tip in page['tips']])
     
-    if redis_client:
-        try:
-            cached_data = redis_client.get(cache_key)
-            if cached_data:
-                import json
-                tips = json.loads(cached_data)
-                return render_template('tips.html', tips=tips, sort_by=sort_by)
-        except Exception as e:
-            print(f"Error reading from Redis: {e}")
+    return render_template('tips.html', tips=page['tips'], tip_cards=tip_cards,
+                           liked_tip_ids=liked_tip_ids, sort_by=sort_by,
+                           cursor=cursor, next_cursor=page['next_cursor'])
+
+# 搜索结果最多翻到的页数，限制OFFSET的代价
+SEARCH_MAX_PAGE = 50
+
+@main.route('/tips/search')
+def tip_search():
+    if 'user_id' not in session:
+        return redirect(url_for('main.login'))
     
-    # 获取所有摸鱼技巧
-    conn = current_app.get_db_connection()
-    if not conn:
-        return "数据库连接失败", 500
+    q = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    page = min(max(page, 1), SEARCH_MAX_PAGE)
     
-    cur = conn.cursor()
+    query = search.make_search_query(q)
+    if not query:
+        return render_template('search.html', q=q, tips=[], tip_cards='', liked_tip_ids=[],
+                               page=1, has_next=False)
     
-    try:
-        cur.execute(f'''SELECT st.id, st.title, st.steps, st.notice, st.experience, st.created_at, 
-                      u.username, 
-                      (SELECT COUNT(*) FROM tip_likes WHERE tip_id = st.id) as like_count,
-                      (SELECT COUNT(*) FROM tip_comments WHERE tip_id = st.id) as comment_count
-                      FROM slacking_tips st 
-                      JOIN users u ON st.user_id = u.id 
-                      ORDER BY {order_clause}''')
-        tips = cur.fetchall()
-        
-        # 缓存结果1分钟
-        if redis_client:
-            try:
-                import json
-                # 将datetime对象转换为字符串以便JSON序列化
-                tips_serializable = []
-                for tip in tips:
-                    tip_list = list(tip)
-                    if tip_list[5]:  # created_at字段
-                        #utc8_time = utc_to_utc8(tip_list[5])
-                        tip_list[5] = tip_list[5].strftime('%Y-%m-%d %H:%M:%S')
-                    tips_serializable.append(tip_list)
-                
-                redis_client.setex(cache_key, 60, json.dumps(tips_serializable))
-            except Exception as e:
-                print(f"Error writing to Redis: {e}")
+    def load_results():
+        conn = current_app.get_db_connection()
+        if not conn:
+            raise RuntimeError('数据库连接失败')
+        
+        cur = conn.cursor()
         
-        return render_template('tips.html', tips=tips, sort_by=sort_by)
+        try:
+            # 通过 search_vector 的GIN索引查找，按相关度排序
+            tips, has_next = search.search_tips(cur, query, page, TIPS_PAGE_SIZE)
+            return {'tips': tips, 'has_next': has_next and page < SEARCH_MAX_PAGE}
+        finally:
+            cur.close()
+            current_app.put_db_connection(conn)
+    
+    try:
+        # 搜索结果缓存1分钟，技巧有变动时与列表页一起按 tips-list 标签失效
+        results = cache.get_or_load(current_app.get_redis_client(), 'tip_search',
+                                    (query, page), load_results, 60, tags=('tips-list',))
+    except PoolExhausted:
+        raise
     except Exception as e:
-        print(f"查询技巧列表失败: {e}")
+        print(f"搜索技巧失败: {e}")
         return "数据查询失败", 500
-    finally:
-        cur.close()
-        current_app.put_db_connection(conn)
+    
+    # 与列表页共用技巧卡片片段
+    tip_cards = Markup(''.join(_render_fragments('tip_card', '_tip_card.html',
+                                                 [(tip, {'tip': tip}) for tip in results['tips']])))
+    liked_tip_ids = _liked_tip_ids(session['user_id'], [tip[0] for tip in results['tips']])
+    
+    return render_template('search.html', q=q, tips=results['tips'], tip_cards=tip_cards,
+                           liked_tip_ids=liked_tip_ids, page=page, has_next=results['has_next'])
 
 @main.route('/tips/new', methods=['GET', 'POST'])
 def new_tip():
@@ -210,21 +353,22 @@ def new_tip():
         cur = conn.cursor()
         
         try:
-            cur.execute('''INSERT INTO slacking_tips (user_id, title, steps, notice, experience) 
-                          VALUES (%s, %s, %s, %s, %s)''',
-                       (user_id, title, steps, notice, experience))
+            cur.execute(f'''INSERT INTO slacking_tips (user_id, title, steps, notice, experience, excerpt,
+                          search_vector) 
+                          VALUES (%s, %s, %s, %s, %s, %s, {search.SEARCH_VECTOR_SQL})
+                          RETURNING id''',
+                       (user_id, title, steps, notice, experience, make_excerpt(steps),
+                        search.make_search_tokens(title),
+                        search.make_search_tokens(steps, notice, experience)))
+            tip_id = cur.fetchone()[0]
+            # 在同一事务中更新用户聚合统计
+            apply_tip_delta(cur, user_id, 1)
             conn.commit()
             
-            # 清除相关缓存
+            # 清除技巧列表和用户个人资料缓存，并把标题加入自动补全索引
             redis_client = current_app.get_redis_client()
-            if redis_client:
-                try:
-                    # 清除技巧列表缓存
-                    redis_client.delete("all_tips")
-                    # 清除用户个人资料缓存
-                    redis_client.delete(f"user_profile:{user_id}")
-                except Exception as e:
-                    print(f"Error clearing Redis cache: {e}")
+            cache.invalidate(redis_client, 'tips-list', f'user:{user_id}')
+            suggest.add_tip(redis_client, tip_id, title)
             
             cur.close()
             current_app.put_db_connection(conn)
@@ -241,84 +385,78 @@ def tip_detail(tip_id):
     if 'user_id' not in session:
         return redirect(url_for('main.login'))
     
-    # 尝试从Redis缓存获取数据
-    redis_client = current_app.get_redis_client()
-    cache_key = f"tip_detail:{tip_id}"
-    
-    if redis_client:
+    def load_detail():
+        conn = current_app.get_db_connection()
+        if not conn:
+            raise RuntimeError('数据库连接失败')
+        
+        cur = conn.cursor()
+        
         try:
-            cached_data = redis_client.get(cache_key)
-            if cached_data:
-                import json
-                data = json.loads(cached_data)
-                # 将字符串转换回datetime对象
-                tip = data['tip']
-                comments = data['comments']
-                return render_template('tip_detail.html', tip=tip, comments=comments)
-        except Exception as e:
-            print(f"Error reading from Redis: {e}")
-    
-    conn = current_app.get_db_connection()
-    if not conn:
-        return "数据库连接失败", 500
-    
-    cur = conn.cursor()
+            # 获取技巧详情
+            cur.execute('''SELECT st.id, st.title, st.steps, st.notice, st.experience, st.created_at, 
+                          u.username, st.like_count, st.view_count
+                          FROM slacking_tips st 
+                          JOIN users u ON st.user_id = u.id 
+                          WHERE st.id = %s''', (tip_id,))
+            tip = cur.fetchone()
+            
+            # 技巧不存在时不缓存
+            if not tip:
+                return None
+            
+            # 获取评论
+            cur.execute('''SELECT tc.content, tc.created_at, u.username 
+                          FROM tip_comments tc 
+                          JOIN users u ON tc.user_id = u.id 
+                          WHERE tc.tip_id = %s 
+                          ORDER BY tc.created_at ASC''', (tip_id,))
+            comments = cur.fetchall()
+            
+            return {'tip': tip, 'comments': comments}
+        finally:
+            cur.close()
+            current_app.put_db_connection(conn)
     
     try:
-        # 获取技巧详情
-        cur.execute('''SELECT st.id, st.title, st.steps, st.notice, st.experience, st.created_at, 
-                      u.username,
-                      (SELECT COUNT(*) FROM tip_likes WHERE tip_id = st.id) as like_count
-                      FROM slacking_tips st 
-                      JOIN users u ON st.user_id = u.id 
-                      WHERE st.id = %s''', (tip_id,))
-        tip = cur.fetchone()
-        
-        if not tip:
-            return "技巧不存在", 404
-        
-        # 获取评论
-        cur.execute('''SELECT tc.content, tc.created_at, u.username 
-                      FROM tip_comments tc 
-                      JOIN users u ON tc.user_id = u.id 
-                      WHERE tc.tip_id = %s 
-                      ORDER BY tc.created_at ASC''', (tip_id,))
-        comments = cur.fetchall()
-        
-        # 缓存结果30秒
-        if redis_client:
-            try:
-                import json
-                # 准备可序列化的数据
-                tip_serializable = list(tip)
-                if tip_serializable[5]:  # created_at字段
-                    #tip_serializable[5] = utc_to_utc8(tip_serializable[5])
-                    tip_serializable[5] = tip_serializable[5].strftime('%Y-%m-%d %H:%M:%S')
-                
-                comments_serializable = []
-                for comment in comments:
-                    comment_list = list(comment)
-                    if comment_list[1]:  # created_at字段
-                        #comment_list[1] = utc_to_utc8(comment_list[1])
-                        comment_list[1] = comment_list[1].strftime('%Y-%m-%d %H:%M:%S')
-                    comments_serializable.append(comment_list)
-                
-                data = {
-                    'tip': tip_serializable,
-                    'comments': comments_serializable
-                }
-                
-                redis_client.setex(cache_key, 30, json.dumps(data))
-            except Exception as e:
-                print(f"Error writing to Redis: {e}")
-        
-        return render_template('tip_detail.html', tip=tip, comments=comments)
+        # 缓存结果30秒，点赞、评论、编辑或删除时按 tip:{id} 标签失效
+        data = cache.get_or_load(current_app.get_redis_client(), 'tip_detail', (tip_id,),
+                                 load_detail, 30, tags=(f'tip:{tip_id}',))
+    except PoolExhausted:
+        raise
     except Exception as e:
         print(f"查询技巧详情失败: {e}")
         return "数据查询失败", 500
-    finally:
-        cur.close()
-        current_app.put_db_connection(conn)
+    
+    if not data:
+        return "技巧不存在", 404
+    
+    # 浏览数先累加在Redis中，由后台线程批量写入数据库
+    write_behind.record_view(current_app.get_redis_client(), tip_id)
+    
+    return render_template('tip_detail.html', tip=data['tip'], comments=data['comments'])
+
+# 点赞/取消点赞
+# 没有删除到行时插入；插入因唯一索引冲突而跳过时（并发请求已经插入），点赞同样存在，
+# 因此点赞状态等于"没有删除到行"
+TOGGLE_LIKE_SQL = '''
+WITH removed AS (
+    DELETE FROM tip_likes
+    WHERE user_id = %(user_id)s AND tip_id = %(tip_id)s
+    RETURNING 1
+), added AS (
+    INSERT INTO tip_likes (user_id, tip_id)
+    SELECT %(user_id)s, %(tip_id)s
+    WHERE NOT EXISTS (SELECT 1 FROM removed)
+      AND EXISTS (SELECT 1 FROM slacking_tips WHERE id = %(tip_id)s)
+    ON CONFLICT (user_id, tip_id) DO NOTHING
+    RETURNING 1
+)
+UPDATE slacking_tips
+SET like_count = GREATEST(like_count + (SELECT COUNT(*) FROM added) - (SELECT COUNT(*) FROM removed), 0)
+WHERE id = %(tip_id)s
+RETURNING like_count, NOT EXISTS (SELECT 1 FROM removed)
+'''
 
 @main.route('/tips/<int:tip_id>/like', methods=['POST'])
 def like_tip(tip_id):
@@ -327,6 +465,24 @@ def like_tip(tip_id):
     
     user_id = session['user_id']
     
+    # 点赞先记录在Redis中立即返回，由后台线程批量写入 tip_likes
+    redis_client = current_app.get_redis_client()
+    if redis_client:
+        try:
+            result = write_behind.toggle_like(redis_client, tip_id, user_id)
+            if result is None:
+                # 该技巧的点赞用户集合尚未加载
+                if not _load_likers(redis_client, tip_id):
+                    return jsonify({'success': False, 'error': '技巧不存在'})
+                result = write_behind.toggle_like(redis_client, tip_id, user_id)
+            liked, like_count = result
+            return jsonify({'success': True, 'like_count': like_count, 'liked': liked})
+        except PoolExhausted:
+            raise
+        except Exception as e:
+            print(f"Error toggling like in Redis: {e}")
+    
+    # Redis不可用时直接写数据库
     conn = current_app.get_db_connection()
     if not conn:
         return jsonify({'success': False, 'error': '数据库连接失败'})
@@ -334,41 +490,21 @@ def like_tip(tip_id):
     cur = conn.cursor()
     
     try:
-        # 检查是否已经点赞
-        cur.execute('SELECT id FROM tip_likes WHERE user_id = %s AND tip_id = %s',
-                   (user_id, tip_id))
-        existing_like = cur.fetchone()
-        
-        if existing_like:
-            # 取消点赞
-            cur.execute('DELETE FROM tip_likes WHERE user_id = %s AND tip_id = %s',
-                       (user_id, tip_id))
-        else:
-            # 添加点赞
-            cur.execute('INSERT INTO tip_likes (user_id, tip_id) VALUES (%s, %s)',
-                       (user_id, tip_id))
+        # 一条语句完成切换：已点赞则删除，否则插入（依赖 (user_id, tip_id) 唯一索引，
+        # 并发的重复点击只会有一条插入成功），同时更新点赞计数并返回新的点赞数和点赞状态
+        cur.execute(TOGGLE_LIKE_SQL, {'user_id': user_id, 'tip_id': tip_id})
+        result = cur.fetchone()
+        if not result:
+            conn.rollback()
+            return jsonify({'success': False, 'error': '技巧不存在'})
+        like_count, liked = result
         
         conn.commit()
         
-        # 获取新的点赞数
-        cur.execute('SELECT COUNT(*) FROM tip_likes WHERE tip_id = %s', (tip_id,))
-        like_count = cur.fetchone()[0]
-        
-        # 清除相关缓存
-        redis_client = current_app.get_redis_client()
-        if redis_client:
-            try:
-                # 清除技巧详情缓存
-                redis_client.delete(f"tip_detail:{tip_id}")
-                # 清除技巧列表缓存
-                redis_client.delete("all_tips")
-                # 清除排行榜缓存
-                redis_client.delete("ranking_data")
-            except Exception as e:
-                print(f"Error clearing Redis cache: {e}")
+        # 清除技巧详情和技巧列表缓存
+        cache.invalidate(redis_client, f'tip:{tip_id}', 'tips-list')
         
-        return jsonify({'success': True, 'like_count': like_count, 
-                       'liked': not existing_like if existing_like else True})
+        return jsonify({'success': True, 'like_count': like_count, 'liked': liked})
         
     except Exception as e:
         # 发生异常时回滚事务
@@ -380,6 +516,20 @@ def like_tip(tip_id):
             cur.close()
         current_app.put_db_connection(conn)
 
+def _load_likers(redis_client, tip_id):
+    """从数据库加载技巧的点赞用户集合到Redis，返回技巧是否存在"""
+    conn = current_app.get_db_connection()
+    if not conn:
+        raise RuntimeError('数据库连接失败')
+    
+    cur = conn.cursor()
+    
+    try:
+        return write_behind.load_likers(redis_client, cur, tip_id)
+    finally:
+        cur.close()
+        current_app.put_db_connection(conn)
+
 @main.route('/tips/<int:tip_id>/comment', methods=['POST'])
 def comment_tip(tip_id):
     if 'user_id' not in session:
@@ -400,18 +550,13 @@ def comment_tip(tip_id):
     try:
         cur.execute('INSERT INTO tip_comments (user_id, tip_id, content) VALUES (%s, %s, %s)',
                    (user_id, tip_id, content))
+        # 在同一事务中更新评论计数
+        cur.execute('UPDATE slacking_tips SET comment_count = comment_count + 1 WHERE id = %s',
+                   (tip_id,))
         conn.commit()
         
-        # 清除相关缓存
-        redis_client = current_app.get_redis_client()
-        if redis_client:
-            try:
-                # 清除技巧详情缓存
-                redis_client.delete(f"tip_detail:{tip_id}")
-                # 清除技巧列表缓存
-                redis_client.delete("all_tips")
-            except Exception as e:
-                print(f"Error clearing Redis cache: {e}")
+        # 清除技巧详情和技巧列表缓存
+        cache.invalidate(current_app.get_redis_client(), f'tip:{tip_id}', 'tips-list')
         
         return jsonify({'success': True})
         
@@ -425,73 +570,93 @@ def comment_tip(tip_id):
             cur.close()
         current_app.put_db_connection(conn)
 
+# 排行榜页面缓存时间（秒），榜单本身由写入路径实时更新，页面允许几秒的延迟
+RANKING_CACHE_TTL = 5
+# 冷启动重建任务的去重时间（秒），重建完成前的大量请求只放入一个任务
+REBUILD_ENQUEUE_INTERVAL = 60
+
 @main.route('/ranking')
 def ranking():
     if 'user_id' not in session:
         return redirect(url_for('main.login'))
     
-    # 尝试从Redis缓存获取数据
-    redis_client = current_app.get_redis_client()
-    cache_key = "ranking_data"
-    
-    if redis_client:
-        try:
-            cached_data = redis_client.get(cache_key)
-            if cached_data:
-                import json
-                ranking_data = json.loads(cached_data)
-                return render_template('ranking.html', 
-                                     red_ranking=ranking_data['red_ranking'], 
-                                     black_ranking=ranking_data['black_ranking'])
-        except Exception as e:
-            print(f"Error reading from Redis: {e}")
+    # 时间窗口：总榜、今日、本周、本月、近7天
+    window = request.args.get('window', leaderboard.WINDOW_ALL)
+    if window not in leaderboard.WINDOWS:
+        window = leaderboard.WINDOW_ALL
     
-    conn = current_app.get_db_connection()
-    if not conn:
-        return "数据库连接失败", 500
-    
-    cur = conn.cursor()
+    redis_client = current_app.get_redis_client()
     
-    try:
-        # 获取摸鱼收益排行榜（红榜）
-        cur.execute('''SELECT u.username, COALESCE(SUM(sr.earnings), 0) as total_earnings
-                      FROM users u
-                      LEFT JOIN slacking_records sr ON u.id = sr.user_id
-                      GROUP BY u.id, u.username
-                      ORDER BY total_earnings DESC
-                      LIMIT 10''')
-        red_ranking = cur.fetchall()
-        
-        # 获取加班负收益排行榜（黑榜）
-        cur.execute('''SELECT u.username, COALESCE(SUM(or_.earnings), 0) as total_earnings
-                      FROM users u
-                      LEFT JOIN overtime_records or_ ON u.id = or_.user_id
-                      GROUP BY u.id, u.username
-                      ORDER BY total_earnings DESC
-                      LIMIT 10''')
-        black_ranking = cur.fetchall()
-        
-        # 缓存结果5分钟
+    def load_ranking():
+        # 排行榜由写入路径增量维护在Redis有序集合中，读取只需取前10名
         if redis_client:
             try:
-                import json
-                ranking_data = {
-                    'red_ranking': red_ranking,
-                    'black_ranking': black_ranking
-                }
-                redis_client.setex(cache_key, 300, json.dumps(ranking_data))
+                red_ranking = leaderboard.window_top_n(redis_client, leaderboard.RED_BOARD, window)
+                black_ranking = leaderboard.window_top_n(redis_client, leaderboard.BLACK_BOARD, window)
+                if red_ranking is not None and black_ranking is not None:
+                    return {'red_ranking': red_ranking, 'black_ranking': black_ranking}
             except Exception as e:
-                print(f"Error writing to Redis: {e}")
+                print(f"Error reading from Redis: {e}")
         
-        return render_template('ranking.html', red_ranking=red_ranking, black_ranking=black_ranking)
+        conn = current_app.get_db_connection()
+        if not conn:
+            raise RuntimeError('数据库连接失败')
         
+        cur = conn.cursor()
+        
+        try:
+            # 冷启动：榜单尚未建立时由后台任务重建，重建完成前本次及之后的请求走数据库查询
+            if redis_client:
+                jobs.enqueue('rebuild_leaderboard', unique_for=REBUILD_ENQUEUE_INTERVAL)
+            
+            # 时间窗口榜单从按天汇总的统计表查询，只扫描窗口内的日期
+            if window != leaderboard.WINDOW_ALL:
+                return {
+                    'red_ranking': leaderboard.query_window_top_n(cur, leaderboard.RED_BOARD, window),
+                    'black_ranking': leaderboard.query_window_top_n(cur, leaderboard.BLACK_BOARD, window)
+                }
+            
+            # 获取摸鱼收益排行榜（红榜）
+            cur.execute('''SELECT u.username, COALESCE(SUM(sr.earnings), 0) as total_earnings, u.id
+                          FROM users u
+                          LEFT JOIN slacking_records sr ON u.id = sr.user_id
+                          GROUP BY u.id, u.username
+                          ORDER BY total_earnings DESC
+                          LIMIT 10''')
+            red_ranking = cur.fetchall()
+            
+            # 获取加班负收益排行榜（黑榜）
+            cur.execute('''SELECT u.username, COALESCE(SUM(or_.earnings), 0) as total_earnings, u.id
+                          FROM users u
+                          LEFT JOIN overtime_records or_ ON u.id = or_.user_id
+                          GROUP BY u.id, u.username
+                          ORDER BY total_earnings DESC
+                          LIMIT 10''')
+            black_ranking = cur.fetchall()
+            
+            return {'red_ranking': red_ranking, 'black_ranking': black_ranking}
+        finally:
+            cur.close()
+            current_app.put_db_connection(conn)
+    
+    try:
+        # 热门页面：重复访问直接命中进程内缓存，不再访问Redis
+        data = cache.get_or_load(redis_client, 'ranking', (window,), load_ranking, RANKING_CACHE_TTL)
+    except PoolExhausted:
+        raise
     except Exception as e:
         # 记录错误日志
         print(f"排行榜查询错误: {e}")
         return "数据查询失败", 500
-    finally:
-        cur.close()
-        current_app.put_db_connection(conn)
+    
+    # 两张榜单表格按内容缓存，当前用户所在行在页面上单独高亮
+    tables = [(data['red_ranking'], '摸鱼收益'), (data['black_ranking'], '加班负收益')]
+    red_table, black_table = _render_fragments(
+        'ranking_table', '_ranking_table.html',
+        [((ranking, label), {'ranking': ranking, 'label': label}) for ranking, label in tables])
+    
+    return render_template('ranking.html', red_table=red_table, black_table=black_table,
+                           window=window, windows=leaderboard.WINDOWS)
 
 @main.route('/profile')
 def profile():
@@ -499,141 +664,64 @@ def profile():
         return redirect(url_for('main.login'))
     
     user_id = session['user_id']
-    
-    # 尝试从Redis缓存获取数据
     redis_client = current_app.get_redis_client()
-    cache_key = f"user_profile:{user_id}"
-    
-    if redis_client:
-        try:
-            cached_data = redis_client.get(cache_key)
-            if cached_data:
-                import json
-                profile_data = json.loads(cached_data)
-                # 将字符串转换回datetime对象
-
-                user_info = profile_data['user_info']
-
-                work_info = profile_data['work_info']
-
-                slacking_records = profile_data['slacking_records']
-
-                overtime_records = profile_data['overtime_records']
-
-                tips = profile_data['tips']
-
-                
-
-                # 处理时间字段
-
-                if user_info[5]:
-
-                    from datetime import datetime
-
-                    user_info[5] = datetime.strptime(user_info[5], '%Y-%m-%d %H:%M:%S')
-                
-                # 从缓存中获取今日收益统计
-                today_earnings = profile_data.get('today_earnings', {'slacking': 0, 'overtime': 0})
-                
-                return render_template('profile.html', 
-                                     user_info=user_info, 
-                                     work_info=work_info,
-                                     slacking_records=slacking_records, 
-                                     overtime_records=overtime_records,
-                                     tips=tips,
-                                     today_earnings=today_earnings)
-        except Exception as e:
-            print(f"Error reading from Redis: {e}")
     
-    conn = current_app.get_db_connection()
-    if not conn:
-        return "数据库连接失败", 500
+    # 排名信息直接查询有序集合，不随个人资料缓存
+    ranks = {
+        'red': leaderboard.user_rank(redis_client, leaderboard.RED_BOARD, user_id),
+        'black': leaderboard.user_rank(redis_client, leaderboard.BLACK_BOARD, user_id)
+    }
     
-    cur = conn.cursor()
-    
-    try:
-        # 获取用户信息
-        cur.execute('''SELECT username, gender, age, job, email, created_at 
-                      FROM users WHERE id = %s''', (user_id,))
-        user_info = cur.fetchone()
+    # 页头只包含个人信息、工作设置和聚合统计，历史列表由 /api/profile/* 分页懒加载
+    def load_profile():
+        conn = current_app.get_db_connection()
+        if not conn:
+            raise RuntimeError('数据库连接失败')
         
-        # 转换注册时间为UTC+8
-        if user_info and user_info[5]:
-            user_info = list(user_info)
-            #user_info[5] = utc_to_utc8(user_info[5])
-        
-        # 获取用户工作信息
-        cur.execute('''SELECT work_start_time, work_end_time, break_start_time, 
-                      break_end_time, daily_salary FROM user_work_info WHERE user_id = %s''', 
-                   (user_id,))
-        work_info = cur.fetchone()
-        
-        # 获取用户摸鱼记录
-        cur.execute('''SELECT project, duration, earnings, id
-                      FROM slacking_records WHERE user_id = %s 
-                      ORDER BY created_at DESC''', (user_id,))
-        slacking_records = cur.fetchall()
-        
-        # 获取用户加班记录
-        cur.execute('''SELECT project, duration, earnings, id
-                      FROM overtime_records WHERE user_id = %s 
-                      ORDER BY created_at DESC''', (user_id,))
-        overtime_records = cur.fetchall()
-        
-        # 获取用户分享的技巧
-        cur.execute('''SELECT id, user_id, title, steps, notice, experience, created_at, updated_at 
-                      FROM slacking_tips WHERE user_id = %s 
-                      ORDER BY created_at DESC''', (user_id,))
-        tips = cur.fetchall()
-        
-        # 计算今日收益统计
-        today_earnings = {'slacking': 0, 'overtime': 0}
-        
-        # 缓存结果30秒
-        if redis_client:
-            try:
-                import json
-                # 准备可序列化的数据
-
-                user_info_serializable = list(user_info)
-
-                if user_info_serializable[5]:  # created_at字段
-
-                    #user_info_serializable[5] = utc_to_utc8(user_info_serializable[5])
-
-                    user_info_serializable[5] = user_info_serializable[5].strftime('%Y-%m-%d %H:%M:%S')
-
-                
-
-                profile_data = {
-
-                    'user_info': user_info_serializable,
-
-                    'work_info': work_info,
-
-                    'slacking_records': slacking_records,
-
-                    'overtime_records': overtime_records,
-
-                    'tips': tips,
-
-                    'today_earnings': today_earnings
-
-                }
-                
-                redis_client.setex(cache_key, 30, json.dumps(profile_data))
-            except Exception as e:
-                print(f"Error writing to Redis: {e}")
+        cur = conn.cursor()
         
-        return render_template('profile.html', user_info=user_info, work_info=work_info,
-                              slacking_records=slacking_records, overtime_records=overtime_records,
-                              tips=tips, today_earnings=today_earnings)
+        try:
+            # 获取用户信息
+            cur.execute('''SELECT username, gender, age, job, email, created_at 
+                          FROM users WHERE id = %s''', (user_id,))
+            user_info = cur.fetchone()
+            
+            # 获取用户工作信息
+            cur.execute('''SELECT work_start_time, work_end_time, break_start_time, 
+                          break_end_time, daily_salary FROM user_work_info WHERE user_id = %s''', 
+                       (user_id,))
+            work_info = cur.fetchone()
+            
+            # 读取预先聚合的统计（次数、总时长、总收益、技巧数）
+            stats = get_user_stats(cur, user_id)
+            
+            # 今日和本周收益从按天汇总的 user_daily_stats 读取
+            today_earnings, week_earnings = get_period_earnings(cur, user_id)
+            
+            return {
+                'user_info': user_info,
+                'work_info': work_info,
+                'stats': stats,
+                'today_earnings': today_earnings,
+                'week_earnings': week_earnings
+            }
+        finally:
+            cur.close()
+            current_app.put_db_connection(conn)
+    
+    try:
+        # 缓存结果30秒，用户的记录、技巧或设置变化时按 user:{id} 标签失效
+        data = cache.get_or_load(redis_client, 'user_profile', (user_id,), load_profile, 30,
+                                 tags=(f'user:{user_id}',))
+    except PoolExhausted:
+        raise
     except Exception as e:
         print(f"查询用户信息失败: {e}")
         return "数据查询失败", 500
-    finally:
-        cur.close()
-        current_app.put_db_connection(conn)
+    
+    return render_template('profile.html', user_info=data['user_info'], work_info=data['work_info'],
+                          stats=data['stats'], today_earnings=data['today_earnings'],
+                          week_earnings=data['week_earnings'], ranks=ranks)
 
 @main.route('/profile/edit', methods=['GET', 'POST'])
 def edit_profile():
@@ -664,6 +752,8 @@ def edit_profile():
                           WHERE id = %s''',
                        (gender, age, job, email, user_id))
             conn.commit()
+            # 清除用户个人资料缓存
+            cache.invalidate(current_app.get_redis_client(), f'user:{user_id}')
             return redirect(url_for('main.profile'))
     except Exception as e:
         conn.rollback()
@@ -703,24 +793,19 @@ def edit_tip(tip_id):
         experience = request.form['experience']
         
         try:
-            cur.execute('''UPDATE slacking_tips SET title = %s, steps = %s, notice = %s, 
-                          experience = %s, updated_at = CURRENT_TIMESTAMP 
+            cur.execute(f'''UPDATE slacking_tips SET title = %s, steps = %s, notice = %s, 
+                          experience = %s, excerpt = %s, search_vector = {search.SEARCH_VECTOR_SQL},
+                          updated_at = CURRENT_TIMESTAMP 
                           WHERE id = %s''',
-                       (title, steps, notice, experience, tip_id))
+                       (title, steps, notice, experience, make_excerpt(steps),
+                        search.make_search_tokens(title),
+                        search.make_search_tokens(steps, notice, experience), tip_id))
             conn.commit()
             
-            # 清除相关缓存
+            # 清除技巧详情、技巧列表和用户个人资料缓存，并更新自动补全索引中的标题
             redis_client = current_app.get_redis_client()
-            if redis_client:
-                try:
-                    # 清除技巧详情缓存
-                    redis_client.delete(f"tip_detail:{tip_id}")
-                    # 清除技巧列表缓存
-                    redis_client.delete("all_tips")
-                    # 清除用户个人资料缓存
-                    redis_client.delete(f"user_profile:{user_id}")
-                except Exception as e:
-                    print(f"Error clearing Redis cache: {e}")
+            cache.invalidate(redis_client, f'tip:{tip_id}', 'tips-list', f'user:{user_id}')
+            suggest.update_tip(redis_client, tip_id, tip[2], title)
             
             cur.close()
             current_app.put_db_connection(conn)
@@ -750,7 +835,7 @@ def delete_tip(tip_id):
     
     try:
         # 检查技巧是否存在且属于当前用户
-        cur.execute('SELECT id FROM slacking_tips WHERE id = %s AND user_id = %s', 
+        cur.execute('SELECT id, title FROM slacking_tips WHERE id = %s AND user_id = %s', 
                    (tip_id, user_id))
         tip = cur.fetchone()
         
@@ -765,22 +850,15 @@ def delete_tip(tip_id):
         
         # 删除技巧
         cur.execute('DELETE FROM slacking_tips WHERE id = %s', (tip_id,))
+        # 在同一事务中更新用户聚合统计
+        apply_tip_delta(cur, user_id, -1)
         conn.commit()
         
-        # 清除相关缓存
+        # 清除技巧详情、技巧列表和用户个人资料缓存，并从自动补全索引和点赞缓冲中移除
         redis_client = current_app.get_redis_client()
-        if redis_client:
-            try:
-                # 清除技巧详情缓存
-                redis_client.delete(f"tip_detail:{tip_id}")
-                # 清除技巧列表缓存
-                redis_client.delete("all_tips")
-                # 清除用户个人资料缓存
-                redis_client.delete(f"user_profile:{user_id}")
-                # 清除排行榜缓存
-                redis_client.delete("ranking_data")
-            except Exception as e:
-                print(f"Error clearing Redis cache: {e}")
+        cache.invalidate(redis_client, f'tip:{tip_id}', 'tips-list', f'user:{user_id}')
+        suggest.remove_tip(redis_client, tip_id, tip[1])
+        write_behind.forget_tip(redis_client, tip_id)
         
         cur.close()
         current_app.put_db_connection(conn)
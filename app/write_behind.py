@@ -0,0 +1,304 @@
+"""
+点赞和浏览数的写后缓冲（write-behind）
+
+点赞先记录在Redis中并立即返回，后台线程每隔 WRITE_BEHIND_FLUSH_INTERVAL 秒
+把积累的变化批量写入PostgreSQL，数据库每个周期只执行一次批量写入，而不是每次点击一个事务。
+
+- tip:{id}:likers：点赞用户集合，第一次访问某个技巧时从 tip_likes 加载，LIKERS_TTL 内无人点赞后过期；
+  集合中始终有一个占位成员，因此"key存在"即表示已加载，点赞数为 SCARD - 1
+- likes:pending：待写入的变化，字段 "{tip_id}:{user_id}"，值 1 为点赞、0 为取消，
+  同一用户反复点击只保留最后的状态
+- views:pending：待写入的浏览数，字段为技巧ID，值为增量
+
+写入时先把 pending RENAME 为 processing 再读取，写入数据库并提交后才删除 processing。
+进程在中途崩溃时，下一次写入会先重放遗留的 processing：
+点赞的写入是幂等的（插入冲突忽略、删除不存在的行无影响、点赞数按 tip_likes 重新计数）；
+浏览数的增量不是幂等的，每批带一个ID，与增量在同一事务中记录到 counter_flushes，已写入的批次不会重复累加（旧批次由后台任务 cleanup_counter_flushes 定期清理）。
+
+Redis不可用时点赞直接写数据库，浏览数不计数。
+"""
+import atexit
+import threading
+import time
+import uuid
+
+from psycopg2.extras import execute_values
+
+from app import cache
+
+LIKES_PENDING_KEY = 'likes:pending'
+LIKES_PROCESSING_KEY = 'likes:processing'
+VIEWS_PENDING_KEY = 'views:pending'
+VIEWS_PROCESSING_KEY = 'views:processing'
+# 同一时间只有一个进程执行写入
+FLUSH_LOCK_KEY = 'write_behind:flush_lock'
+FLUSH_LOCK_TTL = 60
+# 点赞用户集合在最后一次点赞后保留的时间（秒），远大于写入间隔，过期后重新加载不会丢失未写入的变化
+LIKERS_TTL = 86400
+
+# 点赞用户集合中的占位成员
+_PLACEHOLDER = '-'
+# processing 中保存批次ID的字段
+_BATCH_FIELD = '_batch'
+
+# 集合不存在时返回 -1，由调用方从数据库加载后重试；否则返回 {是否点赞, 点赞数}
+_TOGGLE_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 0 then
+    return -1
+end
+local liked = 1
+if redis.call('srem', KEYS[1], ARGV[1]) == 1 then
+    liked = 0
+else
+    redis.call('sadd', KEYS[1], ARGV[1])
+end
+redis.call('expire', KEYS[1], ARGV[3])
+redis.call('hset', KEYS[2], ARGV[2], liked)
+return {liked, redis.call('scard', KEYS[1]) - 1}
+"""
+
+# 加载点赞用户集合：只有集合不存在时才写入，避免覆盖并发加载后已发生的点赞
+_LOAD_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return 0
+end
+-- ARGV[1] 为有效期，其余为成员
+for i = 2, #ARGV, 1000 do
+    redis.call('sadd', KEYS[1], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+end
+redis.call('expire', KEYS[1], ARGV[1])
+return 1
+"""
+
+# 取出待写入的批次：上次遗留的 processing 优先重放，否则把 pending 改名为 processing
+_CLAIM_SCRIPT = """
+if redis.call('exists', KEYS[2]) == 0 then
+    if redis.call('exists', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('rename', KEYS[1], KEYS[2])
+    redis.call('hset', KEYS[2], ARGV[1], ARGV[2])
+end
+return redis.call('hgetall', KEYS[2])
+"""
+
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_flusher = None
+
+
+def likers_key(tip_id):
+    return f'tip:{tip_id}:likers'
+
+
+def _field(tip_id, user_id):
+    return f'{tip_id}:{user_id}'
+
+
+def init_app(app, redis_client):
+    """启动后台写入线程，并在进程退出前写入最后一批"""
+    global _flusher
+    if not redis_client or _flusher is not None:
+        return
+    interval = app.config['WRITE_BEHIND_FLUSH_INTERVAL']
+
+    def run():
+        while True:
+            time.sleep(interval)
+            flush(app, redis_client)
+
+    _flusher = threading.Thread(target=run, name='write-behind-flusher', daemon=True)
+    _flusher.start()
+    atexit.register(flush, app, redis_client)
+
+
+def toggle_like(redis_client, tip_id, user_id):
+    """
+    在Redis中切换点赞状态，不访问数据库
+
+    Returns:
+        (是否点赞, 点赞数)；该技巧的点赞用户集合尚未加载时返回None，
+        调用方用 load_likers 加载后重试
+    """
+    result = redis_client.eval(_TOGGLE_SCRIPT, 2, likers_key(tip_id), LIKES_PENDING_KEY,
+                               user_id, _field(tip_id, user_id), LIKERS_TTL)
+    if result == -1:
+        return None
+    liked, like_count = result
+    return bool(liked), like_count
+
+
+def load_likers(redis_client, cur, tip_id):
+    """
+    从 tip_likes 加载技巧的点赞用户集合
+
+    Returns:
+        技巧是否存在
+    """
+    cur.execute('SELECT EXISTS (SELECT 1 FROM slacking_tips WHERE id = %s)', (tip_id,))
+    if not cur.fetchone()[0]:
+        return False
+    cur.execute('SELECT user_id FROM tip_likes WHERE tip_id = %s', (tip_id,))
+    user_ids = [row[0] for row in cur.fetchall()]
+    redis_client.eval(_LOAD_SCRIPT, 1, likers_key(tip_id), LIKERS_TTL, _PLACEHOLDER, *user_ids)
+    return True
+
+
+def pending_likes(redis_client, user_id, tip_ids):
+    """
+    当前用户尚未写入数据库的点赞变化
+
+    Returns:
+        {tip_id: 是否点赞}
+    """
+    if not redis_client or not tip_ids:
+        return {}
+    fields = [_field(tip_id, user_id) for tip_id in tip_ids]
+    pipe = redis_client.pipeline(transaction=False)
+    # 正在写入的批次先于待写入的变化发生
+    pipe.hmget(LIKES_PROCESSING_KEY, fields)
+    pipe.hmget(LIKES_PENDING_KEY, fields)
+    processing, pending = pipe.execute()
+    changes = {}
+    for values in (processing, pending):
+        for tip_id, value in zip(tip_ids, values):
+            if value is not None:
+                changes[tip_id] = value == '1'
+    return changes
+
+
+def forget_tip(redis_client, tip_id):
+    """删除技巧后清除点赞用户集合（待写入的变化在写入时会因技巧不存在而被忽略）"""
+    if not redis_client:
+        return
+    try:
+        redis_client.delete(likers_key(tip_id))
+    except Exception as e:
+        print(f"Error clearing tip likers: {e}")
+
+
+def record_view(redis_client, tip_id):
+    """记录一次浏览"""
+    if not redis_client:
+        return
+    try:
+        redis_client.hincrby(VIEWS_PENDING_KEY, tip_id, 1)
+    except Exception as e:
+        print(f"Error recording tip view: {e}")
+
+
+def flush(app, redis_client):
+    """把积累的点赞和浏览数写入数据库，其他进程正在写入时跳过"""
+    token = uuid.uuid4().hex
+    try:
+        if not redis_client.set(FLUSH_LOCK_KEY, token, nx=True, ex=FLUSH_LOCK_TTL):
+            return
+    except Exception as e:
+        print(f"Error acquiring write-behind lock: {e}")
+        return
+    try:
+        tip_ids = _flush_likes(app, redis_client)
+        if tip_ids:
+            # 每批只失效一次相关缓存，而不是每次点击都失效
+            cache.invalidate(redis_client, 'tips-list', *[f'tip:{tip_id}' for tip_id in tip_ids])
+        _flush_views(app, redis_client)
+    except Exception as e:
+        print(f"Error flushing write-behind buffers: {e}")
+    finally:
+        try:
+            redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, FLUSH_LOCK_KEY, token)
+        except Exception as e:
+            print(f"Error releasing write-behind lock: {e}")
+
+
+def _claim(redis_client, pending_key, processing_key):
+    """
+    Returns:
+        (批次ID, {字段: 值})；没有待写入的数据时返回 (None, {})
+    """
+    flat = redis_client.eval(_CLAIM_SCRIPT, 2, pending_key, processing_key,
+                             _BATCH_FIELD, uuid.uuid4().hex)
+    entries = dict(zip(flat[::2], flat[1::2]))
+    return entries.pop(_BATCH_FIELD, None), entries
+
+
+def _flush_likes(app, redis_client):
+    """
+    Returns:
+        点赞数有变化的技巧ID
+    """
+    _, entries = _claim(redis_client, LIKES_PENDING_KEY, LIKES_PROCESSING_KEY)
+    if not entries:
+        return []
+
+    added, removed = [], []
+    for field, value in entries.items():
+        tip_id, user_id = (int(part) for part in field.split(':'))
+        (added if value == '1' else removed).append((user_id, tip_id))
+    tip_ids = sorted({tip_id for _, tip_id in added + removed})
+
+    conn = app.get_db_connection()
+    if not conn:
+        raise RuntimeError('数据库连接失败')
+    cur = conn.cursor()
+    try:
+        if added:
+            # 跳过写入前已被删除的技巧
+            execute_values(cur, '''INSERT INTO tip_likes (user_id, tip_id)
+                                  SELECT v.user_id, v.tip_id
+                                  FROM (VALUES %s) AS v (user_id, tip_id)
+                                  JOIN slacking_tips st ON st.id = v.tip_id
+                                  ON CONFLICT (user_id, tip_id) DO NOTHING''', added)
+        if removed:
+            execute_values(cur, '''DELETE FROM tip_likes tl
+                                  USING (VALUES %s) AS v (user_id, tip_id)
+                                  WHERE tl.user_id = v.user_id AND tl.tip_id = v.tip_id''', removed)
+        # 按 tip_likes 重新计数，重放同一批次时结果不变
+        cur.execute('''UPDATE slacking_tips st
+                      SET like_count = (SELECT COUNT(*) FROM tip_likes WHERE tip_id = st.id)
+                      WHERE st.id = ANY(%s)''', (tip_ids,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        app.put_db_connection(conn)
+
+    redis_client.delete(LIKES_PROCESSING_KEY)
+    return tip_ids
+
+
+def _flush_views(app, redis_client):
+    batch_id, entries = _claim(redis_client, VIEWS_PENDING_KEY, VIEWS_PROCESSING_KEY)
+    if not entries:
+        return
+
+    conn = app.get_db_connection()
+    if not conn:
+        raise RuntimeError('数据库连接失败')
+    cur = conn.cursor()
+    try:
+        # 批次已写入过（提交后、删除processing前崩溃）时不再重复累加
+        cur.execute('''INSERT INTO counter_flushes (batch_id) VALUES (%s)
+                      ON CONFLICT (batch_id) DO NOTHING''', (batch_id,))
+        if cur.rowcount:
+            execute_values(cur, '''UPDATE slacking_tips st
+                                  SET view_count = st.view_count + v.views
+                                  FROM (VALUES %s) AS v (id, views)
+                                  WHERE st.id = v.id''',
+                           [(int(tip_id), int(views)) for tip_id, views in entries.items()])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        app.put_db_connection(conn)
+
+    redis_client.delete(VIEWS_PROCESSING_KEY)
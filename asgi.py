@@ -0,0 +1,5 @@
+from app import create_app
+from app.controllers.api_async import AsyncAPI
+
+# 异步服务模式：uvicorn asgi:app --workers 4
+app = AsyncAPI(create_app())
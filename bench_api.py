@@ -0,0 +1,199 @@
+"""
+/api 同步模式与异步模式的基准测试
+
+在相同worker数量下分别启动两种服务模式，用不同的并发数请求同一个接口，
+比较吞吐量、延迟分位数、错误数和服务进程（含子进程）的峰值内存。
+
+    python bench_api.py --username 测试用户 --password 密码 --workers 4 --concurrency 10,50,200
+
+- 同步模式：gunicorn，每个worker --threads 个线程（默认8）
+- 异步模式：uvicorn asgi:app
+- 依赖见 requirements-async.txt；内存统计读取 /proc，只支持Linux
+- 客户端与服务在同一台机器上运行时会互相争用CPU，结果用于两种模式之间的对比
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import os
+import shlex
+import socket
+import subprocess
+import threading
+import time
+import urllib.parse
+
+SERVERS = {
+    'sync': 'gunicorn --workers {workers} --threads {threads} --bind 127.0.0.1:{port} run:app',
+    'async': 'uvicorn asgi:app --workers {workers} --host 127.0.0.1 --port {port} --no-access-log',
+}
+
+
+def _descendants(pid):
+    """进程及其所有子进程的PID"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # 第二列（进程名）可能包含空格，从最后一个右括号之后解析
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        stack.extend(children.get(current, []))
+    return pids
+
+
+def _rss_mb(pid):
+    """进程树的常驻内存（MB）"""
+    total = 0
+    for child in _descendants(pid):
+        try:
+            with open(f'/proc/{child}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            pass
+    return total / 1024
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'服务在 {timeout} 秒内没有开始监听端口 {port}')
+
+
+def _login(port, username, password):
+    """登录并返回session cookie"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        body = urllib.parse.urlencode({'username': username, 'password': password})
+        conn.request('POST', '/login', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+        response = conn.getresponse()
+        response.read()
+        cookie = response.getheader('Set-Cookie')
+        if response.status != 302 or not cookie:
+            raise RuntimeError('登录失败，请检查用户名和密码')
+        return cookie.split(';', 1)[0]
+    finally:
+        conn.close()
+
+
+def _run_load(port, path, cookie, concurrency, duration):
+    """
+    Returns:
+        (延迟列表（秒）, 错误数)
+    """
+    deadline = time.monotonic() + duration
+    lock = threading.Lock()
+    latencies, errors = [], [0]
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local_latencies, local_errors = [], 0
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                conn.request('GET', path, headers={'Cookie': cookie})
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    local_errors += 1
+                    continue
+                local_latencies.append(time.monotonic() - started)
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(client)
+    return latencies, errors[0]
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * p), len(sorted_values) - 1)]
+
+
+def bench(mode, args):
+    command = SERVERS[mode].format(workers=args.workers, threads=args.threads, port=args.port)
+    print(f"🚀 {mode}: {command}")
+    server = subprocess.Popen(shlex.split(command), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = []
+    try:
+        _wait_for_port(args.port)
+        cookie = _login(args.port, args.username, args.password)
+        # 预热：建立连接池中的连接
+        _run_load(args.port, args.path, cookie, args.workers, 2)
+
+        for concurrency in args.concurrency:
+            peak = [_rss_mb(server.pid)]
+            stop = threading.Event()
+
+            def sample():
+                while not stop.wait(0.5):
+                    peak[0] = max(peak[0], _rss_mb(server.pid))
+
+            sampler = threading.Thread(target=sample, daemon=True)
+            sampler.start()
+            latencies, errors = _run_load(args.port, args.path, cookie, concurrency, args.duration)
+            stop.set()
+            sampler.join()
+
+            latencies.sort()
+            results.append((mode, concurrency, len(latencies) / args.duration,
+                            _percentile(latencies, 0.5) * 1000, _percentile(latencies, 0.95) * 1000,
+                            _percentile(latencies, 0.99) * 1000, errors, peak[0]))
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较 /api 同步模式与异步模式的并发能力和内存占用')
+    parser.add_argument('--username', required=True, help='用于登录的测试用户')
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--path', default='/api/user-work-info', help='请求的接口')
+    parser.add_argument('--workers', type=int, default=4, help='两种模式使用相同的worker进程数')
+    parser.add_argument('--threads', type=int, default=8, help='同步模式每个worker的线程数')
+    parser.add_argument('--concurrency', default='10,50,200',
+                        type=lambda value: [int(n) for n in value.split(',')], help='并发客户端数，逗号分隔')
+    parser.add_argument('--duration', type=float, default=20, help='每个并发数持续的秒数')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--modes', default='sync,async', help='要测试的模式，逗号分隔')
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes.split(','):
+        results.extend(bench(mode, args))
+
+    print(f"\n{'mode':<6} {'conc':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'RSS MB':>8}")
+    for mode, concurrency, rps, p50, p95, p99, errors, rss in results:
+        print(f"{mode:<6} {concurrency:>5} {rps:>9.1f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {errors:>7} {rss:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -12,4 +12,62 @@ class Config:
     DB_HOST = os.getenv('DB_HOST', os.getenv('host'))
     DB_PORT = os.getenv('DB_PORT', os.getenv('port'))
     DB_NAME = os.getenv('DB_NAME', os.getenv('dbname'))
-    
\ No newline at end of file
+    
+    # Database connection pool
+    DB_POOL_MINCONN = int(os.getenv('DB_POOL_MINCONN', 1))
+    DB_POOL_MAXCONN = int(os.getenv('DB_POOL_MAXCONN', 10))
+    # 连接最大存活时间/最大空闲时间（秒），超过后重建连接
+    DB_POOL_MAX_AGE = int(os.getenv('DB_POOL_MAX_AGE', 1800))
+    DB_POOL_MAX_IDLE = int(os.getenv('DB_POOL_MAX_IDLE', 300))
+    # 连接空闲超过该时间（秒）后，取用前先做一次健康检查
+    DB_POOL_HEALTH_CHECK_IDLE = int(os.getenv('DB_POOL_HEALTH_CHECK_IDLE', 30))
+    # 连接耗尽时最多排队等待的时间（秒）和排队请求数，超过后返回503
+    DB_POOL_WAIT_TIMEOUT = float(os.getenv('DB_POOL_WAIT_TIMEOUT', 3))
+    DB_POOL_MAX_WAITERS = int(os.getenv('DB_POOL_MAX_WAITERS', 20))
+    # 503响应中 Retry-After 头的秒数
+    DB_POOL_RETRY_AFTER = int(os.getenv('DB_POOL_RETRY_AFTER', 2))
+
+    # 进程内L1缓存：最多条目数，以及条目最长有效期（秒，限制错过失效广播时的旧数据时间）
+    CACHE_L1_MAX_ENTRIES = int(os.getenv('CACHE_L1_MAX_ENTRIES', 1000))
+    CACHE_L1_TTL = float(os.getenv('CACHE_L1_TTL', 10))
+    # 写入Redis的缓存值超过该字节数时压缩，0表示不压缩
+    CACHE_COMPRESS_MIN_SIZE = int(os.getenv('CACHE_COMPRESS_MIN_SIZE', 1024))
+
+    # 点赞和浏览数先记录在Redis中，后台线程每隔多少秒批量写入数据库（即数据库中数据的最大延迟）
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', 2))
+
+    # 后台任务失败后第一次重试的等待时间（秒），之后每次重试翻倍
+    JOBS_RETRY_BACKOFF = float(os.getenv('JOBS_RETRY_BACKOFF', 5))
+
+    # /metrics 需要请求头 Authorization: Bearer <METRICS_TOKEN>，未设置时接口关闭
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+    # main 和 api 蓝图的响应是否带 Server-Timing 头（db、redis、pool-wait、render、total）
+    SERVER_TIMING = os.getenv('SERVER_TIMING', 'true').lower() in ('1', 'true', 'yes')
+    # 设置路径后，每个请求的耗时分布以JSON行写入该日志（按大小轮转）
+    REQUEST_LOG = os.getenv('REQUEST_LOG')
+    REQUEST_LOG_MAX_BYTES = int(os.getenv('REQUEST_LOG_MAX_BYTES', 10 * 1024 * 1024))
+    REQUEST_LOG_BACKUPS = int(os.getenv('REQUEST_LOG_BACKUPS', 5))
+
+    # 慢查询日志：设置日志路径后启用，记录耗时超过阈值（毫秒，0表示所有语句）的SQL，
+    # 慢的SELECT按比例（0~1）捕获 EXPLAIN (ANALYZE, BUFFERS)，日志按大小轮转
+    SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG')
+    SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100))
+    SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE', 0.1))
+    SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024))
+    SLOW_QUERY_LOG_BACKUPS = int(os.getenv('SLOW_QUERY_LOG_BACKUPS', 5))
+
+    # 请求采样分析：结果目录、采样间隔（毫秒），以及每多少个请求自动分析一个（0表示只在管理员请求时分析）
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+    PROFILE_SAMPLE_EVERY = int(os.getenv('PROFILE_SAMPLE_EVERY', 0))
+
+    # 内存分配快照（tracemalloc）：是否在启动时开启追踪、每次分配记录的调用栈层数（越多开销越大）、
+    # 自动拍摄快照的间隔（秒，0表示只按需拍摄）和保留的快照数量
+    MEMORY_TRACING = os.getenv('MEMORY_TRACING', 'false').lower() in ('1', 'true', 'yes')
+    MEMORY_TRACE_FRAMES = int(os.getenv('MEMORY_TRACE_FRAMES', 1))
+    MEMORY_SNAPSHOT_INTERVAL = float(os.getenv('MEMORY_SNAPSHOT_INTERVAL', 0))
+    MEMORY_SNAPSHOT_KEEP = max(int(os.getenv('MEMORY_SNAPSHOT_KEEP', 4)), 2)
+
+    # Admin endpoints (/admin/*) require the X-Admin-Token header to match
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
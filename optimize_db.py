@@ -35,26 +35,52 @@ try:
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_work_info_user_id ON user_work_info (user_id);")
     print("✅ Index on user_work_info.user_id created")
     
-    # 为 slacking_records 表的 user_id 字段添加索引
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_slacking_records_user_id ON slacking_records (user_id);")
-    print("✅ Index on slacking_records.user_id created")
+    # 为 slacking_records 表的 (user_id, created_at, id) 添加索引（用于个人中心历史列表的键集分页）
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_slacking_records_user_id_created_at_id ON slacking_records (user_id, created_at DESC, id DESC);")
+    cursor.execute("DROP INDEX IF EXISTS idx_slacking_records_user_id;")
+    print("✅ Index on slacking_records (user_id, created_at, id) created")
     
-    # 为 overtime_records 表的 user_id 字段添加索引
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_overtime_records_user_id ON overtime_records (user_id);")
-    print("✅ Index on overtime_records.user_id created")
+    # 为 overtime_records 表的 (user_id, created_at, id) 添加索引（用于个人中心历史列表的键集分页）
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_overtime_records_user_id_created_at_id ON overtime_records (user_id, created_at DESC, id DESC);")
+    cursor.execute("DROP INDEX IF EXISTS idx_overtime_records_user_id;")
+    print("✅ Index on overtime_records (user_id, created_at, id) created")
     
-    # 为 slacking_tips 表的 user_id 字段添加索引
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_slacking_tips_user_id ON slacking_tips (user_id);")
-    print("✅ Index on slacking_tips.user_id created")
+    # 为 slacking_tips 表的 (user_id, created_at, id) 添加索引（用于个人中心历史列表的键集分页）
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_slacking_tips_user_id_created_at_id ON slacking_tips (user_id, created_at DESC, id DESC);")
+    cursor.execute("DROP INDEX IF EXISTS idx_slacking_tips_user_id;")
+    print("✅ Index on slacking_tips (user_id, created_at, id) created")
     
-    # 为 slacking_tips 表的 created_at 字段添加索引（用于排序）
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_slacking_tips_created_at ON slacking_tips (created_at DESC);")
-    print("✅ Index on slacking_tips.created_at created")
+    # 为 slacking_tips 表的 (created_at, id) 添加索引（用于按时间排序的键集分页）
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_slacking_tips_created_at_id ON slacking_tips (created_at DESC, id DESC);")
+    cursor.execute("DROP INDEX IF EXISTS idx_slacking_tips_created_at;")
+    print("✅ Index on slacking_tips (created_at, id) created")
     
-    # 为 tip_likes 表的 user_id 和 tip_id 字段添加索引
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tip_likes_user_id ON tip_likes (user_id);")
+    # 为 slacking_tips 表的计数列添加索引（用于按点赞数/评论数排序的键集分页）
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_slacking_tips_like_count_id ON slacking_tips (like_count DESC, id DESC);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_slacking_tips_comment_count_id ON slacking_tips (comment_count DESC, id DESC);")
+    print("✅ Indexes on slacking_tips (like_count, id) and (comment_count, id) created")
+    
+    # 为 slacking_tips 表的全文搜索列添加GIN索引（用于 /tips/search）
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_slacking_tips_search_vector ON slacking_tips USING GIN (search_vector);")
+    print("✅ GIN index on slacking_tips.search_vector created")
+    
+    # 为 counter_flushes 表的 flushed_at 字段添加索引（用于定期清理旧批次）
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_counter_flushes_flushed_at ON counter_flushes (flushed_at);")
+    print("✅ Index on counter_flushes.flushed_at created")
+    
+    # 为 tip_likes 表的 (user_id, tip_id) 添加唯一索引（点赞切换依赖它防止重复点赞），
+    # 建索引前先删除历史上重复的点赞，只保留最早的一条
+    # （删除后需运行 flask --app run reconcile-tip-counters 校正点赞数）
+    cursor.execute("""
+    DELETE FROM tip_likes a
+    USING tip_likes b
+    WHERE a.user_id = b.user_id AND a.tip_id = b.tip_id AND a.id > b.id;
+    """)
+    print(f"✅ Removed {cursor.rowcount} duplicate rows from tip_likes")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tip_likes_user_id_tip_id ON tip_likes (user_id, tip_id);")
+    cursor.execute("DROP INDEX IF EXISTS idx_tip_likes_user_id;")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_tip_likes_tip_id ON tip_likes (tip_id);")
-    print("✅ Indexes on tip_likes.user_id and tip_likes.tip_id created")
+    print("✅ Unique index on tip_likes (user_id, tip_id) and index on tip_likes.tip_id created")
     
     # 为 tip_comments 表的 tip_id 字段添加索引
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_tip_comments_tip_id ON tip_comments (tip_id);")
@@ -64,6 +90,10 @@ try:
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_feedback_user_id ON feedback (user_id);")
     print("✅ Index on feedback.user_id created")
     
+    # 为 user_daily_stats 表的 day 字段添加索引（用于按日/周/月统计所有用户）
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_daily_stats_day ON user_daily_stats (day);")
+    print("✅ Index on user_daily_stats.day created")
+    
     connection.commit()
     print("✅ All indexes created successfully!")
 
@@ -77,6 +107,8 @@ try:
     cursor.execute("ANALYZE tip_likes;")
     cursor.execute("ANALYZE tip_comments;")
     cursor.execute("ANALYZE feedback;")
+    cursor.execute("ANALYZE user_stats;")
+    cursor.execute("ANALYZE user_daily_stats;")
     connection.commit()
     print("✅ Table analysis completed!")
 
@@ -99,14 +99,51 @@ try:
         steps TEXT,
         notice TEXT,
         experience TEXT,
+        excerpt VARCHAR(120),
+        like_count INTEGER NOT NULL DEFAULT 0,
+        comment_count INTEGER NOT NULL DEFAULT 0,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        search_vector TSVECTOR,
+        view_count INTEGER NOT NULL DEFAULT 0
     );
     """
     cursor.execute(create_slacking_tips_table_query)
     connection.commit()
     print("✅ Table 'slacking_tips' created or already exists.")
 
+    # 🔧 为已有的 slacking_tips 表补充列表摘要列，并回填历史数据
+    cursor.execute("ALTER TABLE slacking_tips ADD COLUMN IF NOT EXISTS excerpt VARCHAR(120);")
+    cursor.execute("""
+    UPDATE slacking_tips
+    SET excerpt = CASE
+        WHEN char_length(btrim(regexp_replace(steps, '\\s+', ' ', 'g'))) > 100
+        THEN left(btrim(regexp_replace(steps, '\\s+', ' ', 'g')), 100) || '…'
+        ELSE COALESCE(btrim(regexp_replace(steps, '\\s+', ' ', 'g')), '')
+    END
+    WHERE excerpt IS NULL;
+    """)
+    connection.commit()
+    print("✅ Column 'slacking_tips.excerpt' added and backfilled.")
+
+    # 🔧 为已有的 slacking_tips 表补充点赞数/评论数计数列
+    # （历史数据需运行 flask --app run reconcile-tip-counters 回填）
+    cursor.execute("ALTER TABLE slacking_tips ADD COLUMN IF NOT EXISTS like_count INTEGER NOT NULL DEFAULT 0;")
+    cursor.execute("ALTER TABLE slacking_tips ADD COLUMN IF NOT EXISTS comment_count INTEGER NOT NULL DEFAULT 0;")
+    connection.commit()
+    print("✅ Columns 'slacking_tips.like_count' and 'slacking_tips.comment_count' added.")
+
+    # 🔧 为已有的 slacking_tips 表补充全文搜索列（由应用切词后写入）
+    # （历史数据需运行 flask --app run rebuild-search-index 回填）
+    cursor.execute("ALTER TABLE slacking_tips ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;")
+    connection.commit()
+    print("✅ Column 'slacking_tips.search_vector' added.")
+
+    # 🔧 为已有的 slacking_tips 表补充浏览数列（由后台线程从Redis批量写入）
+    cursor.execute("ALTER TABLE slacking_tips ADD COLUMN IF NOT EXISTS view_count INTEGER NOT NULL DEFAULT 0;")
+    connection.commit()
+    print("✅ Column 'slacking_tips.view_count' added.")
+
     # 🔧 创建 tip_likes 表（如果不存在）
     create_tip_likes_table_query = """
     CREATE TABLE IF NOT EXISTS tip_likes (
@@ -149,6 +186,55 @@ try:
     connection.commit()
     print("✅ Table 'feedback' created or already exists.")
 
+    # 🔧 创建 user_stats 表（如果不存在），由记录/技巧的写入路径在同一事务中维护
+    # （历史数据需运行 flask --app run rebuild-user-stats 回填）
+    create_user_stats_table_query = """
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER PRIMARY KEY REFERENCES users(id),
+        slacking_count INTEGER NOT NULL DEFAULT 0,
+        slacking_minutes BIGINT NOT NULL DEFAULT 0,
+        slacking_earnings DECIMAL(14,2) NOT NULL DEFAULT 0,
+        overtime_count INTEGER NOT NULL DEFAULT 0,
+        overtime_minutes BIGINT NOT NULL DEFAULT 0,
+        overtime_earnings DECIMAL(14,2) NOT NULL DEFAULT 0,
+        tip_count INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """
+    cursor.execute(create_user_stats_table_query)
+    connection.commit()
+    print("✅ Table 'user_stats' created or already exists.")
+
+    # 🔧 创建 user_daily_stats 表（如果不存在），按 (用户, 日期) 汇总摸鱼/加班记录
+    # （历史数据需运行 flask --app run rebuild-daily-stats 回填）
+    create_user_daily_stats_table_query = """
+    CREATE TABLE IF NOT EXISTS user_daily_stats (
+        user_id INTEGER REFERENCES users(id),
+        day DATE NOT NULL,
+        slacking_count INTEGER NOT NULL DEFAULT 0,
+        slacking_minutes INTEGER NOT NULL DEFAULT 0,
+        slacking_earnings DECIMAL(12,2) NOT NULL DEFAULT 0,
+        overtime_count INTEGER NOT NULL DEFAULT 0,
+        overtime_minutes INTEGER NOT NULL DEFAULT 0,
+        overtime_earnings DECIMAL(12,2) NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day)
+    );
+    """
+    cursor.execute(create_user_daily_stats_table_query)
+    connection.commit()
+    print("✅ Table 'user_daily_stats' created or already exists.")
+
+    # 🔧 创建 counter_flushes 表（如果不存在），记录已写入的浏览数批次，崩溃后重放时不重复累加
+    create_counter_flushes_table_query = """
+    CREATE TABLE IF NOT EXISTS counter_flushes (
+        batch_id VARCHAR(32) PRIMARY KEY,
+        flushed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """
+    cursor.execute(create_counter_flushes_table_query)
+    connection.commit()
+    print("✅ Table 'counter_flushes' created or already exists.")
+
     # 🧪 可选：插入一条测试数据
     cursor.execute(
         "INSERT INTO users (username, password) VALUES (%s, %s) ON CONFLICT (username) DO NOTHING;",
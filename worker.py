@@ -0,0 +1,8 @@
+from app import create_app, jobs
+
+app = create_app()
+
+if __name__ == '__main__':
+    if not app.get_redis_client():
+        raise SystemExit('Redis连接不可用，后台任务在应用进程内执行，无需单独运行worker')
+    jobs.run_worker(app)